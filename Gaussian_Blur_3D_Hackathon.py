@@ -32,9 +32,16 @@ def generate_kernel(fx, fy, fz, sigma=1):
     
     return np.exp(- (xx ** 2 + yy ** 2 + zz ** 2) / (2 * sigma ** 2))
 
-#Main Code- Testing
-x, y, z = generate_grid()
-gaussian_blur = gaussian_blur(x, y, z)
-kernel = generate_kernel(*gaussian_blur)
+# Main Code- Testing
+# The dense kernel above has one value per grid point. For smoothing, use the
+# separable engine in orix.odf.gaussian_blur, which blurs one axis at a time.
+if __name__ == "__main__":
+    from orix.odf.gaussian_blur import gaussian_blur as blur
+
+    x, y, z = generate_grid()
+    histogram = np.zeros((x.size, y.size, z.size), dtype=np.float32)
+    histogram[x.size // 2, y.size // 2, z.size // 2] = 1
+    blur(histogram, sigma=2, mode="reflect", out=histogram)
+    print(f"Peak {histogram.max():.4f}, total {histogram.sum():.4f}")
 
 
@@ -17,13 +17,17 @@
 # along with orix.  If not, see <http://www.gnu.org/licenses/>.
 
 import copy
+import itertools
 
 import matplotlib.pyplot as plt
 import numpy as np
+import quaternion
+from scipy.sparse import csr_matrix
 
 from orix.crystal_map.crystal_map_properties import CrystalMapProperties
 from orix.crystal_map.phase_list import Phase, PhaseList
 from orix.quaternion import Orientation, Rotation
+from orix.quaternion.symmetry import C1
 
 
 class CrystalMap:
@@ -778,6 +782,85 @@ class CrystalMap:
 
         return output_array
 
+    def neighbor_graph(self, connectivity=None, chunk_size=2**18):
+        """Return a sparse adjacency graph of neighbouring points in data
+        with their misorientation angles as edge weights.
+
+        Only indexed points of the same phase are connected. The
+        misorientation angle is reduced by the proper point group of the
+        phase, if it has one.
+
+        Parameters
+        ----------
+        connectivity : int, optional
+            Number of neighbours of a point in the map grid, either
+            ``2 * ndim`` for neighbours sharing a face or ``3**ndim - 1``
+            for all neighbours, e.g. 4 or 8 in a 2D map. If None
+            (default), neighbours sharing a face are connected.
+        chunk_size : int, optional
+            Number of neighbour pairs to compute misorientation angles
+            for at a time. Default is 2**18.
+
+        Returns
+        -------
+        graph : scipy.sparse.csr_matrix
+            Symmetric matrix of shape (n, n), with n the number of points
+            in data, holding the misorientation angle in radians between
+            neighbouring points as float32. Angles of zero are stored
+            explicitly, so that the sparsity structure is the adjacency
+            of the points.
+
+        Examples
+        --------
+        >>> from orix.crystal_map import CrystalMap
+        >>> xmap = CrystalMap.empty((5, 10))
+        >>> graph = xmap.neighbor_graph(connectivity=8)
+        >>> graph.shape, graph.nnz
+        ((50, 50), 314)
+        """
+        pairs = self._neighbor_pairs(connectivity)
+        phase_id = self.phase_id
+        phase_id1 = phase_id[pairs[:, 0]]
+        pairs = pairs[(phase_id1 == phase_id[pairs[:, 1]]) & (phase_id1 != -1)]
+        phase_id1 = phase_id[pairs[:, 0]]
+
+        rotations = self.rotations
+        if self.rotations_per_point > 1:
+            rotations = rotations[:, 0]
+        q = quaternion.from_float_array(rotations.data)
+
+        # Highest absolute dot product between the misorientation and a
+        # symmetry operation, i.e. the smallest misorientation angle
+        dot_products = np.ones(pairs.shape[0])
+        for i, phase in self.phases_in_data:
+            if i == -1:
+                continue
+            point_group = phase.point_group
+            if point_group is None:
+                point_group = C1
+            symmetry = point_group.proper_subgroup.data
+            edges = np.nonzero(phase_id1 == i)[0]
+            for start in range(0, edges.size, chunk_size):
+                chunk = edges[start : start + chunk_size]
+                misorientation = q[pairs[chunk, 1]] * q[pairs[chunk, 0]].conj()
+                dots = quaternion.as_float_array(misorientation) @ symmetry.T
+                dot_products[chunk] = np.abs(dots).max(axis=-1)
+        angles = 2 * np.arccos(np.clip(dot_products, -1, 1))
+        angles = angles.astype(np.float32)
+
+        n = self.size
+        graph = csr_matrix(
+            (
+                np.concatenate((angles, angles)),
+                (
+                    np.concatenate((pairs[:, 0], pairs[:, 1])),
+                    np.concatenate((pairs[:, 1], pairs[:, 0])),
+                ),
+            ),
+            shape=(n, n),
+        )
+        return graph
+
     def plot(
         self,
         value=None,
@@ -931,6 +1014,80 @@ class CrystalMap:
 
         return tuple(slices)
 
+    def _data_grid(self):
+        """Return the index into the points in data of every point in a
+        grid of the shape of the points in data, -1 where there is no
+        point in data.
+
+        Returns
+        -------
+        grid : numpy.ndarray
+            Integer array of the map shape.
+        """
+        slices = self._data_slices_from_coordinates()
+        grid_shape = tuple(s.stop - s.start for s in slices)
+        coordinates = self._coordinates
+        step_sizes = self._step_sizes
+        axes = [k for k, v in coordinates.items() if v is not None and step_sizes[k]]
+        position = tuple(
+            np.around(coordinates[k] / step_sizes[k]).astype(int) - s.start
+            for k, s in zip(axes, slices)
+        )
+        grid = np.full(grid_shape, -1)
+        grid[position] = np.arange(self.size)
+        return grid
+
+    def _neighbor_pairs(self, connectivity=None):
+        """Return indices into the points in data of all pairs of
+        neighbouring points in data, each pair listed once.
+
+        Parameters
+        ----------
+        connectivity : int, optional
+            Either ``2 * ndim`` (default) or ``3**ndim - 1``. See
+            :meth:`neighbor_graph`.
+
+        Returns
+        -------
+        pairs : numpy.ndarray
+            Integer array of shape (n_pairs, 2).
+        """
+        grid = self._data_grid()
+        ndim = grid.ndim
+        grid_shape = grid.shape
+        if connectivity is None:
+            connectivity = 2 * ndim
+        if connectivity not in [2 * ndim, 3**ndim - 1]:
+            raise ValueError(
+                f"`connectivity` must be {2 * ndim} or {3**ndim - 1} for a map with "
+                f"{ndim} dimension(s), not {connectivity}."
+            )
+
+        # Half of all neighbour offsets, the first non-zero step positive
+        offsets = []
+        for offset in itertools.product((-1, 0, 1), repeat=ndim):
+            nonzero = np.flatnonzero(offset)
+            if nonzero.size == 0 or offset[nonzero[0]] < 0:
+                continue
+            if connectivity == 2 * ndim and nonzero.size > 1:
+                continue
+            offsets.append(offset)
+
+        # Compare the grid to shifted copies of itself
+        pairs = [np.zeros((0, 2), dtype=int)]
+        for offset in offsets:
+            slices1 = tuple(
+                slice(max(0, -d), n - max(0, d)) for d, n in zip(offset, grid_shape)
+            )
+            slices2 = tuple(
+                slice(max(0, d), n - max(0, -d)) for d, n in zip(offset, grid_shape)
+            )
+            idx1, idx2 = grid[slices1], grid[slices2]
+            is_pair = (idx1 != -1) & (idx2 != -1)
+            pairs.append(np.column_stack((idx1[is_pair], idx2[is_pair])))
+
+        return np.concatenate(pairs)
+
     def _data_shape_from_coordinates(self, only_is_in_data=True):
         """Return data shape based upon coordinate arrays.
 
@@ -86,6 +86,13 @@ class CrystalMapProperties(dict):
         array[self.is_in_data, ...] = value
         super().__setitem__(key, array)
 
+    def __reduce__(self):
+        """Return the arguments to recreate this object when pickled,
+        since setting items requires `self.is_in_data`.
+        """
+        dictionary = {k: super(CrystalMapProperties, self).__getitem__(k) for k in self}
+        return self.__class__, (dictionary, self.id, self.is_in_data)
+
     def __getitem__(self, item):
         """Return a dictionary entry, ensuring that only points in the data
         are returned.
@@ -3,9 +3,14 @@ Created on Fri May 13 2022
 @author: agerlt, rcasukhela
 """
 
-from numpy import histogramdd
-from scipy.spatial.transform import Rotation as R
-from scipy.ndimage import gaussian_filter
+import numba as nb
+import numpy as np
+
+from orix.odf.gaussian_blur import gaussian_blur
+from orix.quaternion._conversions import qu2cu, qu2cu_single
+from orix.quaternion.orientation_region import OrientationRegion
+
+_SPACES = ("mrp", "cubochoric")
 
 class ODF:
     '''
@@ -19,7 +24,15 @@ class ODF:
 # ============================ #
 #          Initialize          #
 # ============================ #
-    def __init__(self, orientations, sigma=1, bin_number=100, method="fast"):
+    def __init__(
+        self,
+        orientations,
+        sigma=1,
+        bin_number=100,
+        method="fast",
+        symmetry=None,
+        space="mrp",
+    ):
         '''
         Generates ODF over rotations, given orientations. Only "Fast" method is
         supported, currently.
@@ -32,8 +45,9 @@ class ODF:
 
         Inputs:
         --------------
-        orientations : np.array
-            This is an array of orientations, in quaternion space.
+        orientations : orix.quaternion.Rotation or np.array
+            This is an array of orientations, in quaternion space, with the
+            scalar part first.
 
         bin_number : int
             Number of bins in one dimension (for a total of three, X, Y, and Z)
@@ -47,36 +61,75 @@ class ODF:
             "fast" ONLY for now, eventually "accurate". WARNING:
             Currently only "fast" (AND INACCURATE) ODF generation is supported.
 
+        symmetry : orix.quaternion.Symmetry
+            Crystal symmetry of the orientations. If given, orientations are
+            projected into the fundamental zone, the equivalent s * q with the
+            smallest rotation angle, and only the bounding box of the
+            fundamental zone is binned, e.g. a 45 times smaller volume for 432.
+            The same number of bins then gives a finer resolution. Queries are
+            projected the same way. If None (default), the whole cube is
+            binned. Smoothing does not wrap around the fundamental zone
+            boundaries.
+
+        space : str
+            Space the histogram is binned in. "mrp" (default) bins modified
+            Rodrigues parameters, whose bins near the identity cover an 8
+            times larger volume of rotations than those at 180 degrees.
+            "cubochoric" bins cubochoric coordinates, the equal-volume
+            mapping of rotations onto a cube, so that every bin covers the
+            same volume of rotations and bin counts are unbiased densities.
+
 
         Outputs:
         --------------
-        orientation_xyz : orix.quaternion.Orientation
-            Transformed orientations from quaternion space to XYZ Rodriguez
-            space.
+        orientation_xyz : np.array
+            Transformed orientations from quaternion space to modified
+            Rodrigues parameters (MRPs), within the unit ball, or to
+            cubochoric coordinates, in the fundamental zone if `symmetry`
+            is given.
+
+        extent : float
+            Half the edge length of the binned cube of MRPs or cubochoric
+            coordinates, centred on the identity, 1 or pi**(2/3) / 2
+            without symmetry.
 
         block : np.array
             This array should contain the values of the smoothed histogram
-            that we want.
+            that we want, as float32. The histogram is smoothed in place
+            along one axis at a time, see orix.odf.gaussian_blur.
 
         bins : int
             The number of bins we used to make `block`.
 
         Dependencies:
         --------------
-        from numpy import histogramdd
-        from scipy.spatial.transform import Rotation as R
-        from scipy.ndimage import gaussian_filter
+        from orix.odf.gaussian_blur import gaussian_blur
 
 
         '''
-        self.orientation_xyz = R.from_quat(orientations.data).as_mrp()
+        _check_space(space)
+        self.symmetry = symmetry
+        self.space = space
+        self._symmetry_q = _proper_rotations(symmetry)
+        self.extent = fundamental_zone_extent(symmetry, space)
 
-        hist = histogramdd(
-            self.orientation_xyz,
-            range = [[-1, 1], [-1, 1], [-1, 1]],
-            )[0]
+        q = np.asarray(getattr(orientations, "data", orientations))
+        q = np.ascontiguousarray(q.reshape(-1, 4))
+        if symmetry is not None:
+            q = project_to_fundamental_zone(q, symmetry)
+        if space == "cubochoric":
+            self.orientation_xyz = quaternion_to_cubochoric(q)
+        else:
+            self.orientation_xyz = quaternion_to_mrp(q)
 
-        self.block = gaussian_filter(hist, sigma=sigma)
+        # Binned from the coordinates above, instead of converting the
+        # orientations a second time
+        hist = np.zeros((bin_number,) * 3)
+        _histogram_coordinates(self.orientation_xyz, self.extent, hist)
+
+        # Counted in float64, so that crowded bins stay exact
+        self.block = hist.astype(np.float32)
+        gaussian_blur(self.block, sigma, out=self.block)
         self.bins = bin_number
 
 
@@ -84,34 +137,551 @@ class ODF:
 #          Methods             #
 # ============================ #
 
-    def query(self, input_orientations):
+    def query(self, input_orientations, interpolate=False):
         '''
         Returns likelihoods based on the ODF, for a given set of input
         orientations.
 
+        Every orientation is projected into the fundamental zone if the ODF
+        has a symmetry, converted to MRPs or cubochoric coordinates and
+        looked up in `block` in one
+        compiled pass, without building intermediate arrays, so that
+        millions of orientations are queried per second.
+
 
         Inputs:
         --------------
-        input_orientations: orix.quaternion.Orientation
-            Orientations we would like to query their likelihood for.
+        input_orientations: orix.quaternion.Orientation or np.array
+            Orientations we would like to query their likelihood for, or
+            their quaternions of shape (..., 4), e.g. the float32 candidate
+            parent orientations of reconstruction.parent_likelihood().
+
+        interpolate : bool
+            If False (default), the value of the bin of every orientation is
+            returned. If True, the values of the eight bins with the closest
+            centres are interpolated trilinearly.
 
 
         Outputs:
         --------------
-        likelihood : list
-            Contains a list of likelihoods for the input orientations.
+        likelihood : np.array
+            Contains the likelihoods of the input orientations, of their
+            shape.
+
+        '''
+        q = np.asarray(getattr(input_orientations, "data", input_orientations))
+        shape = q.shape[:-1]
+        q = np.ascontiguousarray(q.reshape(-1, 4))
+        block = np.ascontiguousarray(self.block)
+        likelihood = np.empty(q.shape[0])
+        lookup = _LOOKUPS[self.space, bool(interpolate)]
+        lookup(q, self._symmetry_q, self.extent, block, likelihood)
+        return likelihood.reshape(shape)
 
+    __call__ = query
 
-        Dependencies:
+
+class IncrementalODF(ODF):
+    '''
+    Histogram ODF over MRPs or cubochoric coordinates, see ODF, whose
+    orientations can be added and removed without rebuilding it.
+
+    Adding or removing orientations only changes the counts of their bins.
+    The smoothing is deferred until `block` is next read, e.g. by `query`, and
+    is then applied to the changes only: the smoothing is linear, so every
+    tile of bins with changed counts is smoothed on its own, within the reach
+    of the Gaussian kernel, and added to `block`. If most tiles changed, the
+    whole histogram is smoothed again instead. Unlike ODF, `block` is kept in
+    float64, so that rounding errors do not build up over many updates.
+    '''
+
+# ============================ #
+#          Initialize          #
+# ============================ #
+    def __init__(
+        self,
+        orientations=None,
+        weights=None,
+        sigma=1,
+        bin_number=100,
+        symmetry=None,
+        tile_size=8,
+        space="mrp",
+    ):
+        '''
+        Inputs:
         --------------
-        from scipy.spatial.transform import Rotation as R
-        
+        orientations : orix.quaternion.Rotation or np.array
+            Initial orientations, or their quaternions of shape (..., 4). If
+            None (default), the ODF is empty.
+
+        weights : np.array
+            Weight of every initial orientation. If None (default), all
+            weights are 1.
+
+        sigma : float
+            Standard deviation in bins of the Gaussian kernel when we blur
+            the histogram.
+
+        bin_number : int
+            Number of bins in one dimension.
+
+        symmetry : orix.quaternion.Symmetry
+            If given, only the fundamental zone is binned, see ODF.
+
+        tile_size : int
+            Edge length in bins of the tiles changes are smoothed in.
+            Default is 8.
+
+        space : str
+            Space the histogram is binned in. "mrp" (default) bins modified
+            Rodrigues parameters, whose bins near the identity cover an 8
+            times larger volume of rotations than those at 180 degrees.
+            "cubochoric" bins cubochoric coordinates, the equal-volume
+            mapping of rotations onto a cube, so that every bin covers the
+            same volume of rotations and bin counts are unbiased densities.
+
+
+        Outputs:
+        --------------
+        counts : np.array
+            Histogram of the weights of the orientations, before smoothing.
+
         '''
-        mrp_querys = R.from_quat(input_orientations.data).as_mrp()
+        _check_space(space)
+        self.symmetry = symmetry
+        self.space = space
+        self._symmetry_q = _proper_rotations(symmetry)
+        self.extent = fundamental_zone_extent(symmetry, space)
+        self.sigma = sigma
+        self.bins = bin_number
+        self.tile_size = tile_size
+
+        self._counts = np.zeros((bin_number,) * 3)
+        self._block = np.zeros((bin_number,) * 3)
+        self._pending = np.zeros((bin_number,) * 3)
+        self._is_pending = False
+        if orientations is not None:
+            self.add(orientations, weights)
+
+
+# ============================ #
+#          Methods             #
+# ============================ #
+
+    @property
+    def block(self):
+        '''Smoothed histogram, with all changes applied.'''
+        self._flush()
+        return self._block
+
+    @property
+    def counts(self):
+        '''Histogram of the weights, before smoothing.'''
+        return self._counts + self._pending
+
+    def add(self, orientations, weights=None):
+        '''
+        Adds orientations to the ODF.
+
+
+        Inputs:
+        --------------
+        orientations : orix.quaternion.Rotation or np.array
+            Orientations, or their quaternions of shape (..., 4).
+
+        weights : np.array
+            Weight of every orientation. If None (default), all weights are 1.
+
+        '''
+        self._update(orientations, weights, 1)
+
+    def remove(self, orientations, weights=None):
+        '''
+        Removes orientations added before from the ODF.
+
+
+        Inputs:
+        --------------
+        orientations : orix.quaternion.Rotation or np.array
+            Orientations, or their quaternions of shape (..., 4).
+
+        weights : np.array
+            Weight the orientations were added with. If None (default), all
+            weights are 1.
+
+        '''
+        self._update(orientations, weights, -1)
+
+    def _update(self, orientations, weights, sign):
+        '''Adds the signed weights to the pending changes.'''
+        q = np.asarray(getattr(orientations, "data", orientations))
+        q = np.ascontiguousarray(q.reshape(-1, 4))
+        if weights is None:
+            weights = np.ones(q.shape[0])
+        weights = sign * np.ravel(np.asarray(weights, dtype=np.float64))
+        if weights.size != q.shape[0]:
+            raise ValueError(
+                f"`weights` must have one value per orientation, {q.shape[0]}, "
+                f"not {weights.size}."
+            )
+        _histogram(
+            q,
+            weights,
+            self._symmetry_q,
+            self.extent,
+            self.space == "cubochoric",
+            self._pending,
+        )
+        self._is_pending = True
+
+    def _flush(self):
+        '''Smooths the pending changes into `block`.'''
+        if not self._is_pending:
+            return
+        n, tile = self.bins, self.tile_size
+        # Reach of the Gaussian kernel, see gaussian_blur.gaussian_kernel
+        reach = int(4 * self.sigma + 0.5)
+        n_tiles = -(-n // tile)
+        padded = np.zeros((n_tiles * tile,) * 3, dtype=bool)
+        padded[:n, :n, :n] = self._pending != 0
+        changed = padded.reshape(n_tiles, tile, n_tiles, tile, n_tiles, tile)
+        changed = np.argwhere(changed.any(axis=(1, 3, 5)))
+
+        self._counts += self._pending
+        if len(changed) * (tile + 2 * reach) ** 3 >= n**3:
+            self._block = gaussian_blur(self._counts, self.sigma)
+        else:
+            for start in changed * tile:
+                inner = tuple(slice(i, min(i + tile, n)) for i in start)
+                outer = tuple(
+                    slice(max(i - reach, 0), min(i + tile + reach, n)) for i in start
+                )
+                change = np.zeros(self._pending[outer].shape)
+                local = tuple(
+                    slice(i.start - o.start, i.stop - o.start)
+                    for i, o in zip(inner, outer)
+                )
+                change[local] = self._pending[inner]
+                self._block[outer] += gaussian_blur(change, self.sigma)
+        self._pending[:] = 0
+        self._is_pending = False
+
+
+# ============================ #
+#          Functions           #
+# ============================ #
+
+def quaternion_to_mrp(orientations):
+    '''
+    Returns the modified Rodrigues parameters (MRPs) x, y, z / (1 + w) of
+    orientations, with the sign of every quaternion chosen so that w >= 0 and
+    the MRPs lie within the unit ball.
+
+
+    Inputs:
+    --------------
+    orientations : orix.quaternion.Rotation or np.array
+        Orientations, or their quaternions (w, x, y, z) of shape (..., 4).
+
+
+    Outputs:
+    --------------
+    mrp : np.array
+        MRPs of shape (..., 3).
+
+    '''
+    q = np.asarray(getattr(orientations, "data", orientations), dtype=np.float64)
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    w = np.abs(q[..., :1])
+    return np.copysign(1, q[..., :1]) * q[..., 1:] / (1 + w)
+
+
+def quaternion_to_cubochoric(orientations):
+    '''
+    Returns the cubochoric coordinates of orientations, the equal-volume
+    mapping of rotations onto a cube of half edge length pi**(2/3) / 2,
+    computed in parallel with orix.quaternion._conversions.qu2cu.
+
+
+    Inputs:
+    --------------
+    orientations : orix.quaternion.Rotation or np.array
+        Orientations, or their quaternions (w, x, y, z) of shape (..., 4).
+
+
+    Outputs:
+    --------------
+    cu : np.array
+        Cubochoric coordinates of shape (..., 3).
+
+    '''
+    q = np.asarray(getattr(orientations, "data", orientations), dtype=np.float64)
+    shape = q.shape[:-1]
+    q = q.reshape(-1, 4)
+    q = np.ascontiguousarray(q / np.linalg.norm(q, axis=-1, keepdims=True))
+    return qu2cu(q).reshape(shape + (3,))
+
+
+def project_to_fundamental_zone(orientations, symmetry):
+    '''
+    Returns the symmetrically equivalent quaternions s * q with the smallest
+    rotation angle, in the fundamental zone of the proper rotations of the
+    symmetry, with w >= 0.
+
+
+    Inputs:
+    --------------
+    orientations : orix.quaternion.Rotation or np.array
+        Orientations, or their quaternions (w, x, y, z) of shape (..., 4).
+
+    symmetry : orix.quaternion.Symmetry
+        Crystal symmetry, acting from the left.
+
+
+    Outputs:
+    --------------
+    q : np.array
+        Quaternions of shape (..., 4).
+
+    '''
+    q = np.asarray(getattr(orientations, "data", orientations), dtype=np.float64)
+    projected = np.empty(q.shape)
+    _project(
+        np.ascontiguousarray(q.reshape(-1, 4)),
+        _proper_rotations(symmetry),
+        projected.reshape(-1, 4),
+    )
+    return projected
+
+
+def fundamental_zone_extent(symmetry, space="mrp"):
+    '''
+    Returns the half edge length of a cube of MRPs centred on the identity
+    which contains the fundamental zone, tan(omega / 4) with omega the largest
+    rotation angle in the fundamental zone, or 1 if the fundamental zone is
+    unbounded or `symmetry` is None.
+
+    For cubochoric coordinates, `space` is "cubochoric", the half edge length
+    is (pi / 6)**(1/3) times the length of the homochoric vector of omega,
+    (3 / 4 * (omega - sin(omega)))**(1/3), or pi**(2/3) / 2 for the whole
+    cube.
+
+    '''
+    omega = np.pi
+    if symmetry is not None:
+        vertices = OrientationRegion.from_symmetry(symmetry).vertices()
+        if vertices.size != 0:
+            omega = vertices.angle.max()
+    if space == "cubochoric":
+        homochoric = (0.75 * (omega - np.sin(omega))) ** (1 / 3)
+        return float((np.pi / 6) ** (1 / 3) * homochoric)
+    return float(np.tan(omega / 4))
+
+
+def _check_space(space):
+    """Raise a ValueError if `space` is not a binning space."""
+    if space not in _SPACES:
+        raise ValueError(f"`space` must be one of {_SPACES}, not '{space}'.")
+
+
+def _proper_rotations(symmetry):
+    """Quaternions of the proper rotations of a symmetry, or the
+    identity.
+    """
+    if symmetry is None:
+        return np.array([[1.0, 0, 0, 0]])
+    return np.ascontiguousarray(symmetry.proper_subgroup.data)
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _fundamental_zone(a2, b2, c2, d2, symmetry):
+    """The quaternion s * q with the largest |w|, with w >= 0, of a
+    quaternion q = (a2, b2, c2, d2).
+    """
+    best = 0
+    best_w = -1.0
+    for k in range(symmetry.shape[0]):
+        w = abs(
+            symmetry[k, 0] * a2
+            - symmetry[k, 1] * b2
+            - symmetry[k, 2] * c2
+            - symmetry[k, 3] * d2
+        )
+        if w > best_w:
+            best, best_w = k, w
+    a1, b1 = symmetry[best, 0], symmetry[best, 1]
+    c1, d1 = symmetry[best, 2], symmetry[best, 3]
+    a = a1 * a2 - b1 * b2 - c1 * c2 - d1 * d2
+    b = a1 * b2 + b1 * a2 + c1 * d2 - d1 * c2
+    c = a1 * c2 - b1 * d2 + c1 * a2 + d1 * b2
+    d = a1 * d2 + b1 * c2 - c1 * b2 + d1 * a2
+    if a < 0:
+        return -a, -b, -c, -d
+    return a, b, c, d
+
+
+@nb.jit(cache=True, nogil=True, nopython=True, parallel=True)
+def _project(q, symmetry, out):
+    """Write the fundamental zone quaternions of `q` to `out`."""
+    for i in nb.prange(q.shape[0]):
+        a, b, c, d = _fundamental_zone(q[i, 0], q[i, 1], q[i, 2], q[i, 3], symmetry)
+        out[i, 0] = a
+        out[i, 1] = b
+        out[i, 2] = c
+        out[i, 3] = d
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _mrp_position(q, i, symmetry, extent, n_bins):
+    """Position of the MRPs of quaternion `i` in the fundamental zone in
+    units of bins of the cube [-extent, extent], with the bin centres at
+    half-integers.
+    """
+    a, b, c, d = _fundamental_zone(q[i, 0], q[i, 1], q[i, 2], q[i, 3], symmetry)
+    norm = np.sqrt(a * a + b * b + c * c + d * d)
+    scale = n_bins / (2 * extent * (norm + a))
+    return (b * scale + n_bins / 2, c * scale + n_bins / 2, d * scale + n_bins / 2)
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _cubochoric_position(q, i, symmetry, extent, n_bins):
+    """Position of the cubochoric coordinates of quaternion `i` in the
+    fundamental zone in units of bins of the cube [-extent, extent], with
+    the bin centres at half-integers.
+    """
+    a, b, c, d = _fundamental_zone(q[i, 0], q[i, 1], q[i, 2], q[i, 3], symmetry)
+    norm = np.sqrt(a * a + b * b + c * c + d * d)
+    x, y, z = qu2cu_single(a / norm, b / norm, c / norm, d / norm)
+    scale = n_bins / (2 * extent)
+    return (x * scale + n_bins / 2, y * scale + n_bins / 2, z * scale + n_bins / 2)
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _bin_position(q, i, symmetry, extent, cubochoric, n_bins):
+    """Position of the MRPs, or cubochoric coordinates if `cubochoric`
+    is True, of quaternion `i`, see _mrp_position and
+    _cubochoric_position.
+    """
+    if cubochoric:
+        return _cubochoric_position(q, i, symmetry, extent, n_bins)
+    return _mrp_position(q, i, symmetry, extent, n_bins)
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _histogram(q, weights, symmetry, extent, cubochoric, counts):
+    """Add the weight of every quaternion to its bin in `counts`."""
+    n = counts.shape[0]
+    for i in range(q.shape[0]):
+        x, y, z = _bin_position(q, i, symmetry, extent, cubochoric, n)
+        ix = int(min(max(x, 0.0), n - 1.0))
+        iy = int(min(max(y, 0.0), n - 1.0))
+        iz = int(min(max(z, 0.0), n - 1.0))
+        counts[ix, iy, iz] += weights[i]
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _histogram_coordinates(xyz, extent, counts):
+    """Add one to the bin in `counts` of every point of MRPs or cubochoric
+    coordinates in the cube [-extent, extent].
+    """
+    n = counts.shape[0]
+    scale = n / (2 * extent)
+    for i in range(xyz.shape[0]):
+        x = xyz[i, 0] * scale + n / 2
+        y = xyz[i, 1] * scale + n / 2
+        z = xyz[i, 2] * scale + n / 2
+        ix = int(min(max(x, 0.0), n - 1.0))
+        iy = int(min(max(y, 0.0), n - 1.0))
+        iz = int(min(max(z, 0.0), n - 1.0))
+        counts[ix, iy, iz] += 1
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _nearest(block, x, y, z):
+    """Value of the bin at a position in units of bins."""
+    n = block.shape[0]
+    # Clipped in floating point first, so that NaN and huge values cannot
+    # overflow the integer conversion
+    ix = int(min(max(x, 0.0), n - 1.0))
+    iy = int(min(max(y, 0.0), n - 1.0))
+    iz = int(min(max(z, 0.0), n - 1.0))
+    return block[ix, iy, iz]
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _trilinear(block, x, y, z):
+    """Trilinear interpolation of the bins around a position in units of
+    bins, constant beyond the outermost bin centres.
+    """
+    n = block.shape[0]
+    last = max(n - 2, 0)
+    x = min(max(x - 0.5, 0.0), n - 1.0)
+    y = min(max(y - 0.5, 0.0), n - 1.0)
+    z = min(max(z - 0.5, 0.0), n - 1.0)
+    ix, iy, iz = min(int(x), last), min(int(y), last), min(int(z), last)
+    tx = min(x - ix, 1.0)
+    ty = min(y - iy, 1.0)
+    tz = min(z - iz, 1.0)
+    jx, jy, jz = min(ix + 1, n - 1), min(iy + 1, n - 1), min(iz + 1, n - 1)
+    c00 = block[ix, iy, iz] * (1 - tx) + block[jx, iy, iz] * tx
+    c10 = block[ix, jy, iz] * (1 - tx) + block[jx, jy, iz] * tx
+    c01 = block[ix, iy, jz] * (1 - tx) + block[jx, iy, jz] * tx
+    c11 = block[ix, jy, jz] * (1 - tx) + block[jx, jy, jz] * tx
+    c0 = c00 * (1 - ty) + c10 * ty
+    c1 = c01 * (1 - ty) + c11 * ty
+    return c0 * (1 - tz) + c1 * tz
+
+
+# The space is chosen in ODF.query() and not per orientation, so that the
+# MRP kernels do not carry the cubochoric conversion in their loops
+
+
+@nb.jit(cache=True, nogil=True, nopython=True, parallel=True)
+def _lookup_nearest_mrp(q, symmetry, extent, block, out):
+    """Write the value of the bin of every quaternion's MRPs to `out`."""
+    n = block.shape[0]
+    for i in nb.prange(q.shape[0]):
+        x, y, z = _mrp_position(q, i, symmetry, extent, n)
+        out[i] = _nearest(block, x, y, z)
+
+
+@nb.jit(cache=True, nogil=True, nopython=True, parallel=True)
+def _lookup_trilinear_mrp(q, symmetry, extent, block, out):
+    """Write the trilinear interpolation of the bins around every
+    quaternion's MRPs to `out`.
+    """
+    n = block.shape[0]
+    for i in nb.prange(q.shape[0]):
+        x, y, z = _mrp_position(q, i, symmetry, extent, n)
+        out[i] = _trilinear(block, x, y, z)
+
+
+@nb.jit(cache=True, nogil=True, nopython=True, parallel=True)
+def _lookup_nearest_cubochoric(q, symmetry, extent, block, out):
+    """Write the value of the bin of every quaternion's cubochoric
+    coordinates to `out`.
+    """
+    n = block.shape[0]
+    for i in nb.prange(q.shape[0]):
+        x, y, z = _cubochoric_position(q, i, symmetry, extent, n)
+        out[i] = _nearest(block, x, y, z)
+
 
-        # NOTE: This line needs a comment to describe what it does. It is unclear.
-        indices = ((((self.orientation_xyz+1)/2) * self.bins).astype('uint'))
+@nb.jit(cache=True, nogil=True, nopython=True, parallel=True)
+def _lookup_trilinear_cubochoric(q, symmetry, extent, block, out):
+    """Write the trilinear interpolation of the bins around every
+    quaternion's cubochoric coordinates to `out`.
+    """
+    n = block.shape[0]
+    for i in nb.prange(q.shape[0]):
+        x, y, z = _cubochoric_position(q, i, symmetry, extent, n)
+        out[i] = _trilinear(block, x, y, z)
 
-        likelihood = [self.block[ind[0],ind[1],ind[2]] for ind in indices]
 
-        return likelihood
\ No newline at end of file
+_LOOKUPS = {
+    ("mrp", False): _lookup_nearest_mrp,
+    ("mrp", True): _lookup_trilinear_mrp,
+    ("cubochoric", False): _lookup_nearest_cubochoric,
+    ("cubochoric", True): _lookup_trilinear_cubochoric,
+}
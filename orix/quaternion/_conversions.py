@@ -174,6 +174,150 @@ def cu2ho(cu):
     return ho
 
 
+@nb.jit(
+    "UniTuple(float64, 3)(float64, float64, float64)",
+    cache=True,
+    nogil=True,
+    nopython=True,
+)
+def ho2cu_single(x, y, z):
+    """Conversion from a single set of homochoric coordinates to
+    cubochoric coordinates, the inverse of :func:`cu2ho_single`
+    :cite:`singh2016orientation`.
+
+    Parameters
+    ----------
+    x, y, z : float
+        Homochoric coordinates as 64-bit floats.
+
+    Returns
+    -------
+    cu : tuple of float
+        Cubochoric coordinates (x, y, z) as 64-bit floats.
+
+    Notes
+    -----
+    This function is optimized with Numba, so care must be taken with
+    data types.
+    """
+    rs = np.sqrt(x * x + y * y + z * z)
+    if rs == 0:
+        return 0.0, 0.0, 0.0
+
+    # Order the coordinates as for the top and bottom pyramids
+    pyramid = get_pyramid_single(np.array([x, y, z]))
+    if pyramid == 3 or pyramid == 4:
+        x, y, z = y, z, x
+    elif pyramid == 5 or pyramid == 6:
+        x, y, z = z, x, y
+
+    # Undo the scaling of the square section onto the ball
+    scale = np.sqrt(2 * rs / (rs + abs(z)))
+    t1, t2 = x * scale, y * scale
+    cz = np.copysign(rs * np.sqrt(np.pi / 6), z)
+
+    # Inverse of the equal-area map of the square onto the section
+    c = t1 * t1 + t2 * t2
+    if c == 0:
+        cx = cy = 0.0
+    else:
+        prefactor = (
+            (3 * np.pi / 4) ** (1 / 3)
+            * 2 ** (1 / 4)
+            / (np.pi ** (5 / 6) / 6 ** (1 / 6) / 2)
+        )
+        sqrt2 = np.sqrt(2)
+        if abs(t2) <= abs(t1):
+            t = t1 + np.copysign(np.sqrt(t1 * t1 + c), t1)
+            q = np.arctan(t2 / (t + t1))
+            cx = t * np.sqrt(sqrt2 - np.cos(q)) / prefactor
+            cy = cx * q * 12 / np.pi
+        else:
+            t = t2 + np.copysign(np.sqrt(t2 * t2 + c), t2)
+            q = np.arctan(t1 / (t + t2))
+            cy = t * np.sqrt(sqrt2 - np.cos(q)) / prefactor
+            cx = cy * q * 12 / np.pi
+
+    # Scale by the grid parameter ratio
+    scale = (6 / np.pi) ** (1 / 6)
+    cx, cy, cz = cx * scale, cy * scale, cz * scale
+
+    if pyramid == 3 or pyramid == 4:
+        return cz, cx, cy
+    elif pyramid == 5 or pyramid == 6:
+        return cy, cz, cx
+    return cx, cy, cz
+
+
+@nb.jit(
+    "UniTuple(float64, 3)(float64, float64, float64, float64)",
+    cache=True,
+    nogil=True,
+    nopython=True,
+)
+def qu2cu_single(a, b, c, d):
+    """Conversion from a single unit quaternion to cubochoric
+    coordinates, via homochoric coordinates
+    :cite:`rowenhorst2015consistent`.
+
+    Parameters
+    ----------
+    a, b, c, d : float
+        Unit quaternion as 64-bit floats. The quaternion and its
+        negative give the same coordinates.
+
+    Returns
+    -------
+    cu : tuple of float
+        Cubochoric coordinates (x, y, z) as 64-bit floats, within the
+        cube of half edge length :math:`\\pi^{2/3} / 2`.
+
+    Notes
+    -----
+    This function is optimized with Numba, so care must be taken with
+    data types.
+    """
+    if a < 0:
+        a, b, c, d = -a, -b, -c, -d
+    s = np.sqrt(b * b + c * c + d * d)
+    if s == 0:
+        return 0.0, 0.0, 0.0
+    omega = 2 * np.arccos(min(a, 1.0))
+    # sin(omega) = 2 * a * s
+    f = (0.75 * (omega - 2 * a * s)) ** (1 / 3) / s
+    return ho2cu_single(b * f, c * f, d * f)
+
+
+@nb.jit(
+    "float64[:, :](float64[:, :])", cache=True, nogil=True, nopython=True, parallel=True
+)
+def qu2cu(qu):
+    """Conversion from multiple unit quaternions to cubochoric
+    coordinates, see :func:`qu2cu_single`.
+
+    Parameters
+    ----------
+    qu : numpy.ndarray
+        2D array of n (a, b, c, d) as 64-bit floats.
+
+    Returns
+    -------
+    cu : numpy.ndarray
+        2D array of n (x, y, z) as 64-bit floats.
+
+    Notes
+    -----
+    This function is optimized with Numba, so care must be taken with
+    array shapes and data types. Quaternions are converted in parallel.
+    """
+    cu = np.zeros((qu.shape[0], 3))
+    for i in nb.prange(qu.shape[0]):
+        cu[i, 0], cu[i, 1], cu[i, 2] = qu2cu_single(
+            qu[i, 0], qu[i, 1], qu[i, 2], qu[i, 3]
+        )
+    return cu
+
+
 @nb.jit("float64[:](float64[:])", cache=True, nogil=True, nopython=True)
 def ho2ax_single(ho):
     """Conversion from a single set of homochoric coordinates to an
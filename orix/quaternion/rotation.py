@@ -641,16 +641,32 @@ class Rotation(Quaternion):
         shape = (shape,) if isinstance(shape, int) else shape
         reference = Rotation(reference)
         n = int(np.prod(shape))
-        sample_size = int(alpha) * n
-        rotations = []
-        f_max = von_mises(reference, alpha, reference)
-        while len(rotations) < n:
-            rotation = cls.random(sample_size)
-            f = von_mises(rotation, alpha, reference)
-            x = np.random.rand(sample_size)
-            rotation = rotation[x * f_max < f]
-            rotations += list(rotation)
-        return cls.stack(rotations[:n]).reshape(*shape)
+        # The angle to the reference has a density proportional to
+        # sin^2(omega / 2) exp(2 alpha cos(omega)), sampled by linear
+        # interpolation in its inverse cumulative distribution on a
+        # grid. The density is scaled by exp(-2 alpha) to avoid
+        # overflow, and is negligible beyond 12 / sqrt(alpha).
+        m = 2**14
+        omega_max = np.pi if alpha <= 0 else min(np.pi, 12 / np.sqrt(alpha))
+        omega = np.linspace(0, omega_max, m)
+        pdf = np.sin(omega / 2) ** 2 * np.exp(2 * alpha * (np.cos(omega) - 1))
+        cdf = np.concatenate([[0], np.cumsum(pdf[1:] + pdf[:-1])])
+        inverse_cdf = np.interp(np.linspace(0, cdf[-1], m), cdf, omega)
+        u = np.random.rand(n) * (m - 1)
+        i = np.minimum(u.astype(int), m - 2)
+        angle = inverse_cdf[i] + (u - i) * (inverse_cdf[i + 1] - inverse_cdf[i])
+        # Uniformly distributed axes
+        z = np.random.uniform(-1, 1, n)
+        phi = np.random.uniform(0, 2 * np.pi, n)
+        r = np.sqrt(1 - z**2)
+        axis = np.column_stack((r * np.cos(phi), r * np.sin(phi), z))
+        q = np.column_stack(
+            (np.cos(angle / 2), np.sin(angle / 2)[:, np.newaxis] * axis)
+        )
+        # Left multiplication by the reference as a matrix product
+        a, b, c, d = reference.data.reshape(4)
+        left = np.array([[a, -b, -c, -d], [b, a, -d, c], [c, d, a, -b], [d, -c, b, a]])
+        return cls((q @ left.T).reshape(shape + (4,)))
 
     @property
     def antipodal(self):
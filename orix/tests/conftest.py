@@ -655,3 +655,44 @@ def crystal_map_input(request, rotations):
 @pytest.fixture
 def crystal_map(crystal_map_input):
     return CrystalMap(**crystal_map_input)
+
+
+@pytest.fixture(
+    params=[
+        (
+            (36, 40),  # map_shape
+            "KS",  # orientation relationship
+            0,  # random seed
+        )
+    ]
+)
+def martensite_map(request):
+    """Martensite map of two parent grains, the left and right half of
+    the map, each filled with three rows wide bands of random variants.
+
+    Returns the map, the parent quaternions and the parent index of each
+    point.
+    """
+    from orix.crystal_map import Phase
+    from orix.quaternion.symmetry import O
+    from reconstruction._util import qu_multiply
+    from reconstruction.modules import yardley_variants
+
+    (ny, nx), orientation_relationship, seed = request.param
+    rng = np.random.default_rng(seed)
+    variants = Rotation.from_matrix(yardley_variants(orientation_relationship)).data
+    parents = Rotation.from_euler([[0.3, 0.7, 1.1], [2.5, 0.4, 4.0]]).data
+
+    d, map_size = create_coordinate_arrays((ny, nx))
+    parent_index = (d["x"] >= nx // 2).astype(int)
+    band = d["y"].astype(int) // 3
+    n_variants = variants.shape[0]
+    band_variants = np.stack([rng.permutation(n_variants), rng.permutation(n_variants)])
+    variant = band_variants[parent_index, band % n_variants]
+    # Random symmetrically equivalent child orientation in each point
+    s = O.data[rng.integers(0, O.size, map_size)]
+    q = qu_multiply(s, qu_multiply(variants[variant], parents[parent_index]))
+
+    d["rotations"] = Rotation(q)
+    d["phase_list"] = PhaseList(Phase("martensite", point_group="m-3m"))
+    return CrystalMap(**d), parents, parent_index
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018-2022 the orix developers
+#
+# This file is part of orix.
+#
+# orix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# orix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with orix.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+
+from orix.ODF.odf import ODF as LegacyODF
+from orix.odf.fast_odf import (
+    ODF,
+    IncrementalODF,
+    _histogram,
+    fundamental_zone_extent,
+    project_to_fundamental_zone,
+    quaternion_to_cubochoric,
+    quaternion_to_mrp,
+)
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import C4, D6, O
+
+
+def random_quaternions(n, seed=0):
+    q = np.random.default_rng(seed).normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+
+
+class TestFastODF:
+    def test_mrp(self):
+        q = random_quaternions(100)
+        mrp = quaternion_to_mrp(Rotation(q))
+        assert np.allclose(mrp, quaternion_to_mrp(-q))
+        assert np.all(np.linalg.norm(mrp, axis=1) <= 1)
+        # MRPs are tan(omega / 4) times the rotation axis
+        angle = 2 * np.arccos(np.abs(q[:, 0]))
+        assert np.allclose(np.linalg.norm(mrp, axis=1), np.tan(angle / 4))
+
+    def test_histogram(self):
+        q = random_quaternions(1000)
+        odf = ODF(q, sigma=0, bin_number=8)
+        assert odf.block.shape == (8, 8, 8)
+        assert odf.bins == 8
+        assert np.isclose(odf.block.sum(), 1000)
+
+    def test_query(self):
+        odf = ODF(random_quaternions(10000), sigma=1, bin_number=20)
+        q = random_quaternions(500, seed=1)
+        index = np.clip(((quaternion_to_mrp(q) + 1) * 10).astype(int), 0, 19)
+        expected = odf.block[tuple(index.T)]
+        assert np.allclose(odf.query(Rotation(q)), expected)
+        assert np.allclose(odf.query(-q.astype(np.float32)), expected)
+        assert np.allclose(odf(q), expected)
+
+        likelihood = odf.query(q.reshape(5, 100, 4), interpolate=True)
+        assert likelihood.shape == (5, 100)
+
+    def test_query_interpolate(self):
+        odf = ODF(random_quaternions(10000), sigma=1, bin_number=10)
+        # Bin centres, the point between two centres, and beyond the centres
+        w = 0.5
+        centres = (np.arange(10) + 0.5) / 5 - 1
+        mrp = np.array(
+            [
+                [centres[3], centres[4], centres[5]],
+                [(centres[3] + centres[4]) / 2, centres[4], centres[5]],
+                [-0.95, centres[4], centres[5]],
+            ]
+        )
+        # Quaternions of MRPs p: (1 - |p|^2, 2 p) / (1 + |p|^2)
+        norm2 = np.sum(mrp**2, axis=1, keepdims=True)
+        q = np.hstack([1 - norm2, 2 * mrp]) / (1 + norm2)
+        assert np.allclose(quaternion_to_mrp(q), mrp)
+        block = odf.block
+        expected = [
+            block[3, 4, 5],
+            w * block[3, 4, 5] + w * block[4, 4, 5],
+            block[0, 4, 5],
+        ]
+        assert np.allclose(odf.query(q, interpolate=True), expected)
+
+
+class TestCubochoricODF:
+    def test_cubochoric(self):
+        q = random_quaternions(100)
+        cu = quaternion_to_cubochoric(Rotation(q))
+        assert cu.shape == (100, 3)
+        assert np.allclose(cu, quaternion_to_cubochoric(-2 * q))
+        assert np.all(np.abs(cu) <= np.pi ** (2 / 3) / 2)
+        assert quaternion_to_cubochoric(q.reshape(5, 20, 4)).shape == (5, 20, 3)
+
+    def test_equal_volume(self):
+        # Uniformly random rotations fill the bins of the cube equally, up to
+        # Poisson noise, but not the bins of MRPs
+        q = random_quaternions(200000)
+        counts = ODF(q, sigma=0, bin_number=8, space="cubochoric").block
+        assert counts.std() < 1.2 * np.sqrt(counts.mean())
+        counts_mrp = ODF(q, sigma=0, bin_number=8).block
+        assert counts_mrp.std() > 10 * np.sqrt(counts_mrp.mean())
+
+    def test_query(self):
+        odf = ODF(random_quaternions(10000), 1, 20, space="cubochoric")
+        assert odf.space == "cubochoric"
+        assert np.isclose(odf.extent, np.pi ** (2 / 3) / 2)
+        q = random_quaternions(500, seed=1)
+        index = (quaternion_to_cubochoric(q) / odf.extent + 1) * 10
+        expected = odf.block[tuple(np.clip(index.astype(int), 0, 19).T)]
+        assert np.allclose(odf.query(q), expected)
+
+    @pytest.mark.parametrize("symmetry, angle", [(O, 62.7994), (D6, 93.8410)])
+    def test_query_symmetric(self, symmetry, angle):
+        omega = np.deg2rad(angle)
+        extent = fundamental_zone_extent(symmetry, "cubochoric")
+        ho = (0.75 * (omega - np.sin(omega))) ** (1 / 3)
+        assert np.isclose(extent, ho * (np.pi / 6) ** (1 / 3), atol=1e-5)
+
+        q = random_quaternions(20000)
+        odf = ODF(q, sigma=1, bin_number=20, symmetry=symmetry, space="cubochoric")
+        assert np.isclose(odf.block.sum(), q.shape[0])
+        assert np.all(np.abs(odf.orientation_xyz) <= odf.extent + 1e-12)
+        q_query = random_quaternions(100, seed=1)
+        s = symmetry.proper_subgroup.data
+        for interpolate in [False, True]:
+            likelihood = odf.query(q_query, interpolate)
+            equivalent = odf.query(Rotation(s[-1]) * Rotation(q_query), interpolate)
+            assert np.allclose(likelihood, equivalent)
+
+    def test_incremental(self):
+        q = random_quaternions(1000)
+        odf = IncrementalODF(sigma=1, bin_number=12, space="cubochoric")
+        odf.add(q)
+        expected = ODF(q, sigma=1, bin_number=12, space="cubochoric")
+        assert np.allclose(odf.query(q), expected.query(q), rtol=1e-5)
+
+    def test_space_raises(self):
+        with pytest.raises(ValueError, match="`space` must be one of"):
+            ODF(random_quaternions(10), space="euler")
+        with pytest.raises(ValueError, match="`space` must be one of"):
+            IncrementalODF(space="euler")
+
+
+class TestFundamentalZoneODF:
+    def test_project(self):
+        q = random_quaternions(500)
+        projected = project_to_fundamental_zone(Rotation(q), O)
+        assert np.all(projected[:, 0] >= 0)
+        equivalent = (O.outer(Rotation(q))).data
+        assert np.allclose(projected[:, 0], np.abs(equivalent[..., 0]).max(axis=0))
+        assert np.allclose(project_to_fundamental_zone(equivalent[5], O), projected)
+
+    @pytest.mark.parametrize(
+        "symmetry, angle", [(O, 62.7994), (D6, 93.8410), (C4, 180)]
+    )
+    def test_extent(self, symmetry, angle):
+        extent = fundamental_zone_extent(symmetry)
+        assert np.isclose(extent, np.tan(np.deg2rad(angle) / 4), atol=1e-5)
+
+    @pytest.mark.parametrize("symmetry", [O, D6])
+    def test_query_symmetric(self, symmetry):
+        q = random_quaternions(20000)
+        odf = ODF(q, sigma=1, bin_number=20, symmetry=symmetry)
+        assert odf.symmetry == symmetry
+        assert np.isclose(odf.block.sum(), q.shape[0])
+        assert np.all(np.abs(odf.orientation_xyz) <= odf.extent)
+
+        q_query = random_quaternions(100, seed=1)
+        s = symmetry.proper_subgroup.data
+        for interpolate in [False, True]:
+            likelihood = odf.query(q_query, interpolate)
+            equivalent = odf.query(Rotation(s[-1]) * Rotation(q_query), interpolate)
+            assert np.allclose(likelihood, equivalent)
+
+    def test_bin_count(self):
+        q = random_quaternions(1000)
+        odf = LegacyODF(q, sigma=0, bin_count=6, symmetry=O)
+        assert odf.block.shape == (6, 6, 6)
+        assert np.allclose(odf.query(q), ODF(q, 0, 6, symmetry=O).query(q))
+
+
+class TestIncrementalODF:
+    @pytest.mark.parametrize("symmetry", [None, O])
+    def test_add_remove(self, symmetry):
+        q = random_quaternions(5000)
+        odf = IncrementalODF(q[:3000], sigma=1.5, bin_number=16, symmetry=symmetry)
+        odf.add(q[3000:], np.ones(2000))
+        odf.remove(Rotation(q[:1000]))
+        expected = ODF(q[1000:], sigma=1.5, bin_number=16, symmetry=symmetry)
+        assert np.allclose(odf.counts.sum(), 4000)
+        assert np.allclose(odf.block, expected.block)
+        assert np.allclose(odf.query(q), expected.query(q))
+
+    def test_tiles(self):
+        q = random_quaternions(5000)
+        odf = IncrementalODF(q, sigma=1, bin_number=40, tile_size=4)
+        odf.block
+        # A cluster at the identity and one at the edge of the cube
+        cluster = np.hstack([np.ones((50, 1)), 0.01 * random_quaternions(50)[:, 1:]])
+        edge = 0.01 * random_quaternions(50, seed=1)
+        edge[:, 1] = 1
+        changed = np.vstack([cluster, edge])
+        changed /= np.linalg.norm(changed, axis=1)[:, np.newaxis]
+        weights = np.linspace(0.5, 2, 100)
+        odf.add(changed, weights)
+        odf.remove(changed[:10], weights[:10])
+        assert odf._is_pending
+        odf.query(q[:1])
+        assert not odf._is_pending
+        assert not odf._pending.any()
+
+        counts = np.zeros((40, 40, 40))
+        _histogram(
+            changed[10:], weights[10:], np.array([[1.0, 0, 0, 0]]), 1, False, counts
+        )
+        expected = gaussian_filter(ODF(q, sigma=0, bin_number=40).block + counts, 1)
+        assert np.allclose(odf.block, expected)
+
+    def test_empty(self):
+        odf = IncrementalODF(bin_number=4)
+        assert np.all(odf.block == 0)
+        assert np.all(odf.query(random_quaternions(3)) == 0)
+
+    def test_weights_raises(self):
+        odf = IncrementalODF(bin_number=4)
+        with pytest.raises(ValueError, match="`weights` must have one value per"):
+            odf.add(random_quaternions(3), np.ones(2))
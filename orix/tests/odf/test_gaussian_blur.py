@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Copyright 2018-2022 the orix developers
+#
+# This file is part of orix.
+#
+# orix is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# orix is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with orix.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+
+from orix.odf.gaussian_blur import gaussian_blur, gaussian_kernel
+
+
+@pytest.fixture
+def grid():
+    return np.random.default_rng(0).random((20, 13, 17))
+
+
+class TestGaussianBlur:
+    @pytest.mark.parametrize("method", ["direct", "fft", "auto"])
+    @pytest.mark.parametrize("mode", ["reflect", "wrap"])
+    @pytest.mark.parametrize("sigma", [0.5, 1, 3, 12])
+    def test_gaussian_filter(self, grid, method, mode, sigma):
+        # Kernels longer than an axis wrap or mirror more than once
+        expected = gaussian_filter(grid, sigma, mode=mode)
+        blurred = gaussian_blur(grid, sigma, mode=mode, method=method)
+        assert blurred.dtype == np.float64
+        assert np.allclose(blurred, expected)
+
+    def test_per_axis(self, grid):
+        sigma = (2, 0, 1)
+        mode = ("wrap", "reflect", "reflect")
+        expected = gaussian_filter(grid, sigma, mode=mode)
+        assert np.allclose(gaussian_blur(grid, sigma, mode), expected)
+
+    @pytest.mark.parametrize("method", ["direct", "fft"])
+    def test_in_place(self, grid, method):
+        grid = grid.astype(np.float32)
+        expected = gaussian_filter(grid, 2)
+        blurred = gaussian_blur(grid, 2, method=method, out=grid)
+        assert blurred is grid
+        assert blurred.dtype == np.float32
+        assert np.allclose(blurred, expected, atol=1e-6)
+
+    def test_integer(self):
+        blurred = gaussian_blur(np.eye(5, dtype=int), 1)
+        assert blurred.dtype == np.float32
+        assert np.allclose(blurred, gaussian_filter(np.eye(5), 1))
+
+    def test_kernel(self):
+        weights = gaussian_kernel(2)
+        assert weights.size == 17
+        assert np.isclose(weights.sum(), 1)
+        assert np.allclose(weights, weights[::-1])
+
+    def test_raises(self, grid):
+        with pytest.raises(ValueError, match="`mode` must be one of"):
+            gaussian_blur(grid, 1, mode="nearest")
+        with pytest.raises(ValueError, match="`method` must be"):
+            gaussian_blur(grid, 1, method="dense")
+        with pytest.raises(ValueError, match="`sigma` must have one value"):
+            gaussian_blur(grid, (1, 2))
+        with pytest.raises(ValueError, match="`out` must be a float64 array"):
+            gaussian_blur(grid, 1, out=grid.astype(np.float32))
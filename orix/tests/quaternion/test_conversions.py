@@ -32,9 +32,12 @@ from orix.quaternion._conversions import (
     eu2qu_single,
     ho2ax_single,
     ho2ax,
+    ho2cu_single,
     ho2ro_single,
     ho2ro,
     get_pyramid_single,
+    qu2cu_single,
+    qu2cu,
     ro2ax_single,
     ro2ax,
 )
@@ -205,3 +208,20 @@ class TestRotationConversions:
         assert np.allclose(
             cu2ro.py_func(cubochoric_coordinates), rodrigues_vectors, atol=1e-4
         )
+
+    def test_ho2cu_single(self, cubochoric_coordinates):
+        # The first coordinates are outside the cube
+        for cu in cubochoric_coordinates[1:]:
+            ho = cu2ho_single.py_func(cu)
+            assert np.allclose(ho2cu_single.py_func(*ho), cu, atol=1e-12)
+
+    def test_qu2cu_single(self, quaternions_conversions, cubochoric_coordinates):
+        for qu, cu in zip(quaternions_conversions[1:], cubochoric_coordinates[1:]):
+            qu = qu / np.linalg.norm(qu)
+            assert np.allclose(qu2cu_single.py_func(*qu), cu, atol=1e-3)
+            assert np.allclose(qu2cu_single.py_func(*-qu), cu, atol=1e-3)
+
+    def test_qu2cu(self, quaternions_conversions, cubochoric_coordinates):
+        qu = quaternions_conversions[1:]
+        qu = qu / np.linalg.norm(qu, axis=1, keepdims=True)
+        assert np.allclose(qu2cu(qu), cubochoric_coordinates[1:], atol=1e-3)
@@ -564,6 +564,21 @@ def test_random_vonmises(shape, reference):
     assert isinstance(r, Rotation)
 
 
+@pytest.mark.parametrize("alpha", [0, 1e4, 1e7])
+def test_random_vonmises_angle(alpha):
+    np.random.seed(42)
+    reference = Rotation.from_euler([0.1, 0.2, 0.3])
+    r = Rotation.random_vonmises((100, 100), alpha, reference)
+    assert r.shape == (100, 100)
+    angle = r.angle_with(reference)
+    if alpha == 0:
+        # Uniformly distributed rotations
+        expected = np.pi / 2 + 2 / np.pi
+    else:
+        expected = 2 / np.sqrt(np.pi * alpha)
+    assert np.isclose(angle.mean(), expected, rtol=0.02)
+
+
 class TestFromToMatrix:
     def test_to_matrix(self):
         r = Rotation([[1, 0, 0, 0], [3, 0, 0, 0], [0, 1, 0, 0], [0, 2, 0, 0]])
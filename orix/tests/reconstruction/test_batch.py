@@ -0,0 +1,104 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from orix.io import load, save
+from reconstruction import synthetic_martensite_map
+from reconstruction.batch import main, reconstruct_batch
+
+
+@pytest.fixture
+def scans(tmp_path):
+    """Directory with two synthetic scans and a file which cannot be
+    read.
+    """
+    directory = tmp_path / "scans"
+    directory.mkdir()
+    for i in range(2):
+        xmap, _ = synthetic_martensite_map((30, 30), 2, alpha=20000, seed=i)
+        save(str(directory / f"scan{i}.h5"), xmap)
+    with open(directory / "broken.ang", "w") as f:
+        f.write("not a scan")
+    return directory
+
+
+class TestReconstructBatch:
+    @pytest.mark.filterwarnings("ignore:Input header symmetries")
+    def test_reconstruct_batch(self, scans, tmp_path):
+        output_dir = tmp_path / "parents"
+        rows = reconstruct_batch(
+            str(scans / "*"), str(output_dir), n_processes=1, n_threads=2
+        )
+        assert [os.path.basename(r["filename"]) for r in rows] == [
+            "broken.ang",
+            "scan0.h5",
+            "scan1.h5",
+        ]
+        assert rows[0]["error"].startswith("load: ")
+        assert rows[0]["output"] == ""
+        for row in rows[1:]:
+            assert row["error"] == ""
+            assert row["n_points"] == 900
+            assert row["n_parents"] == 2
+            assert row["reconstructed"] == 1
+            assert row["mean_fit"] < 1
+            for stage in ["load", "reconstruct", "write"]:
+                assert row[f"{stage}_time"] >= 0
+            xmap_parent = load(row["output"])
+            assert xmap_parent.size == 900
+            assert np.unique(xmap_parent.parent_id).size == 2
+
+        with open(output_dir / "summary.csv") as f:
+            summary = list(csv.DictReader(f))
+        assert [r["filename"] for r in summary] == [r["filename"] for r in rows]
+        assert summary[1]["n_parents"] == "2"
+
+    def test_main(self, scans, tmp_path, capsys):
+        output_dir = tmp_path / "parents"
+        main(
+            [
+                str(scans / "scan*.h5"),
+                "-o",
+                str(output_dir),
+                "--n-processes",
+                "1",
+                "--summary",
+                "scans.csv",
+            ]
+        )
+        assert capsys.readouterr().out.count("2 parent grains") == 2
+        assert sorted(os.listdir(output_dir)) == [
+            "scan0_parent.h5",
+            "scan1_parent.h5",
+            "scans.csv",
+        ]
+
+    @pytest.mark.parametrize("child_phase", ["0", "martensite"])
+    def test_main_child_phase(self, scans, tmp_path, capsys, child_phase):
+        main(
+            [
+                str(scans / "scan0.h5"),
+                "-o",
+                str(tmp_path / "parents"),
+                "--n-processes",
+                "1",
+                "--child-phase",
+                child_phase,
+            ]
+        )
+        out = capsys.readouterr().out
+        assert "failed" not in out
+        assert "2 parent grains" in out
+
+    def test_raises(self, scans, tmp_path):
+        with pytest.raises(ValueError, match="No files match"):
+            reconstruct_batch(str(scans / "*.ctf"), str(tmp_path))
+        other = tmp_path / "other"
+        other.mkdir()
+        save(str(other / "scan0.h5"), load(str(scans / "scan0.h5")))
+        with pytest.raises(ValueError, match="must have different file names"):
+            reconstruct_batch(
+                [str(scans / "scan0.h5"), str(other / "scan0.h5")], str(tmp_path)
+            )
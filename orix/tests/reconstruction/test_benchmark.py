@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+
+from reconstruction.benchmark import (
+    QUERY_TARGET,
+    _matched_accuracy,
+    main,
+    query_throughput,
+    run_benchmark,
+)
+
+
+class TestBenchmark:
+    def test_run_benchmark(self, tmp_path):
+        filename = tmp_path / "benchmark.json"
+        output = run_benchmark(
+            [24, 32],
+            n_parents=3,
+            n_labels=4,
+            isolate=False,
+            n_queries=1000,
+            filename=filename,
+        )
+        with open(filename) as f:
+            assert json.load(f) == output
+
+        assert output["settings"]["sizes"] == [24, 32]
+        assert output["settings"]["n_labels"] == 4
+        assert output["metadata"]["numpy"] == np.__version__
+        assert list(output["query_throughput"]) == [
+            "mrp_nearest",
+            "mrp_interpolated",
+            "cubochoric_nearest",
+            "cubochoric_interpolated",
+        ]
+        assert all(rate > 0 for rate in output["query_throughput"].values())
+        results = output["results"]
+        assert [r["n_points"] for r in results] == [24**2, 32**2]
+        for result in results:
+            stages = result["stages"]
+            assert list(stages) == [
+                "generate",
+                "graph",
+                "reconstruct",
+                "likelihood",
+                "cut",
+                "labelling",
+            ]
+            for stage in stages.values():
+                assert stage["time"] >= 0
+                assert stage["peak_rss"] > 0
+            for accuracy in result["accuracy"].values():
+                assert 0.9 < accuracy <= 1
+
+    def test_main(self, tmp_path, capsys):
+        filename = tmp_path / "benchmark.json"
+        main(["--sizes", "16", "--n-parents", "2", "--n-queries", "1000"])
+        out = capsys.readouterr().out
+        assert "256 points: generate" in out
+        assert "ODF query mrp_nearest" in out
+        main(
+            [
+                "--sizes",
+                "16",
+                "--n-parents",
+                "2",
+                "--n-queries",
+                "0",
+                "-o",
+                str(filename),
+            ]
+        )
+        assert filename.exists()
+
+    def test_query_throughput(self):
+        # Guards the lookup kernels against slowing down below the target
+        # of MRP queries, with a margin for interpolation, which is
+        # compute bound at about the target on one core
+        assert query_throughput(2 * 10**6, repeat=5) > QUERY_TARGET
+        assert (
+            query_throughput(2 * 10**6, interpolate=True, repeat=5)
+            > 0.7 * QUERY_TARGET
+        )
+
+    def test_matched_accuracy(self):
+        truth = np.array([0, 0, 0, 1, 1, 2])
+        # Labels are permuted, one point of 0 is wrong, and 2 is not found
+        labels = np.array([5, 5, 3, 3, 3, -1])
+        assert np.isclose(_matched_accuracy(truth, labels), 4 / 6)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from orix.crystal_map import CrystalMap, Phase, PhaseList
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import O
+from reconstruction import reconstruct
+from reconstruction._util import (
+    dot_to_angle,
+    qu_conjugate,
+    qu_multiply,
+    symmetry_reduced_dot,
+)
+from reconstruction.engine import boundary_fit, inverse_variant_table
+from reconstruction.modules import yardley_variants
+
+
+def _or_quaternion(orientation_relationship):
+    return Rotation.from_matrix(yardley_variants(orientation_relationship)).data[0]
+
+
+class TestReconstruct:
+    @pytest.mark.parametrize(
+        "martensite_map, orientation_relationship",
+        [(((36, 40), "KS", 0), "KS"), (((36, 40), "NW", 1), "NW")],
+        indirect=["martensite_map"],
+    )
+    def test_reconstruct(self, martensite_map, orientation_relationship):
+        xmap, parents, parent_index = martensite_map
+        xmap_parent = reconstruct(xmap, orientation_relationship)
+
+        assert isinstance(xmap_parent, CrystalMap)
+        assert xmap_parent.shape == xmap.shape
+        assert xmap_parent.phases_in_data.names == ["austenite"]
+
+        # One parent grain in each half of the map
+        parent_id = xmap_parent.parent_id
+        assert np.unique(parent_id).size == 2
+        for i in range(2):
+            assert np.unique(parent_id[parent_index == i]).size == 1
+
+        # Parent orientations are recovered
+        q = xmap_parent.rotations.data
+        angles = dot_to_angle(symmetry_reduced_dot(parents[parent_index], q, O.data))
+        assert np.allclose(angles, 0, atol=1e-4)
+        assert np.allclose(xmap_parent.fit, 0, atol=1e-4)
+
+    def test_reconstruct_not_indexed(self, martensite_map):
+        xmap, _, _ = martensite_map
+        xmap[xmap.id < 5].phase_id = -1
+        xmap_parent = reconstruct(xmap)
+        assert np.all(xmap_parent.parent_id[:5] == -1)
+        assert np.all(np.isnan(xmap_parent.fit[:5]))
+        assert np.all(xmap_parent.phase_id[:5] == -1)
+        assert np.all(xmap_parent.parent_id[5:] >= 0)
+
+    def test_reconstruct_keeps_properties(self, martensite_map):
+        xmap, _, _ = martensite_map
+        xmap.prop["iq"] = np.arange(xmap.size)
+        xmap_parent = reconstruct(xmap, parent_phase=Phase("gamma", point_group="432"))
+        assert np.allclose(xmap_parent.iq, xmap.iq)
+        assert "gamma" in xmap_parent.phases.names
+
+    def test_reconstruct_child_phase_raises(self, martensite_map):
+        xmap, _, _ = martensite_map
+        xmap.phases.add(Phase("ferrite", point_group="m-3m"))
+        xmap[xmap.id < 10].phase_id = 1
+        with pytest.raises(ValueError, match="pass the name or ID of the child"):
+            _ = reconstruct(xmap)
+        xmap_parent = reconstruct(xmap, child_phase="martensite")
+        assert np.all(xmap_parent.parent_id[:10] == -1)
+
+    def test_reconstruct_no_point_group_raises(self):
+        xmap = CrystalMap.empty((5, 5))
+        with pytest.raises(ValueError, match="The child phase must have a point"):
+            _ = reconstruct(xmap)
+
+
+class TestReconstructionStages:
+    @pytest.mark.parametrize(
+        "orientation_relationship, n_candidates", [("KS", 24), ("NW", 12)]
+    )
+    def test_inverse_variant_table(self, orientation_relationship, n_candidates):
+        t = _or_quaternion(orientation_relationship)
+        inverse_variants, child_to_candidate = inverse_variant_table(t, O.data, O.data)
+        assert inverse_variants.shape == (n_candidates, 4)
+        assert np.unique(child_to_candidate).size == n_candidates
+
+    def test_boundary_fit(self):
+        t = _or_quaternion("KS")
+        variants = Rotation.from_matrix(yardley_variants("KS")).data
+        parent = Rotation.from_euler([1, 2, 3]).data
+        q1 = qu_multiply(variants[[0, 5]], parent)
+        q2 = qu_multiply(variants[[7, 11]], parent)
+        index, fit, k1, k2 = boundary_fit(q1, q2, t, O.data, O.data, np.deg2rad(1))
+
+        assert np.allclose(np.unique(index), [0, 1])
+        assert np.allclose(fit, 0, atol=1e-4)
+        # Every match gives two candidate parents within the threshold
+        t_inv = qu_conjugate(t)
+        c1 = qu_multiply(qu_multiply(t_inv, O.data[k1]), q1[index])
+        c2 = qu_multiply(qu_multiply(t_inv, O.data[k2]), q2[index])
+        angles = dot_to_angle(symmetry_reduced_dot(c1, c2, O.data))
+        assert np.all(angles < np.deg2rad(1))
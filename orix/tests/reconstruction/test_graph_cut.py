@@ -0,0 +1,232 @@
+import itertools
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix, random, triu
+from scipy.sparse.csgraph import maximum_flow
+
+from orix.crystal_map import CrystalMap
+from reconstruction import AlphaExpansion, MaxflowGraph, alpha_expansion, maxflow
+from reconstruction.graph_cut import _potts_energy
+
+
+def _potts_problem(shape, n_labels, seed):
+    rng = np.random.default_rng(seed)
+    graph = CrystalMap.empty(shape).neighbor_graph(connectivity=8)
+    upper = triu(graph, k=1, format="coo")
+    weight = rng.random(upper.nnz).astype(np.float32)
+    graph = csr_matrix((weight, (upper.row, upper.col)), shape=graph.shape)
+    unary = 2 * rng.random((graph.shape[0], n_labels)).astype(np.float32)
+    return graph + graph.T, unary, upper.row, upper.col, weight
+
+
+class TestMaxflow:
+    def test_maxflow_simple(self):
+        graph = csr_matrix(np.array([[0, 2], [1, 0]], dtype=np.float32))
+        flow, is_source = maxflow(graph, [3, 0], [0, 4])
+        assert np.isclose(flow, 2)
+        assert np.all(is_source == [True, False])
+
+    @pytest.mark.parametrize("seed", [0, 1, 2, 3])
+    def test_maxflow_against_scipy(self, seed):
+        rng = np.random.default_rng(seed)
+        n = 40
+        for _ in range(10):
+            # Directed graph with self-loops and one-way edges
+            graph = random(n, n, density=0.15, random_state=rng, format="csr")
+            graph.data = rng.integers(1, 10, graph.nnz).astype(np.float32)
+            source = rng.integers(0, 10, n) * (rng.random(n) < 0.3)
+            sink = rng.integers(0, 10, n) * (rng.random(n) < 0.3)
+            flow, is_source = maxflow(graph, source, sink)
+
+            # Same graph with the source n and the sink n + 1 as nodes
+            coo = graph.tocoo()
+            row = np.concatenate((coo.row, np.full(n, n), np.arange(n)))
+            col = np.concatenate((coo.col, np.arange(n), np.full(n, n + 1)))
+            data = np.concatenate((coo.data, source, sink)).astype(np.int32)
+            keep = (row != col) & (data > 0)
+            full = csr_matrix((data[keep], (row[keep], col[keep])), shape=(n + 2,) * 2)
+            expected = maximum_flow(full, n, n + 1).flow_value
+            assert np.isclose(flow, expected)
+
+            # The cut has the capacity of the maximum flow
+            in_source = np.append(is_source, [True, False])
+            full = full.tocoo()
+            is_cut = in_source[full.row] & ~in_source[full.col]
+            assert np.isclose(full.data[is_cut].sum(), expected)
+
+    def test_maxflow_grid(self):
+        # Noisy binary image is recovered by a cut on the pixel grid
+        rng = np.random.default_rng(42)
+        xmap = CrystalMap.empty((60, 80))
+        graph = xmap.neighbor_graph()
+        graph.data[:] = 1
+        truth = xmap.x > 0.5 * xmap.x.max()
+        signal = truth + rng.normal(0, 0.6, xmap.size)
+        _, is_source = maxflow(
+            graph,
+            2 * np.clip(signal - 0.5, 0, None),
+            2 * np.clip(0.5 - signal, 0, None),
+        )
+        assert np.mean(is_source == truth) > 0.99
+
+
+class TestMaxflowGraph:
+    @pytest.mark.parametrize("seed", [0, 1, 2, 3])
+    def test_warm_start_against_cold(self, seed):
+        rng = np.random.default_rng(seed)
+        n = 40
+        for _ in range(10):
+            graph = random(n, n, density=0.15, random_state=rng, format="coo")
+            graph = graph.tocsr()
+            graph.setdiag(0)
+            graph.eliminate_zeros()
+            graph.data = rng.integers(1, 10, graph.nnz).astype(np.float32)
+            source = rng.integers(0, 10, n) * (rng.random(n) < 0.3)
+            sink = rng.integers(0, 10, n) * (rng.random(n) < 0.3)
+            g = MaxflowGraph(graph, source, sink)
+            _ = g.maxflow()
+
+            coo = graph.tocoo()
+            for _ in range(5):
+                # Increase and decrease capacities, also below the flow
+                edges = rng.choice(coo.nnz, 4, replace=False)
+                capacities = rng.integers(0, 10, 4).astype(np.float32)
+                g.set_edge_capacities(coo.row[edges], coo.col[edges], capacities)
+                coo.data[edges] = capacities
+                nodes = rng.choice(n, 4, replace=False)
+                source[nodes] = rng.integers(0, 10, 4) * (rng.random(4) < 0.5)
+                sink[nodes] = rng.integers(0, 10, 4) * (rng.random(4) < 0.5)
+                g.set_terminal_capacities(nodes, source[nodes], sink[nodes])
+                flow, is_source = g.maxflow()
+
+                expected, _ = maxflow(coo.tocsr(), source, sink)
+                assert np.isclose(flow, expected)
+                is_cut = is_source[coo.row] & ~is_source[coo.col]
+                cut = coo.data[is_cut].sum() + source[~is_source].sum()
+                assert np.isclose(cut + sink[is_source].sum(), expected)
+
+    def test_capacities_and_copy(self):
+        graph = csr_matrix(np.array([[0, 2], [1, 0]], dtype=np.float32))
+        g = MaxflowGraph(graph, [3, 0], [0, 4])
+        assert g.size == 2
+        assert np.allclose(g.edge_capacities, [2, 1])
+        assert not g.source_capacity.flags.writeable
+        g2 = g.copy()
+        g2.set_terminal_capacities([1], 0, 1)
+        assert np.allclose(g.sink_capacity, [0, 4])
+        assert np.allclose(g2.sink_capacity, [0, 1])
+        assert np.isclose(g.maxflow()[0], 2)
+        assert np.isclose(g2.maxflow()[0], 1)
+
+    def test_set_edge_capacities_raises(self):
+        graph = csr_matrix(([2], ([0], [1])), shape=(3, 3))
+        g = MaxflowGraph(graph, [3, 0, 0], [0, 0, 4])
+        # The reverse of an edge can be given a capacity
+        g.set_edge_capacities([1], [0], [1])
+        assert np.allclose(g.edge_capacities, [2])
+        with pytest.raises(ValueError, match="All edges must be in the graph"):
+            g.set_edge_capacities([1], [2], [1])
+
+
+class TestAlphaExpansion:
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_alpha_expansion_two_labels_is_optimal(self, seed):
+        graph, unary, p, q, weight = _potts_problem((2, 4), 2, seed)
+        labels, energy = alpha_expansion(graph, unary)
+        best = min(
+            _potts_energy(unary, np.array(f), p, q, weight)
+            for f in itertools.product(range(2), repeat=8)
+        )
+        assert np.isclose(energy, best, atol=1e-5)
+        assert np.isclose(energy, _potts_energy(unary, labels, p, q, weight))
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_alpha_expansion_bound(self, seed):
+        graph, unary, p, q, weight = _potts_problem((2, 4), 3, seed)
+        start = np.zeros(8, dtype=int)
+        labels, energy = alpha_expansion(graph, unary, labels=start)
+        best = min(
+            _potts_energy(unary, np.array(f), p, q, weight)
+            for f in itertools.product(range(3), repeat=8)
+        )
+        assert best - 1e-5 <= energy <= 2 * best + 1e-5
+        assert energy <= _potts_energy(unary, start, p, q, weight)
+
+    def test_alpha_expansion_denoise(self):
+        rng = np.random.default_rng(0)
+        xmap = CrystalMap.empty((40, 60))
+        graph = xmap.neighbor_graph()
+        graph.data[:] = 0.5
+        truth = (xmap.x // 20).astype(int)
+        unary = rng.random((xmap.size, 3))
+        unary[np.arange(xmap.size), truth] -= 0.5
+        labels, energy = alpha_expansion(graph, unary)
+        assert np.mean(labels == truth) > 0.99
+        _, energy_start = alpha_expansion(graph, unary, max_iter=0)
+        assert energy < energy_start
+
+    def test_alpha_expansion_warm_start(self):
+        rng = np.random.default_rng(1)
+        graph, unary, p, q, weight = _potts_problem((20, 30), 4, 1)
+        expansion = AlphaExpansion(graph, 4)
+        assert expansion.n_labels == 4
+        labels, energy = expansion.minimize(unary)
+        labels2, energy2 = alpha_expansion(graph, unary)
+        assert np.array_equal(labels, labels2)
+        assert np.isclose(energy, energy2)
+
+        # Next pass with a few changed costs, started from the last labels
+        for _ in range(3):
+            nodes = rng.choice(unary.shape[0], 20, replace=False)
+            unary[nodes] = 2 * rng.random((20, 4))
+            labels, energy = expansion.minimize(unary, labels)
+            labels2, energy2 = alpha_expansion(graph, unary, labels2)
+            assert np.array_equal(labels, labels2)
+            assert np.isclose(energy, energy2)
+            assert np.isclose(energy, _potts_energy(unary, labels, p, q, weight))
+
+    def test_alpha_expansion_raises(self):
+        graph, unary, _, _, _ = _potts_problem((2, 4), 3, 0)
+        expansion = AlphaExpansion(graph, 2)
+        with pytest.raises(ValueError, match=r"`unary` must have shape \(8, 2\)"):
+            _ = expansion.minimize(unary)
+
+    def test_alpha_expansion_candidates(self):
+        graph, unary, p, q, weight = _potts_problem((20, 30), 4, 2)
+        # All labels as candidates give the dense result
+        candidates = np.tile(np.arange(4), (unary.shape[0], 1))
+        labels, energy = alpha_expansion(graph, unary, candidates=candidates)
+        labels2, energy2 = alpha_expansion(graph, unary)
+        assert np.array_equal(labels, labels2)
+        assert np.isclose(energy, energy2)
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_alpha_expansion_candidates_bound(self, seed):
+        graph, unary, p, q, weight = _potts_problem((2, 4), 2, seed)
+        rng = np.random.default_rng(seed)
+        candidates = np.array([rng.choice(4, 2, replace=False) for _ in range(8)])
+        candidates[0] = -1
+        labels, energy = alpha_expansion(graph, unary, candidates=candidates)
+        assert labels[0] == -1
+        assert all(labels[i] in candidates[i] for i in range(1, 8))
+
+        def candidate_energy(f):
+            column = np.argmax(candidates == f[:, np.newaxis], axis=1)
+            cost = np.where(f != -1, unary[np.arange(8), column], 0)
+            return cost.sum() + np.sum(weight[f[p] != f[q]])
+
+        assert np.isclose(energy, candidate_energy(labels))
+        best = min(
+            candidate_energy(np.array((-1,) + f))
+            for f in itertools.product(*candidates[1:])
+        )
+        assert best - 1e-5 <= energy <= 2 * best + 1e-5
+
+    def test_alpha_expansion_candidates_raises(self):
+        graph, unary, _, _, _ = _potts_problem((2, 4), 2, 0)
+        candidates = np.tile([0, 1], (8, 1))
+        with pytest.raises(ValueError, match="must have the same shape"):
+            _ = alpha_expansion(graph, unary[:, :1], candidates=candidates)
+        with pytest.raises(ValueError, match="must be a candidate of its node"):
+            _ = alpha_expansion(graph, unary, np.full(8, 2), candidates=candidates)
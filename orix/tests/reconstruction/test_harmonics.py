@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import D6, O
+from reconstruction._util import qu_multiply
+from reconstruction.deLaValeePoussinKernel import ODF, generate_kernel
+from reconstruction.harmonics import (
+    _degree_slice,
+    _wigner_sum,
+    evaluate_fourier,
+    evaluate_fourier_grid,
+    fourier_coefficients,
+    wigner_d,
+)
+
+
+def random_quaternions(n, seed=0):
+    q = np.random.default_rng(seed).normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+
+
+def wigner_matrices(q, bandwidth):
+    f = _wigner_sum(q, np.ones(1), bandwidth)
+    return [
+        f[_degree_slice(l)].reshape(2 * l + 1, 2 * l + 1) for l in range(bandwidth + 1)
+    ]
+
+
+class TestWignerD:
+    def test_degree_one(self):
+        beta = np.linspace(0, np.pi, 5)
+        d = list(wigner_d(beta, 1))[1]
+        c, s = np.cos(beta), np.sin(beta)
+        expected = np.stack(
+            [
+                [(1 + c) / 2, s / np.sqrt(2), (1 - c) / 2],
+                [-s / np.sqrt(2), c, s / np.sqrt(2)],
+                [(1 - c) / 2, -s / np.sqrt(2), (1 + c) / 2],
+            ]
+        ).transpose(2, 0, 1)
+        assert np.allclose(d, expected)
+
+    def test_orthogonal(self):
+        beta = np.linspace(0, np.pi, 7)
+        for l, d in enumerate(wigner_d(beta, 80)):
+            assert d.shape == (7, 2 * l + 1, 2 * l + 1)
+            product = np.einsum("imn,imk->ink", d, d)
+            assert np.allclose(product, np.eye(2 * l + 1), atol=1e-10)
+
+    def test_representation(self):
+        q1, q2 = random_quaternions(2)[:, np.newaxis]
+        d1 = wigner_matrices(q1, 8)
+        d2 = wigner_matrices(q2, 8)
+        d12 = wigner_matrices(qu_multiply(q1, q2), 8)
+        for a, b, ab in zip(d1, d2, d12):
+            assert np.allclose(a @ b, ab)
+
+
+class TestFourierCoefficients:
+    @pytest.mark.parametrize("symmetry", [None, O, D6])
+    def test_kernel_odf(self, symmetry):
+        kernel = generate_kernel(np.deg2rad(20))
+        centers = random_quaternions(20)
+        weights = np.random.default_rng(1).random(20)
+        odf = ODF([], weights, [], symmetry, None, kernel, centers)
+        f_hat = odf.calc_fourier()
+        assert odf.bandwidth == kernel.bandwidth
+        assert np.isclose(f_hat[0], 1)
+
+        q = random_quaternions(30, seed=2)
+        expected = odf.evaluate(q, cutoff=np.pi)
+        values = evaluate_fourier(f_hat, q, chunk_size=7)
+        # Only the truncation of the kernel's Chebyshev coefficients
+        assert np.allclose(values, expected, atol=1e-3 * expected.max())
+
+    def test_symmetric(self):
+        q = random_quaternions(10)
+        f_hat = fourier_coefficients(q, chebyshev=np.ones(5), symmetry=O)
+        equivalent = qu_multiply(O.data[5], q)
+        assert np.allclose(
+            fourier_coefficients(equivalent, chebyshev=np.ones(5), symmetry=O), f_hat
+        )
+
+    def test_shape(self):
+        q = random_quaternions(12).reshape(3, 4, 4)
+        f_hat = fourier_coefficients(q, bandwidth=4, chunk_size=5)
+        assert f_hat.size == 5 * 9 * 11 // 3
+        assert evaluate_fourier(f_hat, q).shape == (3, 4)
+
+    def test_bandwidth_raises(self):
+        with pytest.raises(ValueError, match="`bandwidth` must be given"):
+            fourier_coefficients(random_quaternions(1))
+        with pytest.raises(ValueError, match="is not a number of coefficients"):
+            evaluate_fourier(np.ones(3), random_quaternions(1))
+
+
+class TestEvaluateFourierGrid:
+    @pytest.mark.parametrize("resolution", [30, 90])
+    def test_grid(self, resolution):
+        # Bandwidth 6 is aliased on the 90 degree grid
+        q = random_quaternions(20)
+        f_hat = fourier_coefficients(q, chebyshev=np.ones(7), symmetry=O)
+        values, phi1, Phi, phi2 = evaluate_fourier_grid(
+            f_hat, np.deg2rad(resolution), chunk_size=3
+        )
+        n = 360 // resolution
+        assert values.shape == (n, n // 2 + 1, n)
+        assert np.allclose(phi1, np.deg2rad(np.arange(0, 360, resolution)))
+        assert np.allclose(Phi, np.deg2rad(np.arange(0, 181, resolution)))
+        assert np.allclose(phi2, phi1)
+
+        euler = np.stack(np.meshgrid(phi1, Phi, phi2, indexing="ij"), axis=-1)
+        expected = evaluate_fourier(f_hat, Rotation.from_euler(euler))
+        assert np.allclose(values, expected)
+
+    def test_kernel_odf_grid(self):
+        kernel = generate_kernel(np.deg2rad(15))
+        odf = ODF([], [], [], O, None, kernel, random_quaternions(5))
+        values, phi1, Phi, phi2 = odf.evaluate_grid(np.deg2rad(20))
+        assert len(odf.f_hat) > 0
+        euler = np.stack(np.meshgrid(phi1, Phi, phi2, indexing="ij"), axis=-1)
+        expected = odf.evaluate(Rotation.from_euler(euler), cutoff=np.pi)
+        assert np.allclose(values, expected, atol=1e-3 * expected.max())
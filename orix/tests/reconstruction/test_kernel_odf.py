@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+
+from orix.quaternion import Orientation
+from orix.quaternion.symmetry import O
+from reconstruction._util import qu_multiply, symmetry_reduced_dot
+from reconstruction.deLaValeePoussinKernel import (
+    ODF,
+    clear_kernel_cache,
+    generate_kernel,
+    select_halfwidth,
+)
+
+
+def random_quaternions(n, seed=0):
+    q = np.random.default_rng(seed).normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+
+
+def brute_force(odf, q):
+    """Kernel summed over all symmetrically equivalent pairs."""
+    kernel = odf.odfKernel
+    centers = odf.center
+    weights = np.asarray(odf.weights, dtype=float)
+    if weights.size == 0:
+        weights = np.ones(centers.shape[0])
+    equivalent = qu_multiply(O.data[:, np.newaxis, np.newaxis], q[:, np.newaxis])
+    dot = np.abs(np.sum(equivalent * centers, axis=-1))
+    density = np.sum(weights * kernel.C * dot ** (2 * kernel.kappa), axis=-1)
+    return density.mean(axis=0) / weights.sum()
+
+
+def scattered_quaternions(n, n_grains, scatter, seed=0):
+    """Orientations scattered around a few grain orientations."""
+    rng = np.random.default_rng(seed)
+    axis = rng.normal(size=(n, 3))
+    axis /= np.linalg.norm(axis, axis=1)[:, np.newaxis]
+    angle = np.abs(rng.normal(scale=scatter, size=n))
+    q = np.column_stack([np.cos(angle / 2), np.sin(angle / 2)[:, np.newaxis] * axis])
+    grains = random_quaternions(n_grains, seed=seed + 1)
+    return qu_multiply(q, grains[rng.integers(n_grains, size=n)])
+
+
+class TestKernelODF:
+    def test_evaluate_all_pairs(self):
+        kernel = generate_kernel(np.deg2rad(10))
+        odf = ODF([], [], [], O, None, kernel, random_quaternions(50))
+        q = random_quaternions(40, seed=1)
+        assert np.allclose(odf.evaluate(q, cutoff=np.pi), brute_force(odf, q))
+
+    def test_evaluate_cutoff(self):
+        kernel = generate_kernel(np.deg2rad(5))
+        weights = np.random.default_rng(2).random(200)
+        odf = ODF([], weights, [], O, None, kernel, random_quaternions(200))
+        q = random_quaternions(100, seed=1)
+        expected = brute_force(odf, q)
+        assert np.allclose(odf.evaluate(q), expected, atol=1e-3 * expected.max())
+        # Only the centres themselves are within a tiny cutoff
+        assert np.allclose(odf.evaluate(q, cutoff=1e-6), 0)
+        assert np.all(odf.evaluate(odf.center, cutoff=1e-6) > 0)
+
+    @pytest.mark.parametrize("halfwidth", [2, 5, 10])
+    def test_halfwidth(self, halfwidth):
+        halfwidth = np.deg2rad(halfwidth)
+        odf = ODF([], [], [], None, None, generate_kernel(halfwidth), [[1, 0, 0, 0]])
+        q = Orientation.from_axes_angles([0, 0, 1], [0, halfwidth])
+        peak, half = odf.evaluate(q)
+        assert np.isclose(half / peak, 0.5)
+
+    def test_normalized(self):
+        kernel = generate_kernel(np.deg2rad(15))
+        odf = ODF([], [], [], O, None, kernel, random_quaternions(20))
+        density = odf.evaluate(random_quaternions(20000, seed=1))
+        assert np.isclose(density.mean(), 1, atol=0.05)
+
+    def test_evaluate_shape(self):
+        kernel = generate_kernel(np.deg2rad(10))
+        odf = ODF([], [], [], O, None, kernel, random_quaternions(10))
+        q = random_quaternions(12, seed=1).reshape(3, 4, 4)
+        density = odf.evaluate(Orientation(q))
+        assert density.shape == (3, 4)
+        assert np.allclose(density.ravel(), odf.evaluate(q.reshape(-1, 4)))
+
+    def test_set_centers_weights(self):
+        kernel = generate_kernel(np.deg2rad(10))
+        odf = ODF([], [], [], O, None, kernel, random_quaternions(30))
+        q = random_quaternions(40, seed=1)
+        _ = odf.evaluate(q)
+        # Same number of centres and weights, so the cell lists must not be
+        # reused
+        odf.center = random_quaternions(30, seed=2)
+        assert np.allclose(odf.evaluate(q), brute_force(odf, q), atol=1e-3)
+        odf.weights = np.random.default_rng(3).random(30)
+        assert np.allclose(odf.evaluate(q), brute_force(odf, q), atol=1e-3)
+
+
+class TestKernel:
+    def test_cached(self):
+        clear_kernel_cache()
+        kernel = generate_kernel(np.deg2rad(7))
+        assert generate_kernel(np.deg2rad(7)) is kernel
+        assert generate_kernel(np.deg2rad(8)) is not kernel
+        clear_kernel_cache()
+        assert generate_kernel(np.deg2rad(7)) is not kernel
+
+    @pytest.mark.parametrize("halfwidth", [2, 5, 10])
+    def test_call(self, halfwidth):
+        kernel = generate_kernel(np.deg2rad(halfwidth))
+        assert np.isclose(kernel.halfwidth, np.deg2rad(halfwidth))
+        angle = np.deg2rad([0, halfwidth, 180])
+        values = kernel(np.cos(angle / 2))
+        assert np.allclose(values, [kernel.C, kernel.C / 2, 0])
+        assert np.allclose(kernel(-np.cos(angle / 2)), values)
+
+    def test_call_symmetry_reduced(self):
+        # A single centre ODF is the kernel of symmetry reduced dot products
+        kernel = generate_kernel(np.deg2rad(10))
+        center = random_quaternions(1)
+        q = random_quaternions(30, seed=1)
+        odf = ODF([], [], [], O, None, kernel, center)
+        dot = symmetry_reduced_dot(np.broadcast_to(center, q.shape), q, O.data)
+        assert np.allclose(odf.evaluate(q) * 24, kernel(dot), atol=1e-3 * kernel.C)
+
+
+class TestSelectHalfwidth:
+    def test_leave_one_out(self):
+        q = scattered_quaternions(150, 5, np.deg2rad(3))
+        halfwidths = np.deg2rad([2, 4, 8])
+        halfwidth, log_likelihood = select_halfwidth(q, O, halfwidths)
+        expected = np.zeros(3)
+        for j, h in enumerate(halfwidths):
+            for i in range(q.shape[0]):
+                others = np.delete(q, i, axis=0)
+                odf = ODF([], [], [], O, None, generate_kernel(h), others)
+                density = max(odf.evaluate(q[i]), np.finfo(float).tiny)
+                expected[j] += np.log(density) / q.shape[0]
+        assert np.allclose(log_likelihood, expected)
+        assert halfwidth == halfwidths[np.argmax(expected)]
+
+    def test_scatter(self):
+        # Narrow scatter favours narrow kernels, no texture the widest
+        q = scattered_quaternions(5000, 20, np.deg2rad(1))
+        halfwidth, _ = select_halfwidth(q, O, n_samples=500, seed=0)
+        assert np.deg2rad(1) <= halfwidth <= np.deg2rad(3)
+        q = random_quaternions(2000)
+        halfwidth, log_likelihood = select_halfwidth(q, O, n_samples=500, seed=0)
+        assert halfwidth == np.deg2rad(10)
+        assert log_likelihood[0] < -100
+
+    def test_raises(self):
+        with pytest.raises(ValueError, match="At least two orientations"):
+            select_halfwidth(random_quaternions(1))
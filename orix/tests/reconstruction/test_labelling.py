@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from orix.crystal_map import CrystalMap
+from reconstruction import get_variants, label_variants, reconstruct
+
+
+class TestLabelVariants:
+    @pytest.mark.parametrize(
+        "martensite_map, orientation_relationship",
+        [(((36, 40), "KS", 0), "KS"), (((36, 40), "NW", 1), "NW")],
+        indirect=["martensite_map"],
+    )
+    def test_label_variants(self, martensite_map, orientation_relationship):
+        xmap, _, parent_index = martensite_map
+        xmap_parent = reconstruct(xmap, orientation_relationship)
+        label_variants(xmap, xmap_parent, orientation_relationship)
+
+        table = get_variants(orientation_relationship)
+        variant = xmap_parent.variant_id
+        assert np.all(variant >= 0)
+        assert np.all(xmap_parent.bain_id == table.bain_groups[variant])
+        assert np.all(xmap_parent.packet_id == table.packets[variant])
+        assert np.all(xmap_parent.block_id == table.blocks[variant])
+
+        # One variant per band, different in all bands of a parent
+        band = xmap.y.astype(int) // 3
+        for i in range(2):
+            band_variant = []
+            for j in range(12):
+                is_band = (parent_index == i) & (band == j)
+                assert np.unique(variant[is_band]).size == 1
+                band_variant.append(variant[is_band][0])
+            assert np.unique(band_variant).size == min(12, table.size)
+
+    def test_label_variants_not_reconstructed(self, martensite_map):
+        xmap, _, _ = martensite_map
+        xmap[xmap.id < 5].phase_id = -1
+        xmap_parent = reconstruct(xmap)
+        label_variants(xmap, xmap_parent)
+        for name in ["variant_id", "bain_id", "packet_id", "block_id"]:
+            assert np.all(xmap_parent.prop[name][:5] == -1)
+            assert np.all(xmap_parent.prop[name][5:] >= 0)
+
+    def test_label_variants_raises(self, martensite_map):
+        xmap, _, _ = martensite_map
+        with pytest.raises(ValueError, match="must have the 'parent_id' property"):
+            label_variants(xmap, xmap)
+        with pytest.raises(ValueError, match="must have the same points"):
+            label_variants(xmap, CrystalMap.empty((2, 3)))
+        xmap_parent = reconstruct(xmap)
+        with pytest.raises(ValueError, match="can only be labelled for"):
+            label_variants(xmap, xmap_parent, "Pitsch")
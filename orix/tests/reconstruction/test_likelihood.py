@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from orix.quaternion.symmetry import O
+from reconstruction import get_variants, parent_candidates, parent_likelihood
+from reconstruction._util import (
+    dot_to_angle,
+    qu_conjugate,
+    qu_multiply,
+    symmetry_reduced_dot,
+    unique_modulo_symmetry,
+)
+
+
+def random_quaternions(n, seed=0):
+    q = np.random.default_rng(seed).normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+
+
+def fiber_odf(mode, kappa=50):
+    """Parent ODF peaked at `mode` with cubic symmetry."""
+
+    def odf(q):
+        dot = symmetry_reduced_dot(np.broadcast_to(mode, q.shape), q, O.data)
+        return np.exp(kappa * (dot - 1))
+
+    return odf
+
+
+class TestParentCandidates:
+    @pytest.mark.parametrize("orientation_relationship", ["KS", "NW"])
+    def test_candidates(self, orientation_relationship):
+        parent = random_quaternions(1, seed=1)
+        variants = get_variants(orientation_relationship).rotations.data
+        n = variants.shape[0]
+        q_child = qu_multiply(variants, parent)
+        out = np.zeros((n, n, 4), dtype=np.float32)
+        candidates = parent_candidates(q_child, orientation_relationship, out, 3)
+        assert candidates is out
+        assert np.all(candidates[..., 0] >= 0)
+        assert np.allclose(np.linalg.norm(candidates, axis=-1), 1, atol=1e-6)
+        # The parent is a candidate of every variant
+        dot = symmetry_reduced_dot(
+            np.broadcast_to(parent, (candidates.size // 4, 4)),
+            candidates.reshape(-1, 4).astype(float),
+            O.data,
+        ).reshape(-1, n)
+        assert np.allclose(dot.max(axis=1), 1, atol=1e-6)
+        # Candidates of a child are unique modulo the parent symmetry
+        for c in candidates.astype(float):
+            unique, _ = unique_modulo_symmetry(c, O.data, atol=1e-4)
+            assert unique.size == n
+
+    def test_raises(self):
+        with pytest.raises(ValueError, match="`out` must be a float32 array"):
+            parent_candidates(random_quaternions(3), out=np.zeros((3, 24, 4)))
+
+
+class TestParentLikelihood:
+    def test_top_k(self):
+        parent = random_quaternions(1, seed=2)[0]
+        variants = get_variants("KS").rotations.data
+        rng = np.random.default_rng(3)
+        s = O.data[rng.integers(0, O.size, 50)]
+        q_child = qu_multiply(s, qu_multiply(variants[rng.integers(0, 24, 50)], parent))
+        odf = fiber_odf(parent)
+
+        candidates, likelihood, index = parent_likelihood(
+            q_child, odf, k=3, chunk_size=7
+        )
+        assert candidates.shape == (50, 3, 4)
+        assert likelihood.shape == index.shape == (50, 3)
+        assert np.allclose(likelihood[:, 0], 1, atol=1e-5)
+        assert np.all(np.diff(likelihood, axis=1) <= 0)
+        angle = dot_to_angle(
+            symmetry_reduced_dot(
+                np.broadcast_to(parent, (50, 4)), candidates[:, 0].astype(float), O.data
+            )
+        )
+        assert np.allclose(angle, 0, atol=1e-3)
+
+        # Same as sorting the likelihood of all candidates
+        out = np.empty((50, 24, 4), dtype=np.float32)
+        _, likelihood_all, index_all = parent_likelihood(q_child, odf, k=24, out=out)
+        density = odf(out.reshape(-1, 4)).reshape(50, 24)
+        assert np.allclose(likelihood_all, -np.sort(-density, axis=1), atol=1e-6)
+        assert np.allclose(likelihood_all[:, :3], likelihood)
+        assert np.array_equal(
+            candidates, np.take_along_axis(out, index[..., np.newaxis], axis=1)
+        )
+
+    def test_inverse_variants(self):
+        q_child = random_quaternions(10, seed=4)
+        candidates, _, _ = parent_likelihood(q_child, lambda q: q[:, 0], k=24)
+        # Child orientations are recovered from the candidates by variants
+        variants = get_variants("KS").rotations.data
+        for q, c in zip(q_child, candidates.astype(float)):
+            children = qu_multiply(variants[:, np.newaxis], c)
+            dot = symmetry_reduced_dot(
+                np.broadcast_to(q, (24 * 24, 4)), children.reshape(-1, 4), O.data
+            )
+            assert np.isclose(dot.max(), 1, atol=1e-6)
+
+    @pytest.mark.parametrize("k", [0, 25])
+    def test_raises(self, k):
+        with pytest.raises(ValueError, match="`k` must be in the range"):
+            parent_likelihood(random_quaternions(2), lambda q: q[:, 0], k=k)
@@ -0,0 +1,135 @@
+from h5py import File
+import numpy as np
+import pytest
+
+from orix.crystal_map import Phase
+from reconstruction import (
+    Checkpoint,
+    get_variants,
+    reconstruct,
+    reconstruct_pipeline,
+    synthetic_martensite_map,
+)
+import reconstruction.pipeline as pipeline
+
+
+@pytest.fixture
+def synthetic_map():
+    xmap, _ = synthetic_martensite_map((40, 40), 3, alpha=20000, seed=1)
+    return xmap
+
+
+def fail(*args, **kwargs):
+    raise RuntimeError("Finished stages must not be recomputed.")
+
+
+class TestReconstructPipeline:
+    def test_reconstruct(self, synthetic_map):
+        xmap_parent, ksi = reconstruct_pipeline(synthetic_map, refine=False)
+        assert np.allclose(ksi, get_variants("KS").ksi)
+        true_parent = synthetic_map.parent_id
+        for i in range(3):
+            parent_id = xmap_parent.parent_id[true_parent == i]
+            assert np.all(parent_id == parent_id[0])
+        assert np.unique(xmap_parent.parent_id).size == 3
+        assert np.mean(xmap_parent.fit) < np.deg2rad(1)
+
+    def test_resume(self, synthetic_map, tmp_path, monkeypatch):
+        filename = tmp_path / "checkpoint.h5"
+        xmap_parent1, ksi1 = reconstruct_pipeline(synthetic_map, filename)
+        checkpoint = Checkpoint(filename)
+        assert checkpoint.stages == [
+            "orientation_relationship",
+            "graph",
+            "candidates",
+            "cut",
+        ]
+
+        for name in ["refine_orientation_relationship", "_reconstruct_points"]:
+            monkeypatch.setattr(pipeline, name, fail)
+        monkeypatch.setattr(pipeline, "alpha_expansion", fail)
+        xmap_parent2, ksi2 = reconstruct_pipeline(synthetic_map, filename)
+        assert np.allclose(ksi1, ksi2)
+        assert np.array_equal(xmap_parent1.parent_id, xmap_parent2.parent_id)
+        assert np.allclose(xmap_parent1.rotations.data, xmap_parent2.rotations.data)
+
+    def test_resume_interrupted(self, synthetic_map, tmp_path, monkeypatch):
+        filename = tmp_path / "checkpoint.h5"
+        xmap_parent1, _ = reconstruct_pipeline(synthetic_map, filename)
+        # Interrupted while writing the cut
+        with File(filename, mode="a") as f:
+            f["stages"].move("cut", ".cut")
+        assert "cut" not in Checkpoint(filename)
+
+        monkeypatch.setattr(pipeline, "_reconstruct_points", fail)
+        xmap_parent2, _ = reconstruct_pipeline(synthetic_map, filename)
+        assert np.array_equal(xmap_parent1.parent_id, xmap_parent2.parent_id)
+        assert "cut" in Checkpoint(filename)
+
+    def test_reuse_graph(self, synthetic_map, tmp_path, monkeypatch):
+        filename = tmp_path / "checkpoint.h5"
+        xmap_parent1, _ = reconstruct_pipeline(synthetic_map, filename)
+        with File(filename, mode="a") as f:
+            for stage in ["candidates", "cut"]:
+                del f["stages"][stage]
+
+        # The candidates are found on the graph of the checkpoint
+        monkeypatch.setattr(type(synthetic_map), "neighbor_graph", fail)
+        xmap_parent2, _ = reconstruct_pipeline(synthetic_map, filename)
+        assert np.array_equal(xmap_parent1.parent_id, xmap_parent2.parent_id)
+
+    def test_candidate_misfits(self, synthetic_map):
+        q = synthetic_map.rotations.data
+        is_child = synthetic_map.phase_id != -1
+        graph = synthetic_map.neighbor_graph()
+        xmap_parent = reconstruct(synthetic_map)
+        parent_id = xmap_parent.parent_id
+        parent_q = pipeline._parent_grain_orientations(
+            parent_id, xmap_parent.rotations.data
+        )
+        candidates, misfit = pipeline._candidate_misfits(
+            q, parent_q, "KS", is_child, parent_id, graph, np.deg2rad(3), 2, 100
+        )
+        assert candidates.shape == misfit.shape == (synthetic_map.size, 2)
+        # Own parent grain first, neighbouring parent grains next
+        assert np.array_equal(candidates[is_child, 0], parent_id[is_child])
+        assert np.all(np.diff(misfit[candidates[:, 1] != -1], axis=1) >= 0)
+        assert np.all(candidates[~is_child] == -1)
+        pairs = np.column_stack(graph.nonzero())
+        pairs = pairs[parent_id[pairs[:, 0]] != parent_id[pairs[:, 1]]]
+        assert np.all(candidates[pairs[:, 0], 1] != -1)
+
+    def test_raises_other_settings(self, synthetic_map, tmp_path):
+        filename = tmp_path / "checkpoint.h5"
+        reconstruct_pipeline(synthetic_map, filename, refine=False)
+        with pytest.raises(ValueError, match="'smoothness' is"):
+            reconstruct_pipeline(synthetic_map, filename, refine=False, smoothness=1)
+        with pytest.raises(ValueError, match="'parent_point_group' is"):
+            reconstruct_pipeline(
+                synthetic_map,
+                filename,
+                refine=False,
+                parent_phase=Phase(name="austenite", point_group="432"),
+            )
+        with pytest.raises(ValueError, match="'parent_space_group' is"):
+            reconstruct_pipeline(
+                synthetic_map,
+                filename,
+                refine=False,
+                parent_phase=Phase(name="austenite", space_group=221),
+            )
+        other, _ = synthetic_martensite_map((40, 40), 3, seed=2)
+        with pytest.raises(ValueError, match="'crc32' is"):
+            reconstruct_pipeline(other, filename, refine=False)
+
+
+class TestCheckpoint:
+    def test_save_load(self, tmp_path):
+        checkpoint = Checkpoint(tmp_path / "checkpoint.h5")
+        assert checkpoint.stages == []
+        checkpoint.save("graph", {"indptr": np.arange(5), "shape": np.array([4, 4])})
+        checkpoint.save("graph", {"indptr": np.arange(3), "shape": np.array([2, 2])})
+        assert "graph" in checkpoint
+        output = checkpoint.load("graph")
+        assert np.array_equal(output["indptr"], np.arange(3))
+        assert repr(checkpoint).endswith("['graph']")
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import O
+from reconstruction import fit_ksi, refine_orientation_relationship
+from reconstruction._util import qu_conjugate, qu_multiply, qu_normalize
+from reconstruction.modules import namedOR, yardley_variants
+
+KSI = [4.5, 9.8, 10.2]
+
+
+def _variant_misorientations(ksi, n, noise, seed):
+    rng = np.random.default_rng(seed)
+    variants = Rotation.from_matrix(yardley_variants(ksi)).data
+    i, j = rng.choice(variants.shape[0], (2, n))
+    m = qu_multiply(variants[j], qu_conjugate(variants[i]))
+    s_a, s_b = O.data[rng.integers(0, O.size, (2, n))]
+    m = qu_multiply(s_a, qu_multiply(m, s_b))
+    # Small random rotations about random axes
+    dq = np.column_stack([np.ones(n), rng.normal(0, noise / 2, (n, 3))])
+    return qu_multiply(qu_normalize(dq), m)
+
+
+class TestFitKsi:
+    @pytest.mark.parametrize("initial", ["KS", "NW", [5, 10, 10]])
+    def test_fit_ksi(self, initial):
+        m = _variant_misorientations(KSI, 2000, 0, 42)
+        ksi, misfit = fit_ksi(m, initial)
+        assert np.allclose(ksi, KSI, atol=1e-4)
+        assert misfit.shape == (2000,)
+        # Pairs of the same variant are not distinguished from noise
+        assert np.allclose(misfit, 0, atol=1e-5)
+
+    def test_fit_ksi_noise(self):
+        m = _variant_misorientations(KSI, 20000, np.deg2rad(0.5), 42)
+        ksi, misfit = fit_ksi(m, "KS")
+        assert np.allclose(ksi, KSI, atol=0.02)
+        assert np.all(misfit < np.deg2rad(3))
+
+    def test_fit_ksi_outliers(self):
+        m = _variant_misorientations(KSI, 2000, 0, 42)
+        m[:100] = Rotation.random(100).data
+        ksi, misfit = fit_ksi(m, "KS")
+        # Some random misorientations are close to the OR by chance
+        assert np.allclose(ksi, KSI, atol=0.01)
+        assert np.all(np.isinf(misfit[:100]) | (misfit[:100] < np.deg2rad(3)))
+
+    def test_fit_ksi_raises(self):
+        m = _variant_misorientations(KSI, 2, 0, 42)
+        with pytest.raises(ValueError, match="Too few misorientations"):
+            _ = fit_ksi(m)
+
+
+class TestRefineOrientationRelationship:
+    @pytest.mark.parametrize(
+        "martensite_map", [((36, 40), KSI, 0)], indirect=["martensite_map"]
+    )
+    def test_refine_orientation_relationship(self, martensite_map):
+        xmap, _, parent_index = martensite_map
+        ksi, misfit = refine_orientation_relationship(xmap, "KS")
+        # Most neighbours across the parent grain boundary are not fitted
+        assert np.any(np.isinf(misfit))
+        assert np.allclose(ksi, KSI, atol=0.05)
+
+        ksi2, misfit2 = refine_orientation_relationship(
+            xmap, "KS", parent_id=parent_index, max_samples=100, seed=0
+        )
+        assert np.allclose(ksi2, KSI, atol=1e-4)
+        assert misfit2.shape == (100,)
+        assert np.allclose(misfit2, 0, atol=1e-5)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from orix.crystal_map import CrystalMap
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import O
+from reconstruction import (
+    get_variants,
+    label_variants,
+    reconstruct,
+    synthetic_martensite_map,
+)
+from reconstruction._util import dot_to_angle, qu_multiply, symmetry_reduced_dot
+
+
+class TestSyntheticMartensiteMap:
+    @pytest.mark.parametrize("orientation_relationship", ["KS", "NW"])
+    def test_ground_truth(self, orientation_relationship):
+        xmap, parents = synthetic_martensite_map(
+            (40, 50), 5, orientation_relationship, seed=0
+        )
+        assert isinstance(xmap, CrystalMap)
+        assert xmap.shape == (40, 50)
+        assert xmap.phases_in_data.names == ["martensite"]
+        assert parents.size == 5
+        parent_id = xmap.parent_id
+        assert np.array_equal(np.unique(parent_id), np.arange(5))
+
+        # Child orientations are variants of their parent orientation
+        table = get_variants(orientation_relationship)
+        variant = xmap.variant_id
+        q = qu_multiply(table.rotations.data[variant], parents.data[parent_id])
+        dot = symmetry_reduced_dot(xmap.rotations.data, q, O.data)
+        assert np.allclose(dot_to_angle(dot), 0, atol=1e-6)
+        assert np.all(xmap.bain_id == table.bain_groups[variant])
+        assert np.all(xmap.packet_id == table.packets[variant])
+        assert np.all(xmap.block_id == table.blocks[variant])
+
+        # Same labels as found from the true parent orientations
+        xmap_parent = CrystalMap(
+            rotations=parents[parent_id],
+            prop={"parent_id": parent_id},
+            x=xmap.x,
+            y=xmap.y,
+        )
+        label_variants(xmap, xmap_parent, orientation_relationship)
+        assert np.array_equal(xmap_parent.variant_id, variant)
+
+    def test_reconstruct(self):
+        xmap, parents = synthetic_martensite_map(
+            (60, 60), 3, alpha=20000, not_indexed=0.05, seed=1
+        )
+        is_indexed = xmap.phase_id == 0
+        assert 0.02 < np.mean(~is_indexed) < 0.08
+        xmap_parent = reconstruct(xmap)
+        for i in range(3):
+            is_parent = (xmap.parent_id == i) & is_indexed
+            parent_id = xmap_parent.parent_id[is_parent]
+            assert np.mean(parent_id == np.bincount(parent_id).argmax()) > 0.99
+
+    def test_noise_and_seed(self):
+        np.random.seed(42)
+        xmap1, parents1 = synthetic_martensite_map((30, 30), 2, alpha=5000, seed=3)
+        xmap2, parents2 = synthetic_martensite_map((30, 30), 2, seed=3)
+        assert np.allclose(parents1.data, parents2.data)
+        assert np.array_equal(xmap1.variant_id, xmap2.variant_id)
+        angles = Rotation(xmap1.rotations.data).angle_with(xmap2.rotations)
+        assert np.isclose(angles.mean(), 2 / np.sqrt(np.pi * 5000), rtol=0.1)
+
+    def test_3d(self):
+        xmap, _ = synthetic_martensite_map((4, 10, 12), 3, seed=4)
+        assert xmap.shape == (4, 10, 12)
+        assert np.unique(xmap.parent_id).size == 3
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from orix.crystal_map import CrystalMap
+from orix.quaternion.symmetry import O
+from reconstruction import reconstruct, reconstruct_tiled
+from reconstruction._util import dot_to_angle, symmetry_reduced_dot
+
+
+class TestReconstructTiled:
+    @pytest.mark.parametrize("n_processes", [1, 2])
+    def test_reconstruct_tiled(self, martensite_map, n_processes):
+        xmap, parents, parent_index = martensite_map
+        xmap_parent = reconstruct_tiled(
+            xmap, tile_shape=(12, 15), halo=6, n_processes=n_processes
+        )
+        assert isinstance(xmap_parent, CrystalMap)
+        assert xmap_parent.phases_in_data.names == ["austenite"]
+
+        # Parent grains crossing tile borders get one ID
+        parent_id = xmap_parent.parent_id
+        assert np.unique(parent_id).size == 2
+        for i in range(2):
+            assert np.unique(parent_id[parent_index == i]).size == 1
+
+        q = xmap_parent.rotations.data
+        angles = dot_to_angle(symmetry_reduced_dot(parents[parent_index], q, O.data))
+        assert np.allclose(angles, 0, atol=1e-4)
+
+        xmap_parent2 = reconstruct(xmap)
+        assert np.allclose(xmap_parent.fit, xmap_parent2.fit, atol=1e-6)
+
+    def test_reconstruct_tiled_not_indexed(self, martensite_map):
+        xmap, _, _ = martensite_map
+        xmap[xmap.id < 5].phase_id = -1
+        # One tile without child points
+        xmap[(xmap.y < 12) & (xmap.x >= 30)].phase_id = -1
+        xmap_parent = reconstruct_tiled(
+            xmap, tile_shape=(12, 10), halo=4, n_processes=1
+        )
+        is_child = xmap.phase_id != -1
+        assert np.all(xmap_parent.parent_id[~is_child] == -1)
+        assert np.all(np.isnan(xmap_parent.fit[~is_child]))
+        assert np.unique(xmap_parent.parent_id[is_child]).size == 2
+
+    def test_reconstruct_tiled_raises(self):
+        xmap = CrystalMap.empty((2, 3, 4))
+        with pytest.raises(ValueError, match="Only 2D maps can be tiled"):
+            _ = reconstruct_tiled(xmap)
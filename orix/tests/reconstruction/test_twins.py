@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from orix.crystal_map import CrystalMap, Phase, PhaseList, create_coordinate_arrays
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import O
+from reconstruction import merge_twins, twin_boundaries
+from reconstruction._util import dot_to_angle, qu_multiply
+from reconstruction.twins import _sigma3_table
+
+
+def parent_map(q, grain_size=3, point_group="m-3m"):
+    """Parent map of a row of square grains with orientations `q`."""
+    n = q.shape[0]
+    d, size = create_coordinate_arrays((grain_size, n * grain_size))
+    parent_id = (d["x"] // grain_size).astype(int)
+    return CrystalMap(
+        rotations=Rotation(q[parent_id]),
+        phase_id=np.zeros(size, dtype=int),
+        phase_list=PhaseList(Phase("austenite", point_group=point_group)),
+        prop={"parent_id": parent_id},
+        **d,
+    )
+
+
+def random_orientations(n, seed=0):
+    q = np.random.default_rng(seed).normal(size=(n, 4))
+    return q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+
+
+def twin_of(q, deviation=0, seed=0):
+    """Random symmetrically equivalent Σ3 twin of `q`, rotated by
+    `deviation` about a random axis.
+    """
+    rng = np.random.default_rng(seed)
+    sigma3 = Rotation.from_axes_angles([1, 1, 1], np.pi / 3).data[0]
+    axis = rng.normal(size=3)
+    noise = Rotation.from_axes_angles(axis, deviation).data[0]
+    s = O.data[rng.integers(0, O.size)]
+    return qu_multiply(s, qu_multiply(noise, qu_multiply(sigma3, q)))
+
+
+class TestTwins:
+    def test_sigma3_table(self):
+        table = _sigma3_table(O)
+        assert table.shape == (96, 4)
+        assert np.allclose(dot_to_angle(np.abs(table[:, 0])).min(), np.pi / 3)
+
+    def test_twin_boundaries(self):
+        q = random_orientations(5, seed=0)
+        # Grain 1 is a twin of 0, grain 2 of 1, grain 4 is 5 degrees off
+        q[1] = twin_of(q[0], seed=1)
+        q[2] = twin_of(q[1], seed=2)
+        q[4] = twin_of(q[3], np.deg2rad(5), seed=3)
+        xmap = parent_map(q)
+        pairs, deviation, length = twin_boundaries(xmap)
+        assert np.array_equal(pairs, [[0, 1], [1, 2], [3, 4]])
+        assert np.allclose(deviation, np.deg2rad([0, 0, 5]), atol=1e-6)
+        assert np.all(length == 3)
+
+        pairs, _, _ = twin_boundaries(xmap, threshold=np.deg2rad(2))
+        assert np.array_equal(pairs, [[0, 1], [1, 2]])
+
+    def test_merge_twins(self):
+        q = random_orientations(5, seed=1)
+        q[1] = twin_of(q[0], seed=4)
+        q[2] = twin_of(q[1], seed=5)
+        xmap = parent_map(q)
+        xmap.prop["parent_id"][xmap.x == 0] = -1
+        merge_twins(xmap)
+        merged = xmap.merged_id
+        assert np.all(merged[xmap.parent_id == -1] == -1)
+        grains = [np.unique(merged[xmap.parent_id == i]) for i in range(5)]
+        assert grains[0] == grains[1] == grains[2]
+        assert len({grains[0][0], grains[3][0], grains[4][0]}) == 3
+        twin_count = [np.unique(xmap.twin_count[xmap.parent_id == i]) for i in range(5)]
+        assert np.array_equal(np.concatenate(twin_count), [1, 2, 1, 0, 0])
+
+        # Boundaries shorter than three pixel edges are not merged
+        merge_twins(xmap, min_length=4)
+        assert np.unique(xmap.merged_id[xmap.parent_id != -1]).size == 5
+
+    def test_raises(self):
+        q = random_orientations(2)
+        with pytest.raises(ValueError, match="only defined for a cubic"):
+            twin_boundaries(parent_map(q, point_group="6/mmm"))
+        xmap = parent_map(q)
+        del xmap.prop["parent_id"]
+        with pytest.raises(ValueError, match="must have the 'parent_id'"):
+            twin_boundaries(xmap)
@@ -0,0 +1,202 @@
+from diffpy.structure import Lattice, Structure
+import numpy as np
+import pytest
+
+from orix.crystal_map import CrystalMap, Phase, PhaseList, create_coordinate_arrays
+from orix.quaternion import Misorientation, Rotation
+from orix.quaternion.symmetry import D6, O
+from orix.vector import Miller
+from reconstruction import reconstruct
+from reconstruction import variants as variants_module
+from reconstruction._util import dot_to_angle, qu_multiply, symmetry_reduced_dot
+from reconstruction.modules import namedOR, yardley_variants
+from reconstruction.variants import (
+    OrientationRelationship,
+    VariantTable,
+    clear_variant_cache,
+    get_variants,
+)
+
+
+class TestGetVariants:
+    @pytest.mark.parametrize("orientation_relationship, size", [("KS", 24), ("NW", 12)])
+    def test_get_variants(self, orientation_relationship, size):
+        table = get_variants(orientation_relationship)
+        assert isinstance(table, VariantTable)
+        assert table.size == size
+        assert np.allclose(table.ksi, namedOR(orientation_relationship))
+
+        rotations = Rotation.from_matrix(yardley_variants(orientation_relationship))
+        assert isinstance(table.rotations, Rotation)
+        assert np.allclose(table.rotations.data, rotations.data)
+        assert isinstance(table.misorientations, Misorientation)
+        assert table.misorientations.shape == (size,)
+
+    def test_variant_tables(self):
+        table = get_variants("KS")
+        angles = table.variant_angles
+        assert angles.shape == (24, 24)
+        assert np.allclose(angles, angles.T)
+        assert np.allclose(np.diag(angles), 0)
+        # All variants see the same set of angles to the others
+        assert np.allclose(np.sort(angles, axis=1), np.sort(angles[0]))
+        assert np.isclose(np.rad2deg(np.sort(angles[0])[1]), 10.53, atol=0.01)
+        assert np.isclose(np.rad2deg(angles.max()), 60, atol=0.01)
+
+        m = table.variant_misorientations
+        assert isinstance(m, Misorientation)
+        assert np.allclose(m.angle, angles, atol=1e-6)
+
+    def test_get_variants_cached(self):
+        clear_variant_cache()
+        table = get_variants("KS")
+        assert get_variants("KS") is table
+        assert get_variants(namedOR("KS") + 1e-6) is table
+        assert get_variants(namedOR("KS") + 1e-3) is not table
+        assert get_variants(namedOR("KS") + 1e-6, decimals=8) is not table
+
+    def test_get_variants_read_only(self):
+        table = get_variants("KS")
+        with pytest.raises(ValueError, match="read-only"):
+            table.rotations.data[0] = 1
+        with pytest.raises(ValueError, match="read-only"):
+            table.variant_angles[0, 1] = 0
+
+    def test_get_variants_lru_eviction(self, monkeypatch):
+        clear_variant_cache()
+        monkeypatch.setattr(variants_module, "_CACHE_SIZE", 2)
+        ksi = namedOR("KS")
+        table0 = get_variants(ksi)
+        table1 = get_variants(ksi + 0.1)
+        assert get_variants(ksi) is table0
+        _ = get_variants(ksi + 0.2)
+        # The least recently used table is evicted
+        assert get_variants(ksi) is table0
+        assert get_variants(ksi + 0.1) is not table1
+        clear_variant_cache()
+
+    def test_get_variants_raises(self):
+        with pytest.raises(ValueError, match="`orientation_relationship` must be"):
+            _ = get_variants([1, 2])
+
+    @pytest.mark.parametrize(
+        "orientation_relationship, n_blocks, block_angle",
+        [("KS", 12, 10.53), ("NW", 12, 0)],
+    )
+    def test_variant_groups(self, orientation_relationship, n_blocks, block_angle):
+        table = get_variants(orientation_relationship)
+        angles = np.rad2deg(table.variant_angles)
+        n = table.size
+        assert np.all(np.bincount(table.bain_groups) == n // 3)
+        assert np.all(np.bincount(table.packets) == n // 4)
+        assert np.all(np.bincount(table.blocks) == n // n_blocks)
+        # Variants of a block are close to each other, and of a Bain
+        # group within the Bain rotation
+        for i in range(n_blocks):
+            is_block = table.blocks == i
+            assert np.allclose(
+                angles[is_block][:, is_block].max(), block_angle, atol=0.01
+            )
+            assert np.unique(table.packets[is_block]).size == 1
+        for i in range(3):
+            is_bain = table.bain_groups == i
+            assert angles[is_bain][:, is_bain].max() < 21.1
+
+
+class TestOrientationRelationship:
+    @pytest.mark.parametrize(
+        "orientation_relationship, planes_and_directions",
+        [
+            ("KS", ([1, 1, 1], [0, 1, 1], [-1, 0, 1], [-1, -1, 1])),
+            ("NW", ([1, 1, 1], [0, 1, 1], [-1, -1, 2], [0, -1, 1])),
+        ],
+    )
+    def test_from_parallel(self, orientation_relationship, planes_and_directions):
+        relationship = OrientationRelationship.from_parallel(*planes_and_directions)
+        table = get_variants(orientation_relationship)
+        assert relationship.size == table.size
+        # Same variants as from the ksi values, modulo child symmetry
+        dot = symmetry_reduced_dot(
+            np.repeat(relationship.rotations.data, table.size, axis=0),
+            np.tile(table.rotations.data, (table.size, 1)),
+            O.data,
+        ).reshape(table.size, table.size)
+        assert np.allclose(dot.max(axis=1), 1, atol=1e-8)
+        assert np.allclose(
+            np.sort(relationship.variant_angles[0]),
+            np.sort(table.variant_angles[0]),
+            atol=1e-6,
+        )
+
+    def test_from_parallel_miller(self):
+        bcc = Phase(point_group="m-3m")
+        hcp = Phase(
+            point_group="6/mmm",
+            structure=Structure(lattice=Lattice(3, 3, 4.7, 90, 90, 120)),
+        )
+        relationship = OrientationRelationship.from_parallel(
+            Miller(hkl=[1, 1, 0], phase=bcc),
+            Miller(hkil=[0, 0, 0, 1], phase=hcp),
+            Miller(uvw=[-1, 1, -1], phase=bcc),
+            Miller(UVTW=[2, -1, -1, 0], phase=hcp),
+        )
+        assert relationship.child_symmetry.name == "622"
+        assert get_variants(relationship) is get_variants("Burgers")
+
+    @pytest.mark.parametrize(
+        "name, size, angles",
+        [
+            ("Burgers", 12, [10.53, 60, 60.83, 63.26, 90]),
+            ("Pitsch", 12, [13.76, 19.47, 50.05, 53.69, 60, 62.8]),
+            ("GT", 24, [3.16, 12.22, 60.41]),
+        ],
+    )
+    def test_named(self, name, size, angles):
+        relationship = get_variants(name)
+        assert isinstance(relationship, OrientationRelationship)
+        assert get_variants(name.lower()) is relationship
+        assert relationship.size == size
+        assert np.allclose(relationship.rotation.data, relationship.rotations.data[0])
+        variant_angles = np.rad2deg(relationship.variant_angles)
+        assert np.allclose(variant_angles, variant_angles.T, atol=1e-6)
+        assert np.allclose(np.diag(variant_angles), 0, atol=1e-4)
+        for angle in angles:
+            assert np.any(np.isclose(variant_angles[0], angle, atol=0.01))
+        m = relationship.variant_misorientations
+        assert np.allclose(m.angle, relationship.variant_angles, atol=1e-6)
+
+    def test_reconstruct_burgers(self):
+        # Two beta grains transformed to laths of random alpha variants
+        d, size = create_coordinate_arrays((30, 30))
+        parent_index = (d["x"] >= 15).astype(int)
+        lath = (d["y"] // 3).astype(int) + 10 * parent_index
+        rng = np.random.default_rng(0)
+        parents = rng.normal(size=(2, 4))
+        parents /= np.linalg.norm(parents, axis=1)[:, np.newaxis]
+        variants = get_variants("Burgers").rotations.data
+        v = variants[rng.integers(0, variants.shape[0], 20)]
+        s = D6.data[rng.integers(0, D6.size, 20)]
+        q = qu_multiply(s[lath], qu_multiply(v[lath], parents[parent_index]))
+        xmap = CrystalMap(
+            rotations=Rotation(q),
+            phase_list=PhaseList(Phase("alpha", point_group="6/mmm")),
+            **d,
+        )
+        xmap_parent = reconstruct(
+            xmap, "Burgers", parent_phase=Phase("beta", point_group="m-3m")
+        )
+        assert np.unique(xmap_parent.parent_id).size == 2
+        angles = dot_to_angle(
+            symmetry_reduced_dot(
+                parents[parent_index], xmap_parent.rotations.data, O.data
+            )
+        )
+        assert np.allclose(angles, 0, atol=1e-4)
+
+    def test_raises(self):
+        with pytest.raises(ValueError, match="Unknown orientation relationship"):
+            OrientationRelationship.from_name("Bogers-Burgers")
+        with pytest.raises(ValueError, match="must not be parallel"):
+            OrientationRelationship.from_parallel(
+                [1, 1, 1], [0, 1, 1], [2, 2, 2], [-1, -1, 1]
+            )
@@ -990,6 +990,78 @@ class TestCrystalMapShape:
         assert xmap._coordinate_axes == expected_coordinate_axes
 
 
+class TestCrystalMapNeighborGraph:
+    @pytest.mark.parametrize(
+        "shape, connectivity, n_pairs",
+        [
+            ((4, 5), None, 31),
+            ((4, 5), 4, 31),
+            ((4, 5), 8, 55),
+            ((2, 3, 4), 6, 46),
+            ((2, 3, 4), 26, 128),
+            ((6,), 2, 5),
+        ],
+    )
+    def test_neighbor_graph_shape(self, shape, connectivity, n_pairs):
+        xmap = CrystalMap.empty(shape)
+        graph = xmap.neighbor_graph(connectivity)
+        assert graph.shape == (xmap.size, xmap.size)
+        assert graph.nnz == 2 * n_pairs
+        assert graph.dtype == np.float32
+        assert (graph != graph.T).nnz == 0
+        # Identical rotations give explicitly stored zero angles
+        assert np.allclose(graph.data, 0)
+
+        # Neighbours are at most one step apart in every direction
+        graph = graph.tocoo()
+        for coordinate, step in zip(
+            xmap._coordinates.values(), xmap._step_sizes.values()
+        ):
+            if coordinate is not None:
+                distance = np.abs(coordinate[graph.row] - coordinate[graph.col])
+                assert np.all(distance <= step)
+
+    def test_neighbor_graph_misorientation(self):
+        xmap = CrystalMap.empty((4, 5))
+        xmap.phases[0].point_group = "m-3m"
+        xmap._rotations = Rotation.random(xmap.size)
+        graph = xmap.neighbor_graph(connectivity=8).tocoo()
+
+        ori = Orientation(xmap.rotations.data, symmetry=O)
+        angles = ori[graph.row].angle_with(ori[graph.col])
+        assert np.allclose(graph.data, angles, atol=1e-5)
+
+        # Symmetrically equivalent rotations are not misoriented
+        xmap2 = xmap.deepcopy()
+        xmap2._rotations = O[np.arange(xmap.size) % O.size] * xmap.rotations
+        assert np.allclose(xmap2.neighbor_graph(8).data, graph.data, atol=1e-5)
+
+    def test_neighbor_graph_phases(self):
+        xmap = CrystalMap.empty((4, 5))
+        xmap.phases.add(Phase("b", point_group="432"))
+        xmap[xmap.x < 2].phase_id = 1
+        xmap[xmap.id == 19].phase_id = -1
+        graph = xmap.neighbor_graph()
+
+        # Only indexed points of the same phase are connected
+        graph = graph.tocoo()
+        phase_id = xmap.phase_id
+        assert np.all(phase_id[graph.row] == phase_id[graph.col])
+        assert np.all(phase_id[graph.row] != -1)
+        assert graph.nnz == 2 * (4 + 6 + 8 + 9 - 2)
+
+    def test_neighbor_graph_only_in_data(self):
+        xmap = CrystalMap.empty((4, 5))
+        xmap2 = xmap[xmap.y > 0]
+        graph = xmap2.neighbor_graph()
+        assert graph.shape == (15, 15)
+        assert graph.nnz == 2 * (3 * 4 + 2 * 5)
+
+    def test_neighbor_graph_raises(self):
+        with pytest.raises(ValueError, match="`connectivity` must be 4 or 8 for a "):
+            _ = CrystalMap.empty((4, 5)).neighbor_graph(6)
+
+
 class TestCrystalMapPlotMethod:
     def test_plot(self, crystal_map):
         xmap = crystal_map
@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU General Public License
 # along with orix.  If not, see <http://www.gnu.org/licenses/>.
 
+import pickle
+
 import numpy as np
 import pytest
 
@@ -105,3 +107,17 @@ class TestCrystalMapProperties:
         with pytest.raises(IndexError, match="boolean index did not match indexed"):
             new_shape = (10 // 2, 10 // 5)
             props["dp"] = np.arange(map_size).reshape(new_shape)
+
+    def test_pickle(self):
+        map_size = 10
+        is_in_data = np.ones(map_size, dtype=bool)
+        is_in_data[3] = False
+        d = {"iq": np.arange(map_size)}
+        props = CrystalMapProperties(d, id=np.arange(map_size), is_in_data=is_in_data)
+
+        props2 = pickle.loads(pickle.dumps(props))
+        assert isinstance(props2, CrystalMapProperties)
+        assert np.array_equal(props2.is_in_data, is_in_data)
+        assert np.array_equal(props2["iq"], props["iq"])
+        props2["iq"] = np.zeros(map_size - 1)
+        assert np.all(props2["iq"] == 0)
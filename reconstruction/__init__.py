@@ -0,0 +1,46 @@
+"""Reconstruction of parent grains from crystal maps of transformed
+child grains, e.g. prior austenite from martensite.
+"""
+
+from reconstruction.engine import reconstruct
+from reconstruction.graph_cut import (
+    AlphaExpansion,
+    MaxflowGraph,
+    alpha_expansion,
+    maxflow,
+)
+from reconstruction.labelling import label_variants
+from reconstruction.likelihood import parent_candidates, parent_likelihood
+from reconstruction.pipeline import Checkpoint, reconstruct_pipeline
+from reconstruction.refinement import fit_ksi, refine_orientation_relationship
+from reconstruction.synthetic import synthetic_martensite_map
+from reconstruction.tiling import reconstruct_tiled
+from reconstruction.twins import merge_twins, twin_boundaries
+from reconstruction.variants import (
+    OrientationRelationship,
+    VariantTable,
+    get_variants,
+)
+
+# Lists what will be imported when calling "from reconstruction import *"
+__all__ = [
+    "AlphaExpansion",
+    "Checkpoint",
+    "MaxflowGraph",
+    "OrientationRelationship",
+    "VariantTable",
+    "alpha_expansion",
+    "fit_ksi",
+    "get_variants",
+    "label_variants",
+    "maxflow",
+    "merge_twins",
+    "parent_candidates",
+    "parent_likelihood",
+    "reconstruct",
+    "reconstruct_pipeline",
+    "reconstruct_tiled",
+    "refine_orientation_relationship",
+    "synthetic_martensite_map",
+    "twin_boundaries",
+]
@@ -0,0 +1,179 @@
+"""Vectorized quaternion helpers shared by the reconstruction modules.
+
+All functions operate on plain float arrays of shape (..., 4) holding
+(a, b, c, d) quaternions so that per-pixel work never has to build
+:class:`~orix.quaternion.Rotation` objects.
+
+This module is for internal use only. We may change the API at any time
+with no warning.
+"""
+
+import numpy as np
+
+
+def qu_multiply(q1, q2):
+    """Hamilton product of two broadcastable quaternion arrays.
+
+    Parameters
+    ----------
+    q1, q2 : numpy.ndarray
+        Arrays of shape (..., 4).
+
+    Returns
+    -------
+    numpy.ndarray
+        Product `q1 * q2` with the broadcast shape of the inputs.
+    """
+    a1, b1, c1, d1 = np.moveaxis(q1, -1, 0)
+    a2, b2, c2, d2 = np.moveaxis(q2, -1, 0)
+    return np.stack(
+        (
+            a1 * a2 - b1 * b2 - c1 * c2 - d1 * d2,
+            a1 * b2 + b1 * a2 + c1 * d2 - d1 * c2,
+            a1 * c2 - b1 * d2 + c1 * a2 + d1 * b2,
+            a1 * d2 + b1 * c2 - c1 * b2 + d1 * a2,
+        ),
+        axis=-1,
+    )
+
+
+def qu_conjugate(q):
+    """Conjugate (inverse for unit quaternions) of a quaternion array."""
+    q = np.array(q, copy=True)
+    q[..., 1:] = -q[..., 1:]
+    return q
+
+
+def qu_normalize(q):
+    """Return unit quaternions with a non-negative scalar part."""
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.where(q[..., :1] < 0, -q, q)
+
+
+def dot_to_angle(dot):
+    """Rotation angle in radians from absolute quaternion dot products."""
+    return 2 * np.arccos(np.clip(np.abs(dot), 0, 1))
+
+
+def symmetry_reduced_dot(q1, q2, symmetry, chunk_size=2**18):
+    """Symmetry reduced dot product between pairs of orientations.
+
+    The orientations `q2` are compared to `q1` respecting the crystal
+    symmetry acting from the left, i.e. the highest value of
+    :math:`|\\langle q_2 q_1^{-1}, s\\rangle|` over all symmetry
+    operations :math:`s`.
+
+    Parameters
+    ----------
+    q1, q2 : numpy.ndarray
+        Arrays of shape (n, 4).
+    symmetry : numpy.ndarray
+        Proper symmetry operations as an array of shape (k, 4).
+    chunk_size : int, optional
+        Number of pairs to handle at a time. Default is 2**18.
+
+    Returns
+    -------
+    numpy.ndarray
+        Highest absolute dot products of shape (n,).
+    """
+    n = q1.shape[0]
+    dtype = np.result_type(q1.dtype, q2.dtype, np.float32)
+    out = np.empty(n, dtype=dtype)
+    symmetry = symmetry.astype(dtype)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        m = qu_multiply(q2[start:stop], qu_conjugate(q1[start:stop]))
+        out[start:stop] = np.abs(m @ symmetry.T).max(axis=-1)
+    return out
+
+
+def symmetry_align(q, reference, symmetry):
+    """Return the symmetrically equivalent quaternions of `q` closest to
+    `reference`, with a positive dot product to it.
+
+    Parameters
+    ----------
+    q, reference : numpy.ndarray
+        Broadcastable arrays of shape (..., 4).
+    symmetry : numpy.ndarray
+        Proper symmetry operations of shape (k, 4), acting from the left.
+
+    Returns
+    -------
+    numpy.ndarray
+        Aligned quaternions.
+    """
+    # <s q, r> = <s, r q^-1>, so one product per quaternion suffices
+    x = qu_multiply(reference, qu_conjugate(q))
+    dots = x @ symmetry.T
+    best = np.abs(dots).argmax(axis=-1)
+    sign = np.sign(np.take_along_axis(dots, best[..., np.newaxis], axis=-1))
+    sign[sign == 0] = 1
+    return sign * qu_multiply(symmetry[best], q)
+
+
+def grouped_mean(q, labels, n_labels, weights=None):
+    """Mean quaternion per label, assuming the quaternions of each label
+    are already aligned with each other.
+
+    Parameters
+    ----------
+    q : numpy.ndarray
+        Array of shape (n, 4).
+    labels : numpy.ndarray
+        Integer label of each quaternion in the range [0, `n_labels`).
+    n_labels : int
+        Number of labels.
+    weights : numpy.ndarray, optional
+        Weight of each quaternion. Default is equal weights.
+
+    Returns
+    -------
+    numpy.ndarray
+        Unit mean quaternions of shape (n_labels, 4).
+    """
+    if weights is not None:
+        q = q * weights[:, np.newaxis]
+    mean = np.zeros((n_labels, 4))
+    for i in range(4):
+        mean[:, i] = np.bincount(labels, weights=q[:, i], minlength=n_labels)
+    norm = np.linalg.norm(mean, axis=-1)
+    empty = norm == 0
+    mean[empty] = (1, 0, 0, 0)
+    norm[empty] = 1
+    return mean / norm[:, np.newaxis]
+
+
+def unique_modulo_symmetry(q, symmetry, atol=1e-6):
+    """Indices of the first occurrence of each quaternion in `q` that is
+    unique modulo the symmetry acting from the left, and the index of
+    the unique quaternion each input maps to.
+
+    Parameters
+    ----------
+    q : numpy.ndarray
+        Array of shape (n, 4). Only meant for small `n`.
+    symmetry : numpy.ndarray
+        Proper symmetry operations of shape (k, 4).
+    atol : float, optional
+        Tolerance in the dot product. Default is 1e-6.
+
+    Returns
+    -------
+    unique : numpy.ndarray
+        Indices into `q` of the unique quaternions.
+    inverse : numpy.ndarray
+        Index into `unique` for each quaternion in `q`.
+    """
+    n = q.shape[0]
+    # m[i, j] = q_j q_i^-1, equal modulo symmetry if m is in the group
+    m = qu_multiply(q[np.newaxis], qu_conjugate(q)[:, np.newaxis])
+    equal = np.abs(m @ symmetry.T).max(axis=-1) > 1 - atol
+    unique = []
+    inverse = np.full(n, -1)
+    for i in range(n):
+        if inverse[i] == -1:
+            inverse[equal[i] & (inverse == -1)] = len(unique)
+            unique.append(i)
+    return np.array(unique), inverse
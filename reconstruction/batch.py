@@ -0,0 +1,250 @@
+"""Batch reconstruction of many scans, with loading, reconstruction and
+writing pipelined.
+
+Scans are loaded with :func:`~orix.io.load` in a pool of threads, every
+scan is reconstructed with :func:`~reconstruction.engine.reconstruct`
+in a pool of processes, one scan per worker, and parent maps are written
+in orix' HDF5 file format by the threads again. While a scan is
+reconstructed, the next scans are loaded and finished scans are written,
+so that the I/O bound and CPU bound work overlap. The number of scans in
+memory at a time is bounded.
+
+A summary of every scan is written as a CSV table::
+
+    python -m reconstruction.batch "scans/*.ang" -o parents --n-processes 8
+"""
+
+import argparse
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+import csv
+import glob
+from multiprocessing import get_context
+import os
+from time import perf_counter
+
+import numpy as np
+
+from orix.io import load, save
+from reconstruction.engine import reconstruct
+
+_SUMMARY_FIELDS = [
+    "filename",
+    "output",
+    "n_points",
+    "n_parents",
+    "reconstructed",
+    "mean_fit",
+    "load_time",
+    "reconstruct_time",
+    "write_time",
+    "error",
+]
+
+
+def reconstruct_batch(
+    filenames,
+    output_dir,
+    n_processes=None,
+    n_threads=2,
+    summary="summary.csv",
+    **kwargs,
+):
+    """Reconstruct the parent maps of many scans.
+
+    Parameters
+    ----------
+    filenames : str or list of str
+        Glob pattern or list of glob patterns of .ang or .h5 files,
+        expanded recursively with ``**``.
+    output_dir : str
+        Directory to write the parent maps and the summary to, created
+        if it does not exist. The parent map of a scan "name.ang" is
+        written to "name_parent.h5".
+    n_processes : int, optional
+        Number of processes reconstructing scans. If None (default), the
+        number of CPUs is used. If 1, scans are reconstructed in a
+        thread of this process.
+    n_threads : int, optional
+        Number of threads loading and writing scans. Default is 2.
+    summary : str, optional
+        Name of the CSV file in `output_dir` with one row per scan.
+        Default is "summary.csv". If None, no summary is written.
+    **kwargs
+        Keyword arguments passed to
+        :func:`~reconstruction.engine.reconstruct`, e.g.
+        `orientation_relationship` or `child_phase`.
+
+    Returns
+    -------
+    list of dict
+        Summary of each scan in the order of the file names: the input
+        "filename" and "output" file names, the number of points
+        "n_points", the number of parent grains "n_parents", the
+        fraction of points "reconstructed", the "mean_fit" of the
+        reconstructed points in degrees, the wall time in seconds of
+        the "load_time", "reconstruct_time" and "write_time", and the
+        "error" message if the scan failed, otherwise an empty string.
+        The "output" of a failed scan is an empty string.
+
+    Examples
+    --------
+    >>> from reconstruction.batch import reconstruct_batch
+    >>> rows = reconstruct_batch(
+    ...     "scans/*.ang", "parents", orientation_relationship="KS"
+    ... )  # doctest: +SKIP
+    """
+    filenames = _expand(filenames)
+    outputs = [
+        os.path.join(output_dir, os.path.splitext(os.path.basename(f))[0])
+        + "_parent.h5"
+        for f in filenames
+    ]
+    if len(set(outputs)) < len(outputs):
+        raise ValueError("Scans must have different file names.")
+    os.makedirs(output_dir, exist_ok=True)
+    if n_processes is None:
+        n_processes = os.cpu_count()
+
+    rows = [
+        dict({k: None for k in _SUMMARY_FIELDS}, filename=f, output=o, error="")
+        for f, o in zip(filenames, outputs)
+    ]
+    # Scans loaded, waiting or being reconstructed, or being written
+    max_in_memory = 2 * n_processes + n_threads
+    if n_processes == 1:
+        compute = ThreadPoolExecutor(max_workers=1)
+    else:
+        compute = ProcessPoolExecutor(
+            max_workers=n_processes, mp_context=get_context("spawn")
+        )
+    with ThreadPoolExecutor(max_workers=n_threads) as io, compute:
+        to_load = iter(range(len(filenames)))
+        running = {}
+        n_in_memory = 0
+        while True:
+            while n_in_memory < max_in_memory:
+                i = next(to_load, None)
+                if i is None:
+                    break
+                running[io.submit(_timed, load, filenames[i])] = ("load", i)
+                n_in_memory += 1
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, i = running.pop(future)
+                try:
+                    result, elapsed = future.result()
+                except Exception as error:
+                    rows[i]["error"] = f"{stage}: {error}"
+                    rows[i]["output"] = ""
+                    n_in_memory -= 1
+                    continue
+                rows[i][f"{stage}_time"] = elapsed
+                if stage == "load":
+                    rows[i]["n_points"] = result.size
+                    next_stage = compute.submit(_timed, reconstruct, result, **kwargs)
+                    running[next_stage] = ("reconstruct", i)
+                elif stage == "reconstruct":
+                    rows[i].update(_parent_summary(result))
+                    next_stage = io.submit(_timed, save, outputs[i], result, True)
+                    running[next_stage] = ("write", i)
+                else:
+                    n_in_memory -= 1
+
+    if summary is not None:
+        with open(os.path.join(output_dir, summary), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=_SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+
+def _expand(patterns):
+    """Sorted unique file names matching glob patterns."""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    filenames = set()
+    for pattern in patterns:
+        filenames.update(glob.glob(pattern, recursive=True))
+    filenames = sorted(f for f in filenames if os.path.isfile(f))
+    if not filenames:
+        raise ValueError(f"No files match {patterns}.")
+    return filenames
+
+
+def _timed(function, *args, **kwargs):
+    """Return the result of a function and its wall time in seconds."""
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def _parent_summary(xmap_parent):
+    """Number of parent grains, fraction of reconstructed points and
+    their mean fit in degrees.
+    """
+    parent_id = xmap_parent.parent_id
+    is_parent = parent_id != -1
+    fit = xmap_parent.fit[is_parent]
+    return {
+        "n_parents": int(np.unique(parent_id[is_parent]).size),
+        "reconstructed": float(np.mean(is_parent)) if parent_id.size else 0.0,
+        "mean_fit": float(np.rad2deg(fit.mean())) if fit.size else float("nan"),
+    }
+
+
+def _phase_key(value):
+    """Phase ID if `value` is an integer, otherwise the phase name."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def main(args=None):
+    """Run the batch reconstruction from the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m reconstruction.batch", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument(
+        "filenames", nargs="+", help="Glob patterns of .ang or .h5 files."
+    )
+    parser.add_argument("-o", "--output-dir", default=".")
+    parser.add_argument("--n-processes", type=int)
+    parser.add_argument("--n-threads", type=int, default=2)
+    parser.add_argument("--orientation-relationship", default="KS")
+    parser.add_argument(
+        "--child-phase", type=_phase_key, help="Name or ID of the child phase."
+    )
+    parser.add_argument("--summary", default="summary.csv")
+    parsed = parser.parse_args(args)
+
+    rows = reconstruct_batch(
+        parsed.filenames,
+        parsed.output_dir,
+        n_processes=parsed.n_processes,
+        n_threads=parsed.n_threads,
+        summary=parsed.summary,
+        orientation_relationship=parsed.orientation_relationship,
+        child_phase=parsed.child_phase,
+    )
+    for row in rows:
+        if row["error"]:
+            print(f"{row['filename']}: failed, {row['error']}")
+        else:
+            print(
+                f"{row['filename']}: {row['n_parents']} parent grains, "
+                f"{row['reconstructed']:.1%} reconstructed, mean fit "
+                f"{row['mean_fit']:.2f} deg, {row['reconstruct_time']:.2f} s"
+            )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
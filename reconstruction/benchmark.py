@@ -0,0 +1,467 @@
+"""Benchmark of the reconstruction stages on synthetic martensite maps.
+
+Every map size is generated with
+:func:`~reconstruction.synthetic.synthetic_martensite_map`, so that the
+benchmark runs offline and the accuracy can be measured against the
+ground truth. The stages are
+
+* "graph": the pixel neighbour graph,
+  :meth:`~orix.crystal_map.CrystalMap.neighbor_graph`
+* "reconstruct": parent grains from the child grain graph,
+  :func:`~reconstruction.engine.reconstruct`
+* "likelihood": the misfit of every pixel, through its closest variant,
+  to the orientations of at most `n_labels` parent grains of its own
+  and the neighbouring child grains
+* "cut": parent grain of every pixel by
+  :func:`~reconstruction.graph_cut.alpha_expansion` of the misfits with
+  Potts smoothing
+* "labelling": variant, Bain group, packet and block of every pixel,
+  :func:`~reconstruction.labelling.label_variants`
+
+The throughput of histogram ODF queries,
+:meth:`orix.odf.fast_odf.ODF.query`, is measured on its own with
+:func:`query_throughput`, for nearest bin and interpolated lookups in
+both binning spaces. On one core, MRP queries should reach 10 million
+orientations per second.
+
+The wall time of each stage and the peak resident set size (RSS) of the
+process after it are recorded. Accuracy is the fraction of indexed
+pixels whose label agrees with their ground truth label, after mapping
+every ground truth label to the label found for most of its pixels.
+
+Results are returned and saved as JSON, to track regressions between
+releases::
+
+    python -m reconstruction.benchmark --sizes 256 512 1024 -o bench.json
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+from multiprocessing import get_context
+import os
+import platform
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from orix import __version__
+from orix.crystal_map import Phase
+from orix.odf.fast_odf import ODF
+from reconstruction.engine import _parent_crystal_map, reconstruct
+from reconstruction.graph_cut import alpha_expansion
+from reconstruction.labelling import label_variants
+from reconstruction.pipeline import _candidate_misfits, _parent_grain_orientations
+from reconstruction.synthetic import synthetic_martensite_map
+from reconstruction.variants import get_variants
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Not available on Windows
+    resource = None
+
+# Orientations per second that histogram ODF queries should reach on one
+# core
+QUERY_TARGET = 1e7
+
+
+def run_benchmark(
+    sizes=(128, 256, 512),
+    n_parents=16,
+    orientation_relationship="KS",
+    lath_width=4,
+    alpha=20000,
+    not_indexed=0.01,
+    smoothness=np.deg2rad(1),
+    n_labels=8,
+    connectivity=4,
+    seed=0,
+    isolate=True,
+    n_queries=10**6,
+    filename=None,
+):
+    """Run all reconstruction stages on synthetic maps of several sizes.
+
+    Parameters
+    ----------
+    sizes : list of int, optional
+        Number of rows and columns of each square map. Default is
+        (128, 256, 512).
+    n_parents : int, optional
+        Number of parent grains in each map. Default is 16.
+    orientation_relationship : str or array_like, optional
+        Orientation relationship of the maps and of the reconstruction,
+        either "KS" (default) or "NW", or the three ksi values in
+        degrees.
+    lath_width : float, optional
+        Width of the laths in pixels. Default is 4.
+    alpha : float, optional
+        Concentration of the orientation noise, see
+        :func:`~reconstruction.synthetic.synthetic_martensite_map`.
+        Default is 20000, a mean noise angle of about 0.5 degrees.
+    not_indexed : float, optional
+        Fraction of not indexed pixels. Default is 0.01.
+    smoothness : float, optional
+        Potts weight in radians of neighbouring pixels in the cut.
+        Default is 1 degree.
+    n_labels : int, optional
+        Highest number of candidate parent grains of a pixel in the
+        likelihood and cut stages, bounding their memory. Default is 8.
+    connectivity : int, optional
+        Pixel connectivity, 4 (default) or 8.
+    seed : int, optional
+        Seed of the random numbers of every map. Default is 0.
+    isolate : bool, optional
+        Whether to benchmark each size in a new process, so that the
+        peak RSS of a size is not affected by the previous sizes.
+        Default is True.
+    n_queries : int, optional
+        Number of orientations of the ODF query throughput, see
+        :func:`query_throughput`. If 0, it is not measured. Default is
+        10**6.
+    filename : str, optional
+        If given, the results are written to this JSON file.
+
+    Returns
+    -------
+    dict
+        The "metadata" of the machine and software, the "settings"
+        passed, the "results" of each size, as returned by
+        :func:`benchmark_map`, and the "query_throughput" of each space
+        and lookup in orientations per second.
+
+    Examples
+    --------
+    >>> from reconstruction.benchmark import run_benchmark
+    >>> results = run_benchmark([64], isolate=False)
+    >>> list(results["results"][0]["stages"])
+    ['generate', 'graph', 'reconstruct', 'likelihood', 'cut', 'labelling']
+    """
+    settings = dict(
+        n_parents=n_parents,
+        orientation_relationship=orientation_relationship,
+        lath_width=lath_width,
+        alpha=alpha,
+        not_indexed=not_indexed,
+        smoothness=smoothness,
+        n_labels=n_labels,
+        connectivity=connectivity,
+        seed=seed,
+    )
+    results = []
+    for size in sizes:
+        if isolate:
+            context = get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(_warm_benchmark_map, (size, size), settings)
+                results.append(result.result())
+        else:
+            results.append(_warm_benchmark_map((size, size), settings))
+
+    throughput = {}
+    if n_queries > 0:
+        for space in ["mrp", "cubochoric"]:
+            for interpolate in [False, True]:
+                lookup = "interpolated" if interpolate else "nearest"
+                throughput[f"{space}_{lookup}"] = query_throughput(
+                    n_queries, space=space, interpolate=interpolate, seed=seed
+                )
+
+    output = {
+        "metadata": _metadata(),
+        "settings": dict(settings, sizes=list(sizes), n_queries=n_queries),
+        "results": results,
+        "query_throughput": throughput,
+    }
+    if filename is not None:
+        with open(filename, "w") as f:
+            json.dump(_to_json(output), f, indent=2)
+    return _to_json(output)
+
+
+def benchmark_map(
+    shape,
+    n_parents=16,
+    orientation_relationship="KS",
+    lath_width=4,
+    alpha=20000,
+    not_indexed=0.01,
+    smoothness=np.deg2rad(1),
+    n_labels=8,
+    connectivity=4,
+    seed=0,
+):
+    """Run all reconstruction stages on one synthetic map.
+
+    Parameters are described in :func:`run_benchmark`.
+
+    Returns
+    -------
+    dict
+        The map "shape" and "n_points", the "time" in seconds and
+        "peak_rss" in MiB of each of the "stages", and the "accuracy" of
+        the parent grains after the "reconstruct" and "cut" stages and
+        of the "variant" labels.
+    """
+    timer = _StageTimer()
+    with timer("generate"):
+        xmap, _ = synthetic_martensite_map(
+            shape,
+            n_parents,
+            orientation_relationship,
+            lath_width=lath_width,
+            alpha=alpha,
+            not_indexed=not_indexed,
+            seed=seed,
+        )
+    is_indexed = xmap.phase_id != -1
+    true_parent = xmap.parent_id
+    n_variants = get_variants(orientation_relationship).size
+    true_variant = true_parent * n_variants + xmap.variant_id
+
+    with timer("graph"):
+        graph = xmap.neighbor_graph(connectivity)
+    with timer("reconstruct"):
+        xmap_parent = reconstruct(
+            xmap, orientation_relationship, connectivity=connectivity
+        )
+    with timer("likelihood"):
+        parent_q = _parent_grain_orientations(
+            xmap_parent.parent_id, xmap_parent.rotations.data
+        )
+        candidates, misfit = _candidate_misfits(
+            xmap.rotations.data,
+            parent_q,
+            orientation_relationship,
+            is_indexed,
+            xmap_parent.parent_id,
+            graph,
+            np.deg2rad(3),
+            n_labels,
+            2**18,
+        )
+    with timer("cut"):
+        graph.data[:] = smoothness
+        labels, _ = alpha_expansion(graph, misfit, candidates=candidates)
+
+    # Parent map of the cut, labelled in the last stage
+    cut_parent = np.where(is_indexed, labels, -1)
+    is_label = candidates == cut_parent[:, np.newaxis]
+    fit = np.where(cut_parent != -1, np.sum(misfit * is_label, axis=1), np.nan)
+    is_cut = (cut_parent != -1)[:, np.newaxis]
+    xmap_cut = _parent_crystal_map(
+        xmap,
+        Phase(name="austenite", space_group=225),
+        cut_parent,
+        np.where(is_cut, parent_q[np.maximum(cut_parent, 0)], xmap.rotations.data),
+        fit,
+    )
+    with timer("labelling"):
+        label_variants(xmap, xmap_cut, orientation_relationship)
+
+    cut_variant = np.where(
+        is_indexed, cut_parent * n_variants + xmap_cut.variant_id, -1
+    )
+    accuracy = {
+        "reconstruct": _matched_accuracy(
+            true_parent[is_indexed], xmap_parent.parent_id[is_indexed]
+        ),
+        "cut": _matched_accuracy(true_parent[is_indexed], cut_parent[is_indexed]),
+        "variant": _matched_accuracy(true_variant[is_indexed], cut_variant[is_indexed]),
+    }
+    return {
+        "shape": list(shape),
+        "n_points": xmap.size,
+        "stages": timer.stages,
+        "accuracy": accuracy,
+    }
+
+
+def query_throughput(
+    n_queries=10**7,
+    bin_number=100,
+    symmetry=None,
+    space="mrp",
+    interpolate=False,
+    repeat=3,
+    seed=0,
+):
+    """Orientations per second queried in a histogram ODF.
+
+    The ODF of 10**5 random orientations is queried at `n_queries`
+    random orientations `repeat` times, after a first query which loads
+    the compiled lookup, and the fastest query is returned.
+
+    Parameters
+    ----------
+    n_queries : int, optional
+        Number of orientations of each query. Default is 10**7.
+    bin_number, symmetry, space
+        Settings of the :class:`~orix.odf.fast_odf.ODF`. Default is 100
+        bins per axis over all MRPs.
+    interpolate : bool, optional
+        Whether queries are interpolated. Default is False.
+    repeat : int, optional
+        Number of timed queries. Default is 3.
+    seed : int, optional
+        Seed of the random orientations. Default is 0.
+
+    Returns
+    -------
+    float
+        Orientations per second, which should be at least
+        :data:`QUERY_TARGET` for MRPs on one core.
+
+    Examples
+    --------
+    >>> from reconstruction.benchmark import query_throughput
+    >>> query_throughput(10**7) > 1e7  # doctest: +SKIP
+    True
+    """
+    q = np.random.default_rng(seed).normal(size=(n_queries + 10**5, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    odf = ODF(q[: 10**5], 1, bin_number, symmetry=symmetry, space=space)
+    q = q[10**5 :]
+    odf.query(q[:10], interpolate)
+    fastest = np.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        odf.query(q, interpolate)
+        fastest = min(fastest, perf_counter() - start)
+    return n_queries / fastest
+
+
+def _warm_benchmark_map(shape, settings):
+    """Benchmark one map after running all stages on a small map, so
+    that loading compiled Numba functions is not timed.
+    """
+    _ = benchmark_map((16, 16), **dict(settings, n_parents=2))
+    return benchmark_map(shape, **settings)
+
+
+class _StageTimer:
+    """Context manager factory recording the wall time and the peak RSS
+    after each stage.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, name):
+        self._name = name
+        return self
+
+    def __enter__(self):
+        self._start = perf_counter()
+
+    def __exit__(self, *args):
+        self.stages[self._name] = {
+            "time": perf_counter() - self._start,
+            "peak_rss": _peak_rss(),
+        }
+
+
+def _peak_rss():
+    """Peak resident set size of this process in MiB, or None if it
+    cannot be found on this platform.
+    """
+    if resource is None:  # pragma: no cover
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    if sys.platform == "darwin":  # pragma: no cover
+        peak /= 1024
+    return peak / 1024
+
+
+def _matched_accuracy(truth, labels):
+    """Fraction of points whose label is the one found for most points
+    of their ground truth label. Points labelled -1 are always wrong.
+    """
+    if truth.size == 0:
+        return float("nan")
+    _, truth = np.unique(truth, return_inverse=True)
+    unique_labels, labels = np.unique(labels, return_inverse=True)
+    n_labels = labels.max() + 1
+    counts = np.bincount(
+        truth * n_labels + labels, minlength=(truth.max() + 1) * n_labels
+    ).reshape(-1, n_labels)
+    counts[:, unique_labels == -1] = 0
+    return float(counts.max(axis=1).sum() / truth.size)
+
+
+def _metadata():
+    """Software versions and machine of the benchmark."""
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "orix": __version__,
+        "numpy": np.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _to_json(obj):
+    """Replace NumPy scalars by Python numbers in nested containers."""
+    if isinstance(obj, dict):
+        return {k: _to_json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_json(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def main(args=None):
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m reconstruction.benchmark", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[128, 256, 512],
+        help="Number of rows and columns of each square map.",
+    )
+    parser.add_argument("--n-parents", type=int, default=16)
+    parser.add_argument("--n-labels", type=int, default=8)
+    parser.add_argument("--orientation-relationship", default="KS")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--n-queries",
+        type=int,
+        default=10**6,
+        help="Number of orientations of the ODF query throughput, 0 to skip it.",
+    )
+    parser.add_argument("-o", "--output", help="JSON file to write results to.")
+    parsed = parser.parse_args(args)
+
+    output = run_benchmark(
+        parsed.sizes,
+        n_parents=parsed.n_parents,
+        n_labels=parsed.n_labels,
+        orientation_relationship=parsed.orientation_relationship,
+        seed=parsed.seed,
+        n_queries=parsed.n_queries,
+        filename=parsed.output,
+    )
+    for result in output["results"]:
+        stages = ", ".join(
+            f"{name} {stage['time']:.2f} s" for name, stage in result["stages"].items()
+        )
+        accuracy = ", ".join(f"{k} {v:.4f}" for k, v in result["accuracy"].items())
+        print(f"{result['n_points']} points: {stages}; accuracy: {accuracy}")
+    for name, rate in output["query_throughput"].items():
+        below = (
+            " (below target)" if name.startswith("mrp") and rate < QUERY_TARGET else ""
+        )
+        print(f"ODF query {name}: {rate / 1e6:.1f} M/s{below}")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
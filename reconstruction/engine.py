@@ -0,0 +1,489 @@
+"""Parent austenite reconstruction from crystal maps of martensite.
+
+The reconstruction follows the grain graph approach: martensite pixels
+are segmented into child grains, every child grain is given its
+candidate parent orientations from the orientation relationship (OR),
+and neighbouring child grains whose candidates coincide are clustered
+into parent grains. All per-pixel work is vectorized over NumPy arrays.
+
+Orientations follow the orix convention where crystal symmetry acts
+from the left. With the OR matrix :math:`T` mapping parent crystal
+coordinates to child crystal coordinates, a child orientation is
+:math:`g_c = s_c T s_p g_p`, and the candidate parent orientations of a
+child orientation are :math:`T^{-1} s_c g_c` for all child symmetry
+operations :math:`s_c`.
+"""
+
+import numpy as np
+from scipy.sparse import coo_matrix, triu
+from scipy.sparse.csgraph import connected_components
+
+from orix.crystal_map import CrystalMap, Phase
+from orix.quaternion import Rotation
+from reconstruction._util import (
+    dot_to_angle,
+    grouped_mean,
+    qu_conjugate,
+    qu_multiply,
+    symmetry_align,
+    unique_modulo_symmetry,
+)
+from reconstruction.variants import get_variants
+
+
+def reconstruct(
+    xmap,
+    orientation_relationship="KS",
+    child_phase=None,
+    parent_phase=None,
+    grain_threshold=np.deg2rad(3),
+    fit_threshold=np.deg2rad(3),
+    connectivity=4,
+    chunk_size=2**18,
+):
+    """Reconstruct the parent austenite map of a martensite crystal map.
+
+    Parameters
+    ----------
+    xmap : orix.crystal_map.CrystalMap
+        Map with martensite (child) orientations. Only the first
+        rotation per point is used.
+    orientation_relationship : str, array_like or OrientationRelationship, optional
+        Either "KS" (default) or "NW", or the three ksi values in
+        degrees, or any orientation relationship between the child
+        and parent phases, e.g. "Burgers", passed on to
+        :func:`~reconstruction.variants.get_variants`.
+    child_phase : str or int, optional
+        Name or ID of the martensite phase. Must be given if there is
+        more than one indexed phase in the data.
+    parent_phase : orix.crystal_map.Phase, optional
+        Phase of the reconstructed points. If None (default), an
+        austenite phase with space group Fm-3m is used, so other parent
+        phases, e.g. beta titanium, must be passed. If a phase with the
+        same name is already in the map, its ID is reused.
+    grain_threshold : float, optional
+        Highest misorientation angle in radians between neighbouring
+        pixels in the same child grain. Default is 3 degrees.
+    fit_threshold : float, optional
+        Highest angle in radians between the candidate parent
+        orientations of two neighbouring child grains for them to be
+        considered children of the same parent grain. Default is 3
+        degrees.
+    connectivity : int, optional
+        Pixel connectivity, 4 (default) or 8.
+    chunk_size : int, optional
+        Number of pixels or boundaries handled at a time in the
+        vectorized computations, bounding the memory use. Default is
+        2**18.
+
+    Returns
+    -------
+    orix.crystal_map.CrystalMap
+        Map of the same points with reconstructed points set to the
+        parent phase and orientation. Points which could not be
+        reconstructed keep their phase and orientation. The properties
+        "parent_id" (-1 if not reconstructed) and "fit" (angle in
+        radians between a pixel's candidate parent orientation and the
+        mean orientation of its parent grain) are added.
+
+    Examples
+    --------
+    >>> from reconstruction import reconstruct
+    >>> xmap_parent = reconstruct(xmap, "KS")  # doctest: +SKIP
+    >>> xmap_parent.plot(xmap_parent.parent_id)  # doctest: +SKIP
+    """
+    child_id = _get_child_phase_id(xmap, child_phase)
+    if parent_phase is None:
+        parent_phase = Phase(name="austenite", space_group=225)
+    parent_id, _, parent_q, fit = _reconstruct_points(
+        xmap,
+        orientation_relationship,
+        child_id,
+        parent_phase,
+        grain_threshold,
+        fit_threshold,
+        connectivity,
+        chunk_size,
+    )
+    return _parent_crystal_map(xmap, parent_phase, parent_id, parent_q, fit)
+
+
+def inverse_variant_table(or_matrix, child_symmetry, parent_symmetry):
+    """Rotations taking a child orientation to its candidate parent
+    orientations.
+
+    Parameters
+    ----------
+    or_matrix : numpy.ndarray
+        OR quaternion :math:`T` of shape (4,), mapping parent to child
+        crystal coordinates.
+    child_symmetry, parent_symmetry : numpy.ndarray
+        Proper symmetry operations of shape (k, 4).
+
+    Returns
+    -------
+    inverse_variants : numpy.ndarray
+        Quaternions :math:`T^{-1} s_c`, unique modulo the parent
+        symmetry, of shape (n_candidates, 4).
+    child_to_candidate : numpy.ndarray
+        Index into `inverse_variants` for every child symmetry
+        operation.
+    """
+    u = qu_multiply(qu_conjugate(or_matrix), child_symmetry)
+    unique, inverse = unique_modulo_symmetry(u, parent_symmetry)
+    return u[unique], inverse
+
+
+def grain_mean_orientations(q, grain_id, n_grains, symmetry):
+    """Mean orientation and pixel count of each grain.
+
+    Every pixel is first aligned, modulo symmetry, to the first pixel of
+    its grain.
+
+    Parameters
+    ----------
+    q : numpy.ndarray
+        Pixel quaternions of shape (n, 4).
+    grain_id : numpy.ndarray
+        Grain label of each pixel in the range [0, `n_grains`).
+    n_grains : int
+        Number of grains.
+    symmetry : numpy.ndarray
+        Proper symmetry operations of shape (k, 4).
+
+    Returns
+    -------
+    mean : numpy.ndarray
+        Mean quaternions of shape (n_grains, 4).
+    area : numpy.ndarray
+        Number of pixels in each grain.
+    """
+    _, first = np.unique(grain_id, return_index=True)
+    reference = np.zeros((n_grains, 4))
+    reference[grain_id[first]] = q[first]
+    aligned = symmetry_align(q, reference[grain_id], symmetry)
+    mean = grouped_mean(aligned, grain_id, n_grains)
+    area = np.bincount(grain_id, minlength=n_grains)
+    return mean, area
+
+
+def boundary_fit(
+    q1, q2, or_matrix, child_symmetry, parent_symmetry, threshold, chunk_size=1024
+):
+    """Find all candidate parent orientations of pairs of child
+    orientations that agree within a threshold.
+
+    A pair of children of the same parent has a misorientation
+    :math:`q_2 q_1^{-1} = s_a T s_p T^{-1} s_b`. All such products are
+    tabulated once, so that matching every pair is a single matrix
+    product against the table. A pair may match more than one
+    combination of candidates, all of which are returned.
+
+    Parameters
+    ----------
+    q1, q2 : numpy.ndarray
+        Child orientations of shape (n, 4).
+    or_matrix : numpy.ndarray
+        OR quaternion of shape (4,).
+    child_symmetry, parent_symmetry : numpy.ndarray
+        Proper symmetry operations of shape (k, 4).
+    threshold : float
+        Highest angle in radians between matching candidates.
+    chunk_size : int, optional
+        Number of pairs handled at a time. Default is 1024.
+
+    Returns
+    -------
+    index : numpy.ndarray
+        Index of the pair of each match.
+    fit : numpy.ndarray
+        Angle in radians between the two matching candidates.
+    k1, k2 : numpy.ndarray
+        Indices of the child symmetry operations giving the matching
+        candidates :math:`T^{-1} s_{k} q` of `q1` and `q2`.
+    """
+    ns = child_symmetry.shape[0]
+    t = or_matrix
+    conjugated = qu_multiply(qu_multiply(t, parent_symmetry), qu_conjugate(t))
+    table = qu_multiply(
+        qu_multiply(
+            child_symmetry[:, np.newaxis, np.newaxis], conjugated[:, np.newaxis]
+        ),
+        child_symmetry,
+    )
+    n_p = conjugated.shape[0]
+    table = table.reshape(-1, 4)
+    # Index of the inverse of each child symmetry operation
+    inverse_s = np.abs(
+        qu_multiply(child_symmetry[:, np.newaxis], child_symmetry)[..., 0]
+    ).argmax(axis=1)
+    min_dot = np.cos(threshold / 2)
+
+    n = q1.shape[0]
+    empty = np.zeros(0, dtype=int)
+    index, fit, k1, k2 = [empty], [np.zeros(0)], [empty], [empty]
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        m = qu_multiply(q2[start:stop], qu_conjugate(q1[start:stop]))
+        dots = np.abs(m @ table.T)
+        i, j = np.nonzero(dots > min_dot)
+        a, _, b = np.unravel_index(j, (ns, n_p, ns))
+        index.append(start + i)
+        fit.append(dot_to_angle(dots[i, j]))
+        k1.append(b)
+        k2.append(inverse_s[a])
+    return tuple(np.concatenate(i) for i in [index, fit, k1, k2])
+
+
+def cluster_parent_grains(grain_pairs, k1, k2, grain_area, n_candidates):
+    """Cluster child grains into parent grains by majority vote.
+
+    Each (child grain, candidate parent) combination is a node in a
+    graph, and fitting child grain boundaries link the nodes of the two
+    matching candidates. Every child grain picks the candidate whose
+    connected component covers the largest area.
+
+    Parameters
+    ----------
+    grain_pairs : numpy.ndarray
+        Fitting pairs of child grains of shape (m, 2).
+    k1, k2 : numpy.ndarray
+        Fitting candidate index of the first and second grain.
+    grain_area : numpy.ndarray
+        Area of each child grain. Grains with zero area are not
+        clustered.
+    n_candidates : int
+        Number of candidate parents per child grain.
+
+    Returns
+    -------
+    parent_id : numpy.ndarray
+        Parent grain of each child grain, -1 if it is not linked to any
+        other child grain.
+    candidate : numpy.ndarray
+        Index of the chosen candidate parent of each child grain.
+    """
+    n_grains = grain_area.size
+    nodes1 = grain_pairs[:, 0] * n_candidates + k1
+    nodes2 = grain_pairs[:, 1] * n_candidates + k2
+    n_nodes = n_grains * n_candidates
+    node_pairs = np.column_stack((nodes1, nodes2))
+    component, n_components = _connected_labels(n_nodes, node_pairs)
+
+    node_area = np.repeat(grain_area, n_candidates)
+    component_area = np.bincount(component, weights=node_area, minlength=n_components)
+    component_size = np.bincount(component, minlength=n_components)
+
+    votes = component_area[component].reshape(n_grains, n_candidates)
+    candidate = votes.argmax(axis=1)
+    chosen = component[np.arange(n_grains) * n_candidates + candidate]
+    is_parent = (component_size[chosen] > 1) & (grain_area > 0)
+
+    parent_id = np.full(n_grains, -1)
+    _, parent_id[is_parent] = np.unique(chosen[is_parent], return_inverse=True)
+    return parent_id, candidate
+
+
+def parent_orientations(q, parent_id, inverse_variants, parent_symmetry):
+    """Mean orientation of each parent grain and the fit of every pixel
+    to it.
+
+    Parameters
+    ----------
+    q : numpy.ndarray
+        Child pixel quaternions of shape (n, 4).
+    parent_id : numpy.ndarray
+        Parent grain of each pixel, -1 if not reconstructed.
+    inverse_variants : numpy.ndarray
+        Chosen inverse variant of each pixel, of shape (n, 4).
+    parent_symmetry : numpy.ndarray
+        Proper parent symmetry operations of shape (k, 4).
+
+    Returns
+    -------
+    parent_q : numpy.ndarray
+        Parent orientation of each pixel, of shape (n, 4). Pixels which
+        are not reconstructed get their child orientation.
+    fit : numpy.ndarray
+        Angle in radians between each pixel's candidate parent and the
+        parent grain mean, NaN if not reconstructed.
+    """
+    is_parent = parent_id >= 0
+    pid = parent_id[is_parent]
+    n_parents = pid.max() + 1 if pid.size else 0
+    candidates = qu_multiply(inverse_variants[is_parent], q[is_parent])
+
+    _, first = np.unique(pid, return_index=True)
+    reference = candidates[first][pid]
+    aligned = symmetry_align(candidates, reference, parent_symmetry)
+    mean = grouped_mean(aligned, pid, n_parents)
+
+    parent_q = np.array(q, copy=True)
+    parent_q[is_parent] = mean[pid]
+    fit = np.full(q.shape[0], np.nan)
+    fit[is_parent] = dot_to_angle(np.sum(aligned * mean[pid], axis=-1))
+    return parent_q, fit
+
+
+def _reconstruct_points(
+    xmap,
+    orientation_relationship,
+    child_id,
+    parent_phase,
+    grain_threshold,
+    fit_threshold,
+    connectivity,
+    chunk_size,
+    graph=None,
+):
+    """Parent grain ID, candidate parent orientation, parent orientation
+    and fit of every point, see :func:`reconstruct`.
+
+    The candidate parent orientation of a point is the one chosen from
+    its child orientation, or its child orientation if it is not
+    reconstructed. The pixel neighbour graph of
+    :meth:`~orix.crystal_map.CrystalMap.neighbor_graph` is built unless
+    it is passed as `graph`.
+    """
+    child_symmetry = xmap.phases[child_id].point_group.proper_subgroup.data
+    parent_symmetry = parent_phase.point_group.proper_subgroup.data
+
+    rotations = xmap.rotations
+    if xmap.rotations_per_point > 1:
+        rotations = rotations[:, 0]
+    q = rotations.data
+    is_child = xmap.phase_id == child_id
+
+    or_matrix = _or_rotation(orientation_relationship)
+    inverse_variants, child_to_candidate = inverse_variant_table(
+        or_matrix, child_symmetry, parent_symmetry
+    )
+
+    # Stage 1: pixel graph and child grains
+    if graph is None:
+        graph = xmap.neighbor_graph(connectivity, chunk_size)
+    grain_id, n_grains, boundary = _child_grains(graph, is_child, grain_threshold)
+    grain_q, grain_area = grain_mean_orientations(q, grain_id, n_grains, child_symmetry)
+
+    # Stage 2: candidate parents and fit of child grain boundaries
+    grain_pairs, _ = _grain_boundaries(grain_id[boundary], n_grains)
+    index, _, k1, k2 = boundary_fit(
+        grain_q[grain_pairs[:, 0]],
+        grain_q[grain_pairs[:, 1]],
+        or_matrix,
+        child_symmetry,
+        parent_symmetry,
+        fit_threshold,
+        chunk_size=max(chunk_size // 256, 1),
+    )
+
+    # Stage 3: cluster child grains into parent grains
+    is_child_grain = np.zeros(n_grains, dtype=bool)
+    is_child_grain[grain_id[is_child]] = True
+    grain_parent, grain_candidate = cluster_parent_grains(
+        grain_pairs[index],
+        child_to_candidate[k1],
+        child_to_candidate[k2],
+        grain_area * is_child_grain,
+        inverse_variants.shape[0],
+    )
+
+    # Stage 4: parent orientation of each parent grain and pixel. The
+    # candidate indices refer to the grain mean, so pixels are aligned
+    # to it first.
+    parent_id = np.where(is_child, grain_parent[grain_id], -1)
+    candidate = np.where(is_child, grain_candidate[grain_id], 0)
+    q_aligned = symmetry_align(q, grain_q[grain_id], child_symmetry)
+    candidate_q = qu_multiply(inverse_variants[candidate], q_aligned)
+    candidate_q = np.where(is_child[:, np.newaxis], candidate_q, q)
+    parent_q, fit = parent_orientations(
+        q_aligned, parent_id, inverse_variants[candidate], parent_symmetry
+    )
+    return parent_id, candidate_q, parent_q, fit
+
+
+def _or_rotation(orientation_relationship):
+    """OR quaternion :math:`T` from a named OR or ksi values."""
+    return get_variants(orientation_relationship).rotations.data[0]
+
+
+def _get_child_phase_id(xmap, child_phase):
+    """Phase ID of the child phase in a crystal map."""
+    if child_phase is None:
+        ids = [i for i in np.unique(xmap.phase_id) if i != -1]
+        if len(ids) != 1:
+            raise ValueError(
+                f"Data has the phases {xmap.phases_in_data.names}, pass the name or ID "
+                "of the child phase to `child_phase`."
+            )
+        child_phase = ids[0]
+    elif isinstance(child_phase, str):
+        child_phase = xmap.phases.id_from_name(child_phase)
+    if xmap.phases[child_phase].point_group is None:
+        raise ValueError("The child phase must have a point group.")
+    return int(child_phase)
+
+
+def _connected_labels(n, pairs):
+    """Connected component label of each of `n` nodes linked by
+    `pairs`.
+    """
+    graph = coo_matrix(
+        (np.ones(pairs.shape[0], dtype=bool), (pairs[:, 0], pairs[:, 1])),
+        shape=(n, n),
+    )
+    n_labels, labels = connected_components(graph, directed=False)
+    return labels, n_labels
+
+
+def _child_grains(graph, is_child, grain_threshold):
+    """Child grain of every point, the number of grains and the pairs
+    of neighbouring child points in different grains, from the pixel
+    neighbour graph.
+    """
+    graph = triu(graph, format="coo")
+    pairs = np.column_stack((graph.row, graph.col))
+    is_child_pair = is_child[pairs[:, 0]]
+    pairs = pairs[is_child_pair]
+    in_grain = graph.data[is_child_pair] < grain_threshold
+    grain_id, n_grains = _connected_labels(is_child.size, pairs[in_grain])
+    return grain_id, n_grains, pairs[~in_grain]
+
+
+def _grain_boundaries(grain_pairs, n_grains):
+    """Unique pairs of neighbouring grains and their boundary length in
+    pixel edges.
+    """
+    grain_pairs = np.sort(grain_pairs, axis=1)
+    grain_pairs = grain_pairs[grain_pairs[:, 0] != grain_pairs[:, 1]]
+    key = grain_pairs[:, 0].astype(np.int64) * n_grains + grain_pairs[:, 1]
+    key, length = np.unique(key, return_counts=True)
+    return np.column_stack((key // n_grains, key % n_grains)), length
+
+
+def _parent_crystal_map(xmap, parent_phase, parent_id, parent_q, fit):
+    """Crystal map with reconstructed points in the parent phase."""
+    phase_list = xmap.phases.deepcopy()
+    if parent_phase.name in phase_list.names:
+        parent_phase_id = phase_list.id_from_name(parent_phase.name)
+    else:
+        phase_list.add(parent_phase.deepcopy())
+        parent_phase_id = phase_list.id_from_name(parent_phase.name)
+    phase_id = np.where(parent_id >= 0, parent_phase_id, xmap.phase_id)
+
+    prop = {k: xmap.prop[k] for k in xmap.prop.keys()}
+    prop["parent_id"] = parent_id
+    prop["fit"] = fit
+
+    is_in_data = xmap.is_in_data
+    coordinates = {}
+    for name, values in xmap._all_coordinates.items():
+        coordinates[name] = None if values is None else values[is_in_data]
+    return CrystalMap(
+        rotations=Rotation(parent_q),
+        phase_id=phase_id,
+        phase_list=phase_list,
+        prop=prop,
+        scan_unit=xmap.scan_unit,
+        **coordinates,
+    )
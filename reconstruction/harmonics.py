@@ -0,0 +1,383 @@
+"""Fourier coefficients of orientation distribution functions (ODFs) in
+the basis of Wigner D-functions, the harmonics on SO(3).
+
+A kernel ODF :math:`f(g) = \\sum_i w_i \\psi(g g_i^{-1})` with a kernel
+:math:`\\psi(\\omega) = \\sum_l A_l \\chi_l(\\omega)` of Chebyshev
+coefficients :math:`A_l`, e.g. the de la Vallée Poussin kernel of
+:func:`~reconstruction.deLaValeePoussinKernel.generate_kernel`, has the
+expansion
+
+.. math::
+
+    f(g) = \\sum_{l=0}^L \\sum_{m,n=-l}^l \\hat{f}^l_{mn} D^l_{mn}(g),
+    \\quad \\hat{f}^l_{mn} = A_l \\sum_i w_i \\overline{D^l_{mn}(g_i)}.
+
+The Wigner d-functions :math:`d^l_{mn}(\\beta)` are computed by the
+three-term recursion in the degree :math:`l`, vectorized over
+orientations, one degree at a time, so that the coefficients up to
+bandwidth :math:`L` of :math:`N` orientations take
+:math:`O(N L^3)` operations and the memory of one chunk of orientations
+times :math:`(2L + 1)^2`. This replaces the external NFSOFT program
+called by MTEX.
+
+Coefficients are returned as a flat complex array of
+:math:`(L + 1)(2L + 1)(2L + 3) / 3` values, degree by degree, with the
+:math:`(2l + 1) \\times (2l + 1)` matrix :math:`\\hat{f}^l_{mn}` of
+every degree in row-major order, rows :math:`m` and columns :math:`n`
+from :math:`-l` to :math:`l`, as the ``f_hat`` of MTEX.
+"""
+
+import numba as nb
+import numpy as np
+from scipy.special import gammaln, xlogy
+
+from reconstruction._util import qu_normalize
+
+
+def wigner_d(beta, bandwidth):
+    """Yield the Wigner d-functions of every degree up to a bandwidth.
+
+    Parameters
+    ----------
+    beta : numpy.ndarray
+        Angles in radians in the range [0, pi], of shape (n,).
+    bandwidth : int
+        Highest degree :math:`L`.
+
+    Yields
+    ------
+    numpy.ndarray
+        The d-functions :math:`d^l_{mn}(\\beta)` of degree
+        :math:`l = 0, ..., L`, of shape (n, 2l + 1, 2l + 1), with
+        :math:`m` and :math:`n` from :math:`-l` to :math:`l`.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from reconstruction.harmonics import wigner_d
+    >>> d = list(wigner_d(np.array([np.pi / 2]), 1))
+    >>> np.round(d[1][0], 3)
+    array([[ 0.5  ,  0.707,  0.5  ],
+           [-0.707,  0.   ,  0.707],
+           [ 0.5  , -0.707,  0.5  ]])
+    """
+    beta = np.asarray(beta, dtype=np.float64)
+    cos_beta = np.cos(beta)
+    cos_half = np.abs(np.cos(beta / 2))[:, np.newaxis]
+    sin_half = np.abs(np.sin(beta / 2))[:, np.newaxis]
+
+    d2 = np.zeros((beta.size, 0, 0))
+    d1 = np.ones((beta.size, 1, 1))
+    yield d1
+    for l in range(1, bandwidth + 1):
+        d = np.empty((beta.size, 2 * l + 1, 2 * l + 1))
+        if l > 1:
+            # Inner d-functions from the two lower degrees
+            m = np.arange(1 - l, l)
+            mm, nn = m[:, np.newaxis], m
+            a = l * (2 * l - 1) / np.sqrt((l**2 - mm**2) * (l**2 - nn**2))
+            b = np.sqrt(((l - 1) ** 2 - mm**2) * ((l - 1) ** 2 - nn**2))[1:-1, 1:-1]
+            b *= a[1:-1, 1:-1] / ((l - 1) * (2 * l - 1))
+            _recurrence(cos_beta, d1, d2, a, a * mm * nn / (l * (l - 1)), b, d)
+        else:
+            d[:, 1, 1] = cos_beta
+
+        # Outer d-functions, with max(|m|, |n|) = l, in closed form
+        k = np.arange(2 * l + 1)
+        log_binomial = gammaln(2 * l + 1) - gammaln(k + 1) - gammaln(2 * l + 1 - k)
+        edge = np.exp(
+            0.5 * log_binomial + xlogy(k, cos_half) + xlogy(2 * l - k, sin_half)
+        )
+        sign = (-1.0) ** k
+        d[:, -1] = sign[::-1] * edge
+        d[:, :, -1] = edge
+        d[:, 0] = edge[:, ::-1]
+        d[:, :, 0] = sign * edge[:, ::-1]
+
+        d2, d1 = d1, d
+        yield d
+
+
+def fourier_coefficients(
+    orientations,
+    weights=None,
+    chebyshev=None,
+    bandwidth=None,
+    symmetry=None,
+    chunk_size=2**8,
+):
+    """Return the Fourier coefficients of a kernel ODF.
+
+    Parameters
+    ----------
+    orientations : orix.quaternion.Rotation or numpy.ndarray
+        Centres of the ODF, or their quaternions of shape (..., 4).
+    weights : numpy.ndarray, optional
+        Weight of each centre. If None (default), all centres have the
+        same weight. Weights are normalized to sum to 1.
+    chebyshev : numpy.ndarray, optional
+        Chebyshev coefficients :math:`A_l` of the kernel, e.g. the ``A``
+        of :func:`~reconstruction.deLaValeePoussinKernel.generate_kernel`.
+        If None (default), all are 1, the coefficients of a sum of Dirac
+        deltas.
+    bandwidth : int, optional
+        Highest degree :math:`L`. If None (default), the degree of the
+        last Chebyshev coefficient. Must be given if `chebyshev` is
+        None.
+    symmetry : orix.quaternion.Symmetry, optional
+        Crystal symmetry the ODF is averaged over, acting from the left.
+        Only its proper rotations are used. If None (default), no
+        symmetry is applied.
+    chunk_size : int, optional
+        Number of orientations handled at a time. Default is 2**8.
+
+    Returns
+    -------
+    numpy.ndarray
+        Complex coefficients :math:`\\hat{f}^l_{mn}` of every degree up
+        to `bandwidth`, flattened as described in
+        :mod:`~reconstruction.harmonics`.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from reconstruction.harmonics import fourier_coefficients
+    >>> f_hat = fourier_coefficients(np.array([[1.0, 0, 0, 0]]), bandwidth=2)
+    >>> f_hat.size
+    35
+    """
+    if bandwidth is None:
+        if chebyshev is None:
+            raise ValueError("`bandwidth` must be given if `chebyshev` is None.")
+        bandwidth = np.size(chebyshev) - 1
+    chebyshev = _chebyshev(chebyshev, bandwidth)
+
+    q = _quaternions(orientations)
+    if weights is None:
+        weights = np.ones(q.shape[0])
+    weights = np.ravel(np.asarray(weights, dtype=np.float64))
+    weights = weights / weights.sum()
+
+    f_hat = _wigner_sum(q, weights, bandwidth, chunk_size)
+    if symmetry is not None:
+        # Average over the symmetry with the projector 1 / |S| sum_s D(s)
+        s = symmetry.proper_subgroup.data
+        projector = _wigner_sum(s, np.full(s.shape[0], 1 / s.shape[0]), bandwidth)
+        for l in range(bandwidth + 1):
+            shape = (2 * l + 1, 2 * l + 1)
+            i = _degree_slice(l)
+            f_hat[i] = (projector[i].reshape(shape) @ f_hat[i].reshape(shape)).ravel()
+    f_hat = np.conj(f_hat)
+    for l in range(bandwidth + 1):
+        f_hat[_degree_slice(l)] *= chebyshev[l]
+    return f_hat
+
+
+def evaluate_fourier(f_hat, orientations, chunk_size=2**8):
+    """Return the values of an ODF at orientations from its Fourier
+    coefficients.
+
+    Parameters
+    ----------
+    f_hat : numpy.ndarray
+        Coefficients returned by :func:`fourier_coefficients`.
+    orientations : orix.quaternion.Rotation or numpy.ndarray
+        Orientations of any shape, or quaternions of shape (..., 4).
+    chunk_size : int, optional
+        Number of orientations handled at a time. Default is 2**8.
+
+    Returns
+    -------
+    numpy.ndarray
+        Real part of the ODF at each orientation, of the shape of
+        `orientations`.
+    """
+    bandwidth = _bandwidth(f_hat)
+    q = _quaternions(orientations)
+    shape = np.shape(getattr(orientations, "data", orientations))[:-1]
+    values = np.zeros(q.shape[0])
+    for start in range(0, q.shape[0], chunk_size):
+        stop = min(start + chunk_size, q.shape[0])
+        alpha, beta, gamma = _zyz_angles(q[start:stop])
+        for l, d in enumerate(wigner_d(beta, bandwidth)):
+            m = np.arange(-l, l + 1)
+            f = f_hat[_degree_slice(l)].reshape(2 * l + 1, 2 * l + 1)
+            left = np.exp(-1j * np.outer(alpha, m))
+            right = np.exp(-1j * np.outer(gamma, m))
+            _contract(left, d, right, f, values[start:stop])
+    return values.reshape(shape)
+
+
+def evaluate_fourier_grid(f_hat, resolution=np.deg2rad(5), chunk_size=8):
+    """Return the values of an ODF on a regular grid of Euler angles from
+    its Fourier coefficients.
+
+    The sums over the orders :math:`m` and :math:`n` are inverse FFTs
+    along :math:`\\phi_2` and :math:`\\phi_1`, and only the sum over
+    the degrees is done for every :math:`\\Phi`, so that a grid of
+    :math:`N_1 \\times N_\\Phi \\times N_2` values takes
+    :math:`O(N_\\Phi (L^3 + N_1 N_2 \\log(N_1 N_2)))` operations.
+
+    Parameters
+    ----------
+    f_hat : numpy.ndarray
+        Coefficients returned by :func:`fourier_coefficients`.
+    resolution : float, optional
+        Grid spacing in radians. It is adjusted so that a whole number
+        of steps spans 2 pi. Default is 5 degrees.
+    chunk_size : int, optional
+        Number of :math:`\\Phi` values handled at a time. Default is 8.
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Real part of the ODF at every grid point, of shape
+        (n_phi1, n_Phi, n_phi2).
+    phi1, Phi, phi2 : numpy.ndarray
+        Bunge Euler angles in radians of the grid axes, as passed to
+        :meth:`~orix.quaternion.Rotation.from_euler`. The axes of
+        :math:`\\phi_1` and :math:`\\phi_2` are periodic and cover
+        [0, 2 pi), the axis of :math:`\\Phi` covers [0, pi].
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from reconstruction.harmonics import (
+    ...     evaluate_fourier_grid, fourier_coefficients
+    ... )
+    >>> f_hat = fourier_coefficients(np.array([[1.0, 0, 0, 0]]), bandwidth=4)
+    >>> values, phi1, Phi, phi2 = evaluate_fourier_grid(f_hat)
+    >>> values.shape
+    (72, 37, 72)
+    """
+    bandwidth = _bandwidth(f_hat)
+    n_periodic = max(int(round(2 * np.pi / resolution)), 1)
+    phi1 = np.arange(n_periodic) * (2 * np.pi / n_periodic)
+    Phi = np.linspace(0, np.pi, n_periodic // 2 + 1)
+    phi2 = phi1.copy()
+
+    # With the rotation R_z(alpha) R_y(beta) R_z(gamma) of Bunge angles,
+    # alpha = pi / 2 - phi2, beta = Phi and gamma = -phi1 - pi / 2, the
+    # sum is sum_mn f_mn i^(n - m) d_mn(Phi) exp(i (m phi2 + n phi1))
+    m = np.arange(-bandwidth, bandwidth + 1)
+    phase = 1j ** ((m[np.newaxis] - m[:, np.newaxis]) % 4)
+    index = m % n_periodic
+
+    values = np.empty((n_periodic, Phi.size, n_periodic))
+    for start in range(0, Phi.size, chunk_size):
+        stop = min(start + chunk_size, Phi.size)
+        g = np.zeros((stop - start, m.size, m.size), dtype=np.complex128)
+        for l, d in enumerate(wigner_d(Phi[start:stop], bandwidth)):
+            f = f_hat[_degree_slice(l)].reshape(2 * l + 1, 2 * l + 1)
+            i = slice(bandwidth - l, bandwidth + l + 1)
+            g[:, i, i] += f * d
+        g *= phase
+
+        # Orders (m, n) wrapped onto the periodic grid, as (n, m)
+        folded = np.zeros((n_periodic, stop - start, m.size), dtype=np.complex128)
+        np.add.at(folded, index, g.transpose(2, 0, 1))
+        grid = np.zeros((n_periodic, stop - start, n_periodic), dtype=np.complex128)
+        np.add.at(grid, (slice(None), slice(None), index), folded)
+        grid = np.fft.ifft2(grid, axes=(0, 2)) * n_periodic**2
+        values[:, start:stop] = grid.real
+    return values, phi1, Phi, phi2
+
+
+def _wigner_sum(q, weights, bandwidth, chunk_size=2**8):
+    """Weighted sum of the Wigner D-functions of quaternions, flattened
+    degree by degree.
+    """
+    f_hat = np.zeros(_degree_slice(bandwidth).stop, dtype=np.complex128)
+    for start in range(0, q.shape[0], chunk_size):
+        stop = min(start + chunk_size, q.shape[0])
+        alpha, beta, gamma = _zyz_angles(q[start:stop])
+        w = weights[start:stop]
+        for l, d in enumerate(wigner_d(beta, bandwidth)):
+            m = np.arange(-l, l + 1)
+            left = w[:, np.newaxis] * np.exp(-1j * np.outer(alpha, m))
+            right = np.exp(-1j * np.outer(gamma, m))
+            f = f_hat[_degree_slice(l)].reshape(2 * l + 1, 2 * l + 1)
+            _accumulate(left, d, right, f)
+    return f_hat
+
+
+def _zyz_angles(q):
+    """Euler angles (alpha, beta, gamma) of the rotations
+    :math:`R_z(\\alpha) R_y(\\beta) R_z(\\gamma)` of quaternions.
+    """
+    a, b, c, d = q.T
+    beta = 2 * np.arctan2(np.hypot(b, c), np.hypot(a, d))
+    sum_ = np.arctan2(d, a)
+    difference = np.arctan2(-b, c)
+    return sum_ + difference, beta, sum_ - difference
+
+
+def _degree_slice(l):
+    """Slice of the coefficients of degree `l`."""
+    start = l * (2 * l - 1) * (2 * l + 1) // 3
+    return slice(start, start + (2 * l + 1) ** 2)
+
+
+def _bandwidth(f_hat):
+    """Bandwidth of flattened coefficients."""
+    bandwidth = int(round((3 * f_hat.size / 4) ** (1 / 3)))
+    for l in range(max(bandwidth - 1, 0), bandwidth + 2):
+        if _degree_slice(l).stop == f_hat.size:
+            return l
+    raise ValueError(f"{f_hat.size} is not a number of coefficients up to a degree.")
+
+
+def _chebyshev(chebyshev, bandwidth):
+    """Chebyshev coefficients up to a bandwidth, padded with zeros."""
+    if chebyshev is None:
+        return np.ones(bandwidth + 1)
+    chebyshev = np.ravel(np.asarray(chebyshev, dtype=np.float64))[: bandwidth + 1]
+    return np.pad(chebyshev, (0, bandwidth + 1 - chebyshev.size))
+
+
+def _quaternions(orientations):
+    """Unit quaternions of shape (n, 4)."""
+    q = np.asarray(getattr(orientations, "data", orientations), dtype=np.float64)
+    return qu_normalize(q.reshape(-1, 4))
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _recurrence(cos_beta, d1, d2, a, c, b, d):
+    """Write the inner d-functions of a degree, (a cos(beta) - c) d1 -
+    b d2, with d1 and d2 of the two lower degrees, to `d`.
+    """
+    k = d1.shape[1]
+    for i in range(cos_beta.shape[0]):
+        x = cos_beta[i]
+        for m in range(k):
+            for n in range(k):
+                value = (a[m, n] * x - c[m, n]) * d1[i, m, n]
+                if 0 < m < k - 1 and 0 < n < k - 1:
+                    value -= b[m - 1, n - 1] * d2[i, m - 1, n - 1]
+                d[i, m + 1, n + 1] = value
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _accumulate(left, d, right, out):
+    """Add the sum over orientations of left[m] d[m, n] right[n] to
+    `out`.
+    """
+    for i in range(d.shape[0]):
+        for m in range(d.shape[1]):
+            x = left[i, m]
+            for n in range(d.shape[2]):
+                out[m, n] += x * d[i, m, n] * right[i, n]
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _contract(left, d, right, f_hat, out):
+    """Add the real part of the sum of f_hat[m, n] left[m] d[m, n]
+    right[n] to `out` for every orientation.
+    """
+    for i in range(d.shape[0]):
+        total = 0j
+        for m in range(d.shape[1]):
+            x = left[i, m]
+            for n in range(d.shape[2]):
+                total += f_hat[m, n] * x * d[i, m, n] * right[i, n]
+        out[i] += total.real
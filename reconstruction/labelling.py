@@ -0,0 +1,144 @@
+"""Labelling of the variant, Bain group, packet and block of every child
+point after reconstruction.
+
+A child orientation :math:`g_c` of a parent :math:`g_p` is
+:math:`s_c V_k g_p` for one of the variants :math:`V_k` of the
+orientation relationship, so its variant is the :math:`k` maximizing
+:math:`|\\langle s_c, g_c g_p^{-1} V_k^{-1}\\rangle|` over all child
+symmetry operations :math:`s_c`. With cubic child symmetry, the maximum
+over :math:`s_c` has a closed form, so each point costs one quaternion
+product per variant.
+"""
+
+import numba as nb
+import numpy as np
+
+from reconstruction._util import qu_conjugate
+from reconstruction.engine import _get_child_phase_id
+from reconstruction.variants import VariantTable, get_variants
+
+
+def label_variants(xmap, xmap_parent, orientation_relationship="KS", child_phase=None):
+    """Add the variant, Bain group, packet and block of every
+    reconstructed child point as properties of the parent map.
+
+    Both phases are treated as cubic, as in
+    :func:`~reconstruction.modules.yardley_variants`.
+
+    Parameters
+    ----------
+    xmap : orix.crystal_map.CrystalMap
+        Map with child orientations. Only the first rotation per point
+        is used.
+    xmap_parent : orix.crystal_map.CrystalMap
+        Map of the same points returned by
+        :func:`~reconstruction.engine.reconstruct`, with parent
+        orientations and the "parent_id" property.
+    orientation_relationship : str or array_like, optional
+        Either "KS" (default) or "NW", or the three ksi values in
+        degrees, passed on to
+        :func:`~reconstruction.variants.get_variants`.
+    child_phase : str or int, optional
+        Name or ID of the child phase in `xmap`. Must be given if there
+        is more than one indexed phase in the data.
+
+    Notes
+    -----
+    The properties "variant_id", "bain_id", "packet_id" and "block_id"
+    index into the variants of the
+    :class:`~reconstruction.variants.VariantTable` of the orientation
+    relationship and its :attr:`bain_groups`, :attr:`packets` and
+    :attr:`blocks`. They are -1 for points which are not reconstructed.
+    Variants are given relative to the parent orientation of each point,
+    which is the same for all points of a parent grain.
+
+    Examples
+    --------
+    >>> from reconstruction import label_variants, reconstruct
+    >>> xmap_parent = reconstruct(xmap, "KS")  # doctest: +SKIP
+    >>> label_variants(xmap, xmap_parent, "KS")  # doctest: +SKIP
+    >>> xmap_parent.plot(xmap_parent.packet_id)  # doctest: +SKIP
+    """
+    if xmap_parent.size != xmap.size:
+        raise ValueError(
+            f"`xmap_parent` must have the same points as `xmap`, but has "
+            f"{xmap_parent.size} points in data, not {xmap.size}."
+        )
+    if "parent_id" not in xmap_parent.prop:
+        raise ValueError(
+            "`xmap_parent` must have the 'parent_id' property, as returned by "
+            "reconstruct()."
+        )
+    child_id = _get_child_phase_id(xmap, child_phase)
+    table = get_variants(orientation_relationship)
+    if not isinstance(table, VariantTable):
+        raise ValueError(
+            "Variants can only be labelled for orientation relationships between "
+            "cubic phases given by ksi values."
+        )
+
+    q_child = xmap.rotations
+    if xmap.rotations_per_point > 1:
+        q_child = q_child[:, 0]
+    q_parent = xmap_parent.rotations
+    if xmap_parent.rotations_per_point > 1:
+        q_parent = q_parent[:, 0]
+    is_labelled = (xmap_parent.parent_id != -1) & (xmap.phase_id == child_id)
+
+    variant = np.full(xmap.size, -1)
+    variant[is_labelled], _ = _closest_variant(
+        q_child.data[is_labelled],
+        q_parent.data[is_labelled],
+        qu_conjugate(table.rotations.data),
+    )
+    for name, labels in [
+        ("bain_id", table.bain_groups),
+        ("packet_id", table.packets),
+        ("block_id", table.blocks),
+    ]:
+        xmap_parent.prop[name] = np.where(is_labelled, labels[variant], -1)
+    xmap_parent.prop["variant_id"] = variant
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _closest_variant(q_child, q_parent, inverse_variants):
+    """Index of the variant :math:`V_k` of each pair of child and
+    parent orientations, with cubic child symmetry, and the dot product
+    of the child orientation with it.
+
+    The largest :math:`|\\langle s, x\\rangle|` over the 24 proper cubic
+    symmetry operations :math:`s` is the largest of :math:`w_1`,
+    :math:`(w_1 + w_2) / \\sqrt{2}` and
+    :math:`(w_1 + w_2 + w_3 + w_4) / 2`, with :math:`w_i` the absolute
+    components of :math:`x` in decreasing order.
+    """
+    n = q_child.shape[0]
+    n_variants = inverse_variants.shape[0]
+    best = np.zeros(n, dtype=np.int64)
+    best_dots = np.zeros(n)
+    for i in range(n):
+        # m = g_c g_p^-1
+        a1, b1, c1, d1 = q_child[i]
+        a2, b2, c2, d2 = q_parent[i]
+        a = a1 * a2 + b1 * b2 + c1 * c2 + d1 * d2
+        b = -a1 * b2 + b1 * a2 - c1 * d2 + d1 * c2
+        c = -a1 * c2 + b1 * d2 + c1 * a2 - d1 * b2
+        d = -a1 * d2 - b1 * c2 + c1 * b2 + d1 * a2
+        best_dot = -1.0
+        for k in range(n_variants):
+            a2, b2, c2, d2 = inverse_variants[k]
+            w0 = abs(a * a2 - b * b2 - c * c2 - d * d2)
+            w1 = abs(a * b2 + b * a2 + c * d2 - d * c2)
+            w2 = abs(a * c2 - b * d2 + c * a2 + d * b2)
+            w3 = abs(a * d2 + b * c2 - c * b2 + d * a2)
+            # Largest and second largest absolute component
+            hi01, lo01 = max(w0, w1), min(w0, w1)
+            hi23, lo23 = max(w2, w3), min(w2, w3)
+            first = max(hi01, hi23)
+            second = max(min(hi01, hi23), max(lo01, lo23))
+            dot = max(first, (first + second) / np.sqrt(2), 0.5 * (w0 + w1 + w2 + w3))
+            if dot > best_dot:
+                best_dot = dot
+                best[i] = k
+        best_dots[i] = min(best_dot, 1.0)
+    return best, best_dots
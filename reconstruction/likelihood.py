@@ -0,0 +1,192 @@
+"""Per-pixel likelihood of the candidate parent orientations of child
+orientations under a parent orientation distribution function (ODF).
+
+Every child orientation :math:`g_c` has the candidate parent
+orientations :math:`T^{-1} s_c g_c`, one for each variant of a cubic
+orientation relationship, e.g. 24 for KS and 12 for NW, see
+:func:`~reconstruction.engine.inverse_variant_table`. Candidates are
+written as float32 quaternions into a preallocated buffer of shape
+(n, n_variants, 4), a chunk of pixels at a time, and the ODF is evaluated on a
+flat view of each chunk. No :class:`~orix.quaternion.Orientation` is
+ever built per pixel, so memory is the buffer plus one chunk of
+likelihoods.
+"""
+
+import numba as nb
+import numpy as np
+
+from orix.quaternion.symmetry import O
+from reconstruction.engine import _or_rotation, inverse_variant_table
+
+
+def parent_candidates(
+    q_child, orientation_relationship="KS", out=None, chunk_size=2**16
+):
+    """Return the candidate parent orientations of child orientations.
+
+    Both phases are treated as cubic, as in
+    :func:`~reconstruction.modules.yardley_variants`.
+
+    Parameters
+    ----------
+    q_child : numpy.ndarray
+        Child quaternions of shape (n, 4).
+    orientation_relationship : str or array_like, optional
+        Either "KS" (default) or "NW", or the three ksi values in
+        degrees, passed on to
+        :func:`~reconstruction.variants.get_variants`.
+    out : numpy.ndarray, optional
+        Float32 buffer of shape (n, n_variants, 4) to write the
+        candidates to. If None (default), a new buffer is allocated.
+    chunk_size : int, optional
+        Number of child orientations to handle at a time. Default is
+        2**16.
+
+    Returns
+    -------
+    candidates : numpy.ndarray
+        Candidate parent quaternions with a non-negative scalar part, of
+        shape (n, n_variants, 4). This is `out` if given.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from reconstruction.likelihood import parent_candidates
+    >>> parent_candidates(np.array([[1.0, 0, 0, 0]])).shape
+    (1, 24, 4)
+    """
+    inverse_variants = _inverse_variants(orientation_relationship)
+    out = _candidate_buffer(q_child.shape[0], inverse_variants.shape[0], out)
+    for start in range(0, q_child.shape[0], chunk_size):
+        stop = min(start + chunk_size, q_child.shape[0])
+        _fill_candidates(q_child[start:stop], inverse_variants, out[start:stop])
+    return out
+
+
+def parent_likelihood(
+    q_child,
+    odf,
+    orientation_relationship="KS",
+    k=1,
+    out=None,
+    chunk_size=2**16,
+):
+    """Return the `k` most likely candidate parent orientations of every
+    child orientation under a parent ODF.
+
+    Parameters
+    ----------
+    q_child : numpy.ndarray
+        Child quaternions of shape (n, 4).
+    odf : callable
+        Parent ODF lookup, returning the density of float32 quaternions
+        of shape (m, 4) as an array of shape (m,). It must be invariant
+        under the cubic parent symmetry, since candidates are only
+        unique modulo it.
+    orientation_relationship : str or array_like, optional
+        Either "KS" (default) or "NW", or the three ksi values in
+        degrees, passed on to
+        :func:`~reconstruction.variants.get_variants`.
+    k : int, optional
+        Number of candidates to return per child orientation, at most
+        the number of variants. Default is 1.
+    out : numpy.ndarray, optional
+        Float32 buffer of shape (n, n_variants, 4) to write all
+        candidates to, see :func:`parent_candidates`. If None (default),
+        a new buffer is allocated.
+    chunk_size : int, optional
+        Number of child orientations to handle at a time. Default is
+        2**16.
+
+    Returns
+    -------
+    candidates : numpy.ndarray
+        The `k` most likely candidate parent quaternions of each child
+        orientation, in decreasing order of likelihood, of shape
+        (n, k, 4).
+    likelihood : numpy.ndarray
+        ODF density of these candidates, of shape (n, k).
+    index : numpy.ndarray
+        Index of these candidates in the second axis of `out`, of shape
+        (n, k).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from reconstruction.likelihood import parent_likelihood
+    >>> odf = lambda q: np.abs(q[:, 0])
+    >>> candidates, likelihood, index = parent_likelihood(
+    ...     np.array([[1.0, 0, 0, 0]]), odf, k=2
+    ... )
+    >>> candidates.shape, likelihood.shape
+    ((1, 2, 4), (1, 2))
+    """
+    inverse_variants = _inverse_variants(orientation_relationship)
+    n, n_candidates = q_child.shape[0], inverse_variants.shape[0]
+    if not 1 <= k <= n_candidates:
+        raise ValueError(f"`k` must be in the range [1, {n_candidates}], not {k}.")
+    out = _candidate_buffer(n, n_candidates, out)
+
+    index = np.zeros((n, k), dtype=np.int64)
+    likelihood = np.zeros((n, k), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk = out[start:stop]
+        _fill_candidates(q_child[start:stop], inverse_variants, chunk)
+        density = np.asarray(odf(chunk.reshape(-1, 4)), dtype=np.float32)
+        density = density.reshape(stop - start, n_candidates)
+
+        # Top k unsorted, then sorted in decreasing order
+        if k < n_candidates:
+            top = np.argpartition(-density, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n_candidates), density.shape)
+        top_density = np.take_along_axis(density, top, axis=1)
+        order = np.argsort(-top_density, axis=1, kind="stable")
+        index[start:stop] = np.take_along_axis(top, order, axis=1)
+        likelihood[start:stop] = np.take_along_axis(top_density, order, axis=1)
+
+    candidates = np.take_along_axis(out, index[..., np.newaxis], axis=1)
+    return candidates, likelihood, index
+
+
+def _inverse_variants(orientation_relationship):
+    """Rotations :math:`T^{-1} s_c` to the candidate parents."""
+    inverse_variants, _ = inverse_variant_table(
+        _or_rotation(orientation_relationship), O.data, O.data
+    )
+    return inverse_variants
+
+
+def _candidate_buffer(n, n_candidates, out):
+    """Check or allocate the float32 buffer of candidates."""
+    shape = (n, n_candidates, 4)
+    if out is None:
+        return np.empty(shape, dtype=np.float32)
+    if out.shape != shape or out.dtype != np.float32:
+        raise ValueError(
+            f"`out` must be a float32 array of shape {shape}, not a {out.dtype} "
+            f"array of shape {out.shape}."
+        )
+    return out
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _fill_candidates(q_child, inverse_variants, out):
+    """Write the products :math:`u_k g_c` of every child orientation
+    and inverse variant to `out`, with a non-negative scalar part.
+    """
+    for i in range(q_child.shape[0]):
+        a2, b2, c2, d2 = q_child[i]
+        for k in range(inverse_variants.shape[0]):
+            a1, b1, c1, d1 = inverse_variants[k]
+            a = a1 * a2 - b1 * b2 - c1 * c2 - d1 * d2
+            b = a1 * b2 + b1 * a2 + c1 * d2 - d1 * c2
+            c = a1 * c2 - b1 * d2 + c1 * a2 + d1 * b2
+            d = a1 * d2 + b1 * c2 - c1 * b2 + d1 * a2
+            if a < 0:
+                a, b, c, d = -a, -b, -c, -d
+            out[i, k, 0] = a
+            out[i, k, 1] = b
+            out[i, k, 2] = c
+            out[i, k, 3] = d
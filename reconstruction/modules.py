@@ -191,6 +191,26 @@ def yardley_variants(ksi_values):
     else:
         ksi = ksi_values
 
+    vv = _variant_matrices(ksi)
+
+    # Reshape the matrix to allow for redundancy reduction
+    vv = vv.reshape(24, 9)
+
+    # Reduce redundancies, if they exist (as they do, for example, in NW)
+    vv, ia, ic = uniquerows(sigdec(vv, 7))
+
+    # Reshape the matrix back into a set of 3x3's
+    num = int(vv.size / vv[0].size)
+    vv = vv.reshape(num, 3, 3)
+
+    return vv
+
+
+def _variant_matrices(ksi):
+    """All 24 variant matrices of Kurdjumov-Sachs angles in degrees,
+    without rounding or removal of redundant variants, so that they vary
+    smoothly with the angles.
+    """
     # Convert KSI_values specification into radians
     ksi = [ksi[i] * np.pi / 180 for i in range(3)]
 
@@ -204,9 +224,10 @@ def yardley_variants(ksi_values):
     mosth = 1.0 - costh
     sinth = np.sqrt(1.0 - costh ** 2.0)
 
-    r1 = np.sqrt((mb[0, 0] - costh) / mosth)
-    r2 = np.sqrt((mb[0, 4] - costh) / mosth)
-    r3 = np.sqrt((mb[0, 8] - costh) / mosth)
+    # Clip round-off below zero, e.g. for ksi values close to NW
+    r1 = np.sqrt(max((mb[0, 0] - costh) / mosth, 0.0))
+    r2 = np.sqrt(max((mb[0, 4] - costh) / mosth, 0.0))
+    r3 = np.sqrt(max((mb[0, 8] - costh) / mosth, 0.0))
     del costh
 
     r1r2 = r1 * r2 * mosth
@@ -271,14 +292,4 @@ def yardley_variants(ksi_values):
 
         j = j + 1
 
-    # Reshape the matrix to allow for redundancy reduction
-    vv = vv.reshape(24, 9)
-
-    # Reduce redundancies, if they exist (as they do, for example, in NW)
-    vv, ia, ic = uniquerows(sigdec(vv, 7))
-
-    # Reshape the matrix back into a set of 3x3's
-    num = int(vv.size / vv[0].size)
-    vv = vv.reshape(num, 3, 3)
-
     return vv
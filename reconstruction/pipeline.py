@@ -0,0 +1,452 @@
+"""Reconstruction pipeline with checkpoints of its stage outputs, so that
+long jobs can be resumed after they are interrupted.
+
+The stages are
+
+* "orientation_relationship": ksi values of the orientation
+  relationship (OR), refined with
+  :func:`~reconstruction.refinement.refine_orientation_relationship`
+* "graph": the pixel neighbour graph,
+  :meth:`~orix.crystal_map.CrystalMap.neighbor_graph`
+* "candidates": parent grains and their orientations from the child
+  grain graph, as in :func:`~reconstruction.engine.reconstruct`
+* "cut": parent grain of every pixel by
+  :func:`~reconstruction.graph_cut.alpha_expansion` of the misfits to
+  the candidate parent orientations, with Potts smoothing. The
+  candidates of a pixel are the parent grains of its own and the
+  neighbouring child grains, so that the cut scales with the number of
+  pixels and not with the number of parent grains.
+
+Each stage output is written to an HDF5 file with the datasets and
+groups of orix' HDF5 file format, see
+:mod:`~orix.io.plugins.orix_hdf5`, as soon as the stage is finished.
+Stages already in the file are read instead of computed.
+"""
+
+import zlib
+
+from h5py import File
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from orix import __version__
+from orix.crystal_map import Phase
+from orix.io.plugins._h5ebsd import hdf5group2dict
+from orix.io.plugins.orix_hdf5 import dict2hdf5group
+from reconstruction._util import dot_to_angle, qu_conjugate
+from reconstruction.engine import (
+    _child_grains,
+    _get_child_phase_id,
+    _grain_boundaries,
+    _parent_crystal_map,
+    _reconstruct_points,
+)
+from reconstruction.graph_cut import alpha_expansion
+from reconstruction.labelling import _closest_variant
+from reconstruction.refinement import refine_orientation_relationship
+from reconstruction.variants import get_variants
+
+_STAGES = ("orientation_relationship", "graph", "candidates", "cut")
+
+
+class Checkpoint:
+    """Stage outputs of a reconstruction in an HDF5 file.
+
+    Every stage is written to a hidden group first and then moved to
+    its name, so that a stage interrupted while writing is not taken as
+    finished.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the HDF5 file. It is created if it does not exist.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        with File(filename, mode="a") as f:
+            f.require_group("stages")
+
+    @property
+    def filename(self):
+        """Path to the HDF5 file."""
+        return self._filename
+
+    @property
+    def stages(self):
+        """Names of the finished stages in the file."""
+        with File(self.filename, mode="r") as f:
+            stages = [name for name in f["stages"] if not name.startswith(".")]
+        order = {name: i for i, name in enumerate(_STAGES)}
+        return sorted(stages, key=lambda name: order.get(name, len(order)))
+
+    def __contains__(self, stage):
+        return stage in self.stages
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} '{self.filename}' {self.stages}"
+
+    def check_settings(self, settings):
+        """Write the settings of a reconstruction to a new file, or
+        check that they are the settings the file was written with.
+
+        Parameters
+        ----------
+        settings : dict
+            Names and values of the settings, as strings, numbers or
+            NumPy arrays.
+
+        Raises
+        ------
+        ValueError
+            If the file has other settings.
+        """
+        with File(self.filename, mode="a") as f:
+            if "settings" not in f:
+                header = {"manufacturer": "orix", "version": __version__}
+                dict2hdf5group(dict(header, settings=settings), f["/"])
+                return
+            written = hdf5group2dict(f["settings"])
+        for key, value in settings.items():
+            if key not in written or not np.array_equal(
+                np.ravel(written[key]), np.ravel(value)
+            ):
+                raise ValueError(
+                    f"Checkpoint '{self.filename}' was written with other settings, "
+                    f"'{key}' is {written.get(key)}, not {value}."
+                )
+
+    def save(self, stage, dictionary):
+        """Write the output of a finished stage, replacing any output
+        of the stage in the file.
+
+        Parameters
+        ----------
+        stage : str
+            Stage name.
+        dictionary : dict
+            Dataset names as keys with datasets as values.
+        """
+        hidden = f".{stage}"
+        with File(self.filename, mode="a") as f:
+            stages = f["stages"]
+            for name in [hidden, stage]:
+                if name in stages:
+                    del stages[name]
+            dict2hdf5group(dictionary, stages.create_group(hidden))
+            stages.move(hidden, stage)
+
+    def load(self, stage):
+        """Read the output of a finished stage.
+
+        Parameters
+        ----------
+        stage : str
+            Stage name.
+
+        Returns
+        -------
+        dict
+            Dataset names as keys with datasets as values. Datasets
+            with one value are returned as scalars.
+        """
+        with File(self.filename, mode="r") as f:
+            return hdf5group2dict(f["stages"][stage])
+
+
+def reconstruct_pipeline(
+    xmap,
+    filename=None,
+    orientation_relationship="KS",
+    refine=True,
+    child_phase=None,
+    parent_phase=None,
+    grain_threshold=np.deg2rad(3),
+    fit_threshold=np.deg2rad(3),
+    smoothness=np.deg2rad(1),
+    n_labels=8,
+    connectivity=4,
+    chunk_size=2**18,
+    seed=0,
+):
+    """Reconstruct the parent austenite map of a martensite crystal map,
+    checkpointing the output of every stage to an HDF5 file.
+
+    Both phases are treated as cubic, as in
+    :func:`~reconstruction.modules.yardley_variants`.
+
+    Parameters
+    ----------
+    xmap : orix.crystal_map.CrystalMap
+        Map with martensite (child) orientations. Only the first
+        rotation per point is used.
+    filename : str, optional
+        HDF5 file to checkpoint stage outputs to. If it has stages of an
+        interrupted run with the same settings, the reconstruction
+        resumes after the last finished stage. If None (default),
+        nothing is written.
+    orientation_relationship : str or array_like, optional
+        Either "KS" (default) or "NW", or the three ksi values in
+        degrees, used as is or as the initial OR of the refinement.
+    refine : bool, optional
+        Whether to refine the OR to the misorientations between
+        neighbouring child points. Default is True.
+    child_phase : str or int, optional
+        Name or ID of the martensite phase. Must be given if there is
+        more than one indexed phase in the data.
+    parent_phase : orix.crystal_map.Phase, optional
+        Phase of the reconstructed points. If None (default), an
+        austenite phase with space group Fm-3m is used.
+    grain_threshold, fit_threshold : float, optional
+        Thresholds in radians of the candidates stage, see
+        :func:`~reconstruction.engine.reconstruct`. Default is 3
+        degrees.
+    smoothness : float, optional
+        Potts weight in radians of neighbouring pixels in the cut.
+        Default is 1 degree.
+    n_labels : int, optional
+        Highest number of candidate parent grains of a pixel in the
+        cut, the parent grains of its own and the neighbouring child
+        grains with the lowest misfits. Default is 8.
+    connectivity : int, optional
+        Pixel connectivity, 4 (default) or 8.
+    chunk_size : int, optional
+        Number of pixels or boundaries handled at a time in the
+        vectorized computations. Default is 2**18.
+    seed : int, optional
+        Seed of the sampling of misorientations in the OR refinement.
+        Default is 0.
+
+    Returns
+    -------
+    xmap_parent : orix.crystal_map.CrystalMap
+        Map of the same points with the child points set to the parent
+        phase and the orientation of their parent grain from the cut.
+        The properties "parent_id" (-1 for points which are not in the
+        child phase or have no candidate parent grains, which keep their
+        phase and orientation) and "fit" (angle in radians between a pixel's
+        orientation and the closest variant of its parent grain) are
+        added.
+    ksi : numpy.ndarray
+        The ksi values in degrees of the OR used.
+
+    Examples
+    --------
+    >>> from reconstruction import reconstruct_pipeline
+    >>> xmap_parent, ksi = reconstruct_pipeline(
+    ...     xmap, "checkpoint.h5"
+    ... )  # doctest: +SKIP
+
+    After an interruption, the same call resumes from the checkpoint.
+    """
+    child_id = _get_child_phase_id(xmap, child_phase)
+    if parent_phase is None:
+        parent_phase = Phase(name="austenite", space_group=225)
+    rotations = xmap.rotations
+    if xmap.rotations_per_point > 1:
+        rotations = rotations[:, 0]
+    q = rotations.data
+    is_child = xmap.phase_id == child_id
+
+    checkpoint = None
+    if filename is not None:
+        checkpoint = Checkpoint(filename)
+        if isinstance(orientation_relationship, str):
+            initial = orientation_relationship
+        else:
+            initial = np.asarray(orientation_relationship, dtype=float)
+        # The parent candidates depend on the parent symmetry
+        space_group = parent_phase.space_group
+        space_group = -1 if space_group is None else space_group.number
+        checkpoint.check_settings(
+            {
+                "n_points": xmap.size,
+                "crc32": zlib.crc32(np.ascontiguousarray(q).tobytes()),
+                "child_phase": child_id,
+                "parent_point_group": parent_phase.point_group.name,
+                "parent_space_group": space_group,
+                "orientation_relationship": initial,
+                "refine": refine,
+                "grain_threshold": grain_threshold,
+                "fit_threshold": fit_threshold,
+                "smoothness": smoothness,
+                "n_labels": n_labels,
+                "connectivity": connectivity,
+                "seed": seed,
+            }
+        )
+
+    def run(stage, compute):
+        if checkpoint is not None and stage in checkpoint:
+            return checkpoint.load(stage)
+        output = compute()
+        if checkpoint is not None:
+            checkpoint.save(stage, output)
+        return output
+
+    def orientation_relationship_stage():
+        if refine:
+            ksi, _ = refine_orientation_relationship(
+                xmap, orientation_relationship, child_id, seed=seed
+            )
+        else:
+            ksi = np.array(get_variants(orientation_relationship).ksi)
+        return {"ksi": ksi}
+
+    output = run("orientation_relationship", orientation_relationship_stage)
+    ksi = np.ravel(output["ksi"])
+
+    def graph_stage():
+        graph = xmap.neighbor_graph(connectivity, chunk_size)
+        return {
+            "data": graph.data,
+            "indices": graph.indices,
+            "indptr": graph.indptr,
+            "shape": np.array(graph.shape),
+        }
+
+    output = run("graph", graph_stage)
+    graph = csr_matrix(
+        (
+            np.atleast_1d(output["data"]),
+            np.atleast_1d(output["indices"]),
+            np.atleast_1d(output["indptr"]),
+        ),
+        shape=tuple(np.ravel(output["shape"])),
+    )
+
+    def candidates_stage():
+        parent_id, _, parent_q, _ = _reconstruct_points(
+            xmap,
+            ksi,
+            child_id,
+            parent_phase,
+            grain_threshold,
+            fit_threshold,
+            connectivity,
+            chunk_size,
+            graph=graph,
+        )
+        return {
+            "parent_id": parent_id,
+            "parent_q": _parent_grain_orientations(parent_id, parent_q),
+        }
+
+    output = run("candidates", candidates_stage)
+    parent_id = np.atleast_1d(output["parent_id"])
+    parent_q = np.reshape(output["parent_q"], (-1, 4))
+
+    def cut_stage():
+        candidates, misfit = _candidate_misfits(
+            q,
+            parent_q,
+            ksi,
+            is_child,
+            parent_id,
+            graph,
+            grain_threshold,
+            n_labels,
+            chunk_size,
+        )
+        potts = graph.copy()
+        potts.data[:] = smoothness
+        labels, _ = alpha_expansion(potts, misfit, candidates=candidates)
+        is_label = candidates == labels[:, np.newaxis]
+        fit = np.where(labels != -1, np.sum(misfit * is_label, axis=1), np.nan)
+        return {"labels": labels, "fit": fit}
+
+    output = run("cut", cut_stage)
+    labels = np.where(is_child, np.atleast_1d(output["labels"]), -1)
+    fit = np.where(labels != -1, np.atleast_1d(output["fit"]), np.nan)
+    xmap_parent = _parent_crystal_map(
+        xmap,
+        parent_phase,
+        labels,
+        np.where((labels != -1)[:, np.newaxis], parent_q[np.maximum(labels, 0)], q),
+        fit,
+    )
+    return xmap_parent, ksi
+
+
+def _parent_grain_orientations(parent_id, parent_q):
+    """Orientation of each parent grain from the orientations of its
+    points, or the identity if there are none.
+    """
+    is_parent = parent_id != -1
+    if not np.any(is_parent):
+        return np.array([[1.0, 0, 0, 0]])
+    _, first = np.unique(parent_id[is_parent], return_index=True)
+    return parent_q[is_parent][first]
+
+
+def _candidate_misfits(
+    q,
+    parent_q,
+    orientation_relationship,
+    is_child,
+    parent_id,
+    graph,
+    grain_threshold,
+    n_labels,
+    chunk_size,
+):
+    """Candidate parent grains of every point in the cut and the angle
+    in radians between the point and the closest variant of each.
+
+    The candidates of a child point are the parent grains of its own
+    and the neighbouring child grains, of which the `n_labels` with the
+    lowest angles are kept. Memory and time grow with the number of
+    points, not with the number of parent grains.
+
+    Returns
+    -------
+    candidates : numpy.ndarray
+        Parent grain IDs of shape (n, n_labels), padded with -1. Points
+        which are not in the child phase have no candidates.
+    misfit : numpy.ndarray
+        Angles of shape (n, n_labels) as float32, 0 for padding.
+    """
+    inverse_variants = qu_conjugate(
+        get_variants(orientation_relationship).rotations.data
+    )
+    n = is_child.size
+    candidates = np.full((n, n_labels), -1)
+    misfit = np.zeros((n, n_labels), dtype=np.float32)
+
+    # Parent grains of each child grain and its neighbours, sorted by
+    # child grain
+    grain_id, n_grains, boundary = _child_grains(graph, is_child, grain_threshold)
+    grain_pairs, _ = _grain_boundaries(grain_id[boundary], n_grains)
+    grain_parent = np.full(n_grains, -1)
+    grain_parent[grain_id[is_child]] = parent_id[is_child]
+    grains = np.arange(n_grains)
+    grain = np.concatenate((grains, grain_pairs[:, 0], grain_pairs[:, 1]))
+    parent = grain_parent[
+        np.concatenate((grains, grain_pairs[:, 1], grain_pairs[:, 0]))
+    ]
+    n_parents = parent_q.shape[0]
+    key = np.unique(grain[parent != -1] * n_parents + parent[parent != -1])
+    grain, parent = key // n_parents, key % n_parents
+    start = np.searchsorted(grain, np.arange(n_grains + 1))
+
+    # Misfit of every child point to each candidate, in chunks of about
+    # `chunk_size` pairs of points and candidates
+    points = np.nonzero(is_child)[0]
+    count = np.diff(start)[grain_id[points]]
+    end = np.cumsum(count)
+    total = end[-1] if end.size else 0
+    splits = np.searchsorted(end, np.arange(chunk_size, total, chunk_size))
+    for chunk in np.split(np.arange(points.size), splits):
+        point = np.repeat(points[chunk], count[chunk])
+        offset = np.repeat(np.cumsum(count[chunk]) - count[chunk], count[chunk])
+        label = parent[start[grain_id[point]] + np.arange(point.size) - offset]
+        _, dot = _closest_variant(q[point], parent_q[label], inverse_variants)
+        angle = dot_to_angle(dot)
+        # Keep the candidates with the lowest angles
+        order = np.lexsort((angle, point))
+        point, label, angle = point[order], label[order], angle[order]
+        rank = np.arange(point.size) - np.searchsorted(point, point)
+        keep = rank < n_labels
+        candidates[point[keep], rank[keep]] = label[keep]
+        misfit[point[keep], rank[keep]] = angle[keep]
+    return candidates, misfit
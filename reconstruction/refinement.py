@@ -0,0 +1,302 @@
+"""Refinement of the orientation relationship (OR) from misorientations
+between neighbouring child grains of the same parent grain.
+
+Children of the same parent have misorientations
+:math:`s_a T s_p T^{-1} s_b`, with :math:`T` the OR and :math:`s_a`,
+:math:`s_b` and :math:`s_p` child and parent symmetry operations. Every
+measured misorientation is assigned to its closest element of this set,
+and the three Kurdjumov-Sachs angles (ksi values) parametrizing
+:math:`T` are fitted to all assigned misorientations at once by
+nonlinear least squares. Assignment and fit are repeated until the ksi
+values converge.
+
+Both phases are treated as cubic, as in
+:func:`~reconstruction.modules.yardley_variants`.
+"""
+
+import numba as nb
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.sparse import triu
+
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import O
+from reconstruction._util import dot_to_angle, qu_conjugate, qu_multiply, qu_normalize
+from reconstruction.engine import _get_child_phase_id
+from reconstruction.modules import _variant_matrices, namedOR
+
+
+def refine_orientation_relationship(
+    xmap,
+    initial="KS",
+    child_phase=None,
+    parent_id=None,
+    min_angle=np.deg2rad(3),
+    threshold=np.deg2rad(3),
+    max_samples=2**20,
+    max_iter=10,
+    seed=None,
+):
+    """Fit the ksi values of the orientation relationship to the
+    misorientations between neighbouring child points in a crystal map.
+
+    Parameters
+    ----------
+    xmap : orix.crystal_map.CrystalMap
+        Map with child orientations. Only the first rotation per point
+        is used.
+    initial : str or array_like, optional
+        Initial OR, either "KS" (default) or "NW", or the three ksi
+        values in degrees.
+    child_phase : str or int, optional
+        Name or ID of the child phase. Must be given if there is more
+        than one indexed phase in the data.
+    parent_id : numpy.ndarray, optional
+        Parent grain ID of each point in data, with -1 for points not in
+        a parent grain, e.g. the "parent_id" property of the map
+        returned by :func:`~reconstruction.engine.reconstruct`. If
+        given, only neighbours within the same parent grain are
+        sampled. If None (default), misorientations between different
+        parent grains are left out by `threshold` only.
+    min_angle : float, optional
+        Neighbours misoriented by less than this angle in radians are in
+        the same child grain and are not sampled. Default is 3 degrees.
+    threshold : float, optional
+        Highest angle in radians between a misorientation and its
+        closest misorientation from the OR for it to be fitted. Default
+        is 3 degrees.
+    max_samples : int, optional
+        Highest number of misorientations to sample at random. Default
+        is 2**20.
+    max_iter : int, optional
+        Maximum number of assignment and fit rounds. Default is 10.
+    seed : int, optional
+        Seed of the random sampling.
+
+    Returns
+    -------
+    ksi : numpy.ndarray
+        Fitted ksi values in degrees.
+    misfit : numpy.ndarray
+        Angle in radians between every sampled misorientation and its
+        closest misorientation from the fitted OR, or infinity if it is
+        not within `threshold`.
+
+    See Also
+    --------
+    fit_ksi
+    """
+    child_id = _get_child_phase_id(xmap, child_phase)
+    rotations = xmap.rotations
+    if xmap.rotations_per_point > 1:
+        rotations = rotations[:, 0]
+    q = rotations.data
+
+    graph = triu(xmap.neighbor_graph(), format="coo")
+    row, col = graph.row, graph.col
+    keep = (xmap.phase_id[row] == child_id) & (graph.data > min_angle)
+    if parent_id is not None:
+        parent_id = np.asarray(parent_id)
+        keep &= (parent_id[row] == parent_id[col]) & (parent_id[row] != -1)
+    row, col = row[keep], col[keep]
+    if row.size > max_samples:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(row.size, max_samples, replace=False)
+        row, col = row[sample], col[sample]
+
+    misorientations = qu_multiply(q[col], qu_conjugate(q[row]))
+    return fit_ksi(misorientations, initial, threshold, max_iter)
+
+
+def fit_ksi(misorientations, initial="KS", threshold=np.deg2rad(3), max_iter=10):
+    """Fit the ksi values of the orientation relationship to
+    misorientations between children of the same parent.
+
+    Parameters
+    ----------
+    misorientations : numpy.ndarray
+        Child misorientations as quaternions of shape (n, 4).
+    initial : str or array_like, optional
+        Initial OR, either "KS" (default) or "NW", or the three ksi
+        values in degrees.
+    threshold : float, optional
+        Highest angle in radians between a misorientation and its
+        closest misorientation from the OR for it to be fitted. Default
+        is 3 degrees.
+    max_iter : int, optional
+        Maximum number of assignment and fit rounds. Default is 10.
+
+    Returns
+    -------
+    ksi : numpy.ndarray
+        Fitted ksi values in degrees.
+    misfit : numpy.ndarray
+        Angle in radians between every misorientation and its closest
+        misorientation from the fitted OR, or infinity if it is not
+        within `threshold`.
+    """
+    if isinstance(initial, str):
+        ksi = namedOR(initial)
+    else:
+        ksi = np.array(initial, dtype=np.float64)
+    t = _or_quaternion(ksi)
+    symmetry = O.data
+
+    # Reduce by the child symmetry on the left to the smallest angle, so
+    # that only the OR elements with similar angles have to be compared
+    m = misorientations
+    best = np.abs(m @ qu_conjugate(symmetry).T).argmax(axis=1)
+    m = qu_multiply(symmetry[best], m)
+
+    for _ in range(max_iter):
+        index, misfit = _assign(m, t, threshold)
+        use = misfit < threshold
+        if np.count_nonzero(use) < 3:
+            raise ValueError(
+                "Too few misorientations are within `threshold` of the orientation "
+                "relationship to fit the ksi values."
+            )
+        i_a, i_p, i_b = (i[use] for i in index)
+        factors = _misfit_factors(m[use], i_a, i_p, i_b)
+
+        # The OR is fitted as a small rotation of the current one, since
+        # ksi values are singular at e.g. NW, where the first is zero
+        def rotated(x):
+            dt = qu_normalize(np.append(1, 0.5 * x))
+            return qu_multiply(dt, t)
+
+        def residuals(x):
+            t_x = rotated(x)
+            x_p = qu_multiply(qu_multiply(t_x, symmetry), qu_conjugate(t_x))
+            return 2 * np.einsum("pij,pi->pj", factors, x_p).ravel()
+
+        x = least_squares(residuals, np.zeros(3), method="lm").x
+        t = rotated(x)
+        if np.linalg.norm(x) < 1e-8:
+            break
+
+    ksi = _ksi_from_quaternion(t, ksi)
+    _, misfit = _assign(m, _or_quaternion(ksi), threshold)
+    return ksi, misfit
+
+
+def _or_quaternion(ksi):
+    """OR quaternion :math:`T` from ksi values in degrees, without
+    rounding so that it varies smoothly with the ksi values.
+    """
+    return Rotation.from_matrix(_variant_matrices(ksi)[0]).data[0]
+
+
+def _ksi_from_quaternion(t, reference):
+    """Ksi values in degrees of an OR quaternion :math:`T`.
+
+    The ksi values are the angles between the axes of the child and the
+    first Bain correspondence, taken for the symmetrically equivalent
+    :math:`s_a T s_b` closest to the Bain correspondence. Of equally
+    close ones, the ksi values closest to `reference` are returned.
+    """
+    symmetry = O.data
+    t = qu_multiply(qu_multiply(symmetry[:, None], t), symmetry[None]).reshape(-1, 4)
+    matrix = Rotation(t).to_matrix() @ _BAIN.T
+    cos_ksi = np.diagonal(matrix, axis1=1, axis2=2)
+    trace = cos_ksi.sum(axis=1)
+    ksi = np.rad2deg(np.arccos(np.clip(cos_ksi[trace > trace.max() - 1e-9], -1, 1)))
+    return ksi[np.abs(ksi - reference).sum(axis=1).argmin()]
+
+
+def _misfit_factors(m, i_a, i_p, i_b):
+    r"""Factors :math:`L_p` with :math:`\sum_n \sin^2(\omega_n / 2) =
+    \sum_p |L_p^T X_p|^2`, for misorientations :math:`m_n` assigned to
+    :math:`s_a X_p s_b` with :math:`X_p = T s_p T^{-1}`.
+
+    With :math:`w_n = s_a^{-1} m_n s_b^{-1}`, the cosine of half the
+    misfit angle is :math:`X_p \cdot w_n`, so the sum of squared misfits
+    is quadratic in :math:`X_p` and all samples assigned to the same
+    :math:`s_p` reduce to one 4 x 4 matrix. Each least squares step is
+    then independent of the number of samples.
+    """
+    symmetry = O.data
+    w = qu_multiply(
+        qu_multiply(qu_conjugate(symmetry[i_a]), m), qu_conjugate(symmetry[i_b])
+    )
+    n = symmetry.shape[0]
+    counts = np.bincount(i_p, minlength=n)
+    q = np.zeros((n, 4, 4))
+    for i in range(4):
+        for j in range(i, 4):
+            q[:, i, j] = q[:, j, i] = -np.bincount(i_p, w[:, i] * w[:, j], minlength=n)
+    q += counts[:, None, None] * np.eye(4)
+    # Factorize the positive semi-definite matrices
+    eigval, eigvec = np.linalg.eigh(q)
+    return eigvec * np.sqrt(np.clip(eigval, 0, None))[:, None]
+
+
+def _assign(m, t, threshold):
+    """Closest element :math:`s_a T s_p T^{-1} s_b` to each
+    misorientation reduced by the child symmetry on the left.
+
+    An element can only be within `threshold` of a misorientation if
+    their rotation angles differ by less than `threshold`, so each
+    misorientation is only compared to the elements in this window of
+    angles. Since the misorientations have the smallest angle of their
+    left cosets, elements with an angle more than twice `threshold`
+    above the smallest of their own left coset cannot match either.
+
+    Returns
+    -------
+    index : tuple of numpy.ndarray
+        Index of :math:`s_a`, :math:`s_p` and :math:`s_b` into the
+        symmetry operations for each misorientation.
+    misfit : numpy.ndarray
+        Angle in radians to the closest element, or infinity if there
+        is none within `threshold`.
+    """
+    symmetry = O.data
+    n = symmetry.shape[0]
+    x = qu_multiply(qu_multiply(t, symmetry), qu_conjugate(t))
+    table = qu_multiply(
+        qu_multiply(symmetry[:, None, None], x[None, :, None]), symmetry[None, None]
+    ).reshape(-1, 4)
+    table_angle = dot_to_angle(table[:, 0])
+    smallest = dot_to_angle(np.abs(table @ qu_conjugate(symmetry).T).max(axis=1))
+    candidates = np.flatnonzero(table_angle <= smallest + 2 * threshold)
+    order = candidates[np.argsort(table_angle[candidates])]
+    table_angle = table_angle[order]
+
+    angle = dot_to_angle(m[:, 0])
+    start = np.searchsorted(table_angle, angle - threshold)
+    stop = np.searchsorted(table_angle, angle + threshold, side="right")
+    best, dot = _closest(m, table[order], start, stop)
+
+    misfit = dot_to_angle(dot)
+    misfit[misfit >= threshold] = np.inf
+    index = np.unravel_index(order[best], (n, n, n))
+    return index, misfit
+
+
+@nb.jit(cache=True, nogil=True, nopython=True)
+def _closest(m, table, start, stop):
+    """Index into `table` of the quaternion closest to each quaternion
+    in `m`, searching rows `start` up to `stop`, and the absolute dot
+    product between them.
+    """
+    n = m.shape[0]
+    best = np.zeros(n, dtype=np.int64)
+    dot = np.zeros(n)
+    for i in range(n):
+        for j in range(start[i], stop[i]):
+            d = abs(
+                m[i, 0] * table[j, 0]
+                + m[i, 1] * table[j, 1]
+                + m[i, 2] * table[j, 2]
+                + m[i, 3] * table[j, 3]
+            )
+            if d > dot[i]:
+                best[i] = j
+                dot[i] = d
+    return best, dot
+
+
+# First Bain correspondence of the variants in yardley_variants(), with
+# normalized columns
+_BAIN = np.array([[1, -1, 0], [1, 1, 0], [0, 0, np.sqrt(2)]]) / np.sqrt(2)
@@ -0,0 +1,134 @@
+"""Synthetic martensite crystal maps with known prior austenite grains,
+for testing and benchmarking reconstruction.
+
+Parent grains are the Voronoi cells of random seed points, each with a
+random orientation. Every parent grain is cut into parallel laths of a
+random direction, and every lath gets a random variant of the
+orientation relationship, so that all child orientations, and their
+parent grains and variants, are known.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from orix.crystal_map import CrystalMap, Phase, PhaseList, create_coordinate_arrays
+from orix.quaternion import Rotation
+from orix.quaternion.symmetry import O
+from reconstruction._util import qu_multiply
+from reconstruction.variants import get_variants
+
+
+def synthetic_martensite_map(
+    shape=(256, 256),
+    n_parents=16,
+    orientation_relationship="KS",
+    lath_width=4,
+    alpha=None,
+    not_indexed=0.0,
+    step_sizes=None,
+    seed=None,
+):
+    """Return a martensite crystal map of Voronoi parent grains filled
+    with laths of random variants.
+
+    Parameters
+    ----------
+    shape : tuple of int, optional
+        Map shape, up to 3D. Default is (256, 256).
+    n_parents : int, optional
+        Number of parent grains. Default is 16.
+    orientation_relationship : str or array_like, optional
+        Either "KS" (default) or "NW", or the three ksi values in
+        degrees, passed on to
+        :func:`~reconstruction.variants.get_variants`.
+    lath_width : float, optional
+        Width of the laths in pixels. Default is 4.
+    alpha : float, optional
+        Concentration of the orientation noise of every point, drawn
+        with :meth:`~orix.quaternion.Rotation.random_vonmises`. For
+        large values, the mean noise angle is about
+        :math:`2 / \\sqrt{\\pi \\alpha}` radians. If None (default), no
+        noise is added.
+    not_indexed : float, optional
+        Fraction of points which are randomly set as not indexed.
+        Default is 0.
+    step_sizes : tuple of float, optional
+        Map step sizes. If None (default), it is 1 in each direction.
+    seed : int, optional
+        Seed of the random number generator of the microstructure. The
+        noise is drawn from NumPy's global random state.
+
+    Returns
+    -------
+    xmap : orix.crystal_map.CrystalMap
+        Map with the phase "martensite" and the ground truth properties
+        "parent_id", "variant_id", "bain_id", "packet_id" and
+        "block_id", see :func:`~reconstruction.labelling.label_variants`.
+    parents : orix.quaternion.Rotation
+        Orientation of each parent grain.
+
+    Examples
+    --------
+    >>> from reconstruction import synthetic_martensite_map
+    >>> xmap, parents = synthetic_martensite_map((100, 200), 4, seed=42)
+    >>> xmap.shape
+    (100, 200)
+    >>> parents.size
+    4
+    """
+    rng = np.random.default_rng(seed)
+    table = get_variants(orientation_relationship)
+    variants = table.rotations.data
+    n_variants = variants.shape[0]
+    shape = tuple(shape)
+    ndim = len(shape)
+
+    # Parent grain of every point as the Voronoi cell it is in
+    points = np.indices(shape).reshape(ndim, -1).T
+    seeds = rng.uniform(0, shape, (n_parents, ndim))
+    _, parent_id = cKDTree(seeds).query(points, workers=-1)
+
+    # Laths of each grain as slabs normal to a random direction
+    normals = rng.normal(size=(n_parents, ndim))
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+    reach = float(np.sum(shape))
+    n_laths = int(np.ceil(2 * reach / lath_width)) + 1
+    distance = np.einsum("ij,ij->i", points, normals[parent_id])
+    offset = rng.uniform(0, lath_width, n_parents)
+    lath = ((distance + reach + offset[parent_id]) // lath_width).astype(int)
+    domain = parent_id * n_laths + lath
+
+    # Random orientations, uniform on the unit quaternion sphere
+    parents = rng.normal(size=(n_parents, 4))
+    parents /= np.linalg.norm(parents, axis=1)[:, np.newaxis]
+
+    # Variant and symmetrically equivalent orientation of every lath
+    domain_variant = rng.integers(0, n_variants, n_parents * n_laths)
+    s = O.data[rng.integers(0, O.size, n_parents * n_laths)]
+    domain_parent = np.repeat(np.arange(n_parents), n_laths)
+    domain_q = qu_multiply(
+        s, qu_multiply(variants[domain_variant], parents[domain_parent])
+    )
+
+    q = domain_q[domain]
+    if alpha is not None:
+        q = qu_multiply(Rotation.random_vonmises(q.shape[0], alpha).data, q)
+    phase_id = np.zeros(q.shape[0], dtype=int)
+    phase_id[rng.random(q.shape[0]) < not_indexed] = -1
+
+    variant = domain_variant[domain]
+    d, _ = create_coordinate_arrays(shape, step_sizes)
+    xmap = CrystalMap(
+        rotations=Rotation(q),
+        phase_id=phase_id,
+        phase_list=PhaseList(Phase("martensite", point_group="m-3m")),
+        prop={
+            "parent_id": parent_id,
+            "variant_id": variant,
+            "bain_id": table.bain_groups[variant],
+            "packet_id": table.packets[variant],
+            "block_id": table.blocks[variant],
+        },
+        **d,
+    )
+    return xmap, Rotation(parents)
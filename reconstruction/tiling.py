@@ -0,0 +1,340 @@
+"""Tiled parent austenite reconstruction of crystal maps too large to
+reconstruct at once.
+
+The map is split into rectangular tiles, each extended by a halo of
+points overlapping its neighbours. Every tile is reconstructed on its
+own by a pool of processes, which read the child orientations from, and
+write their results to, arrays in shared memory. Parent grains of
+different tiles are then merged where they share points in the halo and
+their parent orientations agree, so that a parent grain crossing tile
+borders gets one ID.
+
+The memory used per process is bounded by the tile size, while the
+arrays of all points are only held once, in shared memory.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import os
+
+import numpy as np
+
+from orix.crystal_map import CrystalMap, Phase, create_coordinate_arrays
+from orix.quaternion import Rotation
+from reconstruction._util import (
+    dot_to_angle,
+    grouped_mean,
+    symmetry_align,
+    symmetry_reduced_dot,
+)
+from reconstruction.engine import (
+    _connected_labels,
+    _get_child_phase_id,
+    _parent_crystal_map,
+    _reconstruct_points,
+)
+
+
+def reconstruct_tiled(
+    xmap,
+    orientation_relationship="KS",
+    child_phase=None,
+    parent_phase=None,
+    tile_shape=(1024, 1024),
+    halo=32,
+    n_processes=None,
+    grain_threshold=np.deg2rad(3),
+    fit_threshold=np.deg2rad(3),
+    connectivity=4,
+    chunk_size=2**18,
+):
+    """Reconstruct the parent austenite map of a 2D martensite crystal
+    map tile by tile in parallel.
+
+    Parameters
+    ----------
+    xmap : orix.crystal_map.CrystalMap
+        2D map with martensite (child) orientations. Only the first
+        rotation per point is used.
+    orientation_relationship : str or array_like, optional
+        Either "KS" (default) or "NW", or the three ksi values in
+        degrees.
+    child_phase : str or int, optional
+        Name or ID of the martensite phase. Must be given if there is
+        more than one indexed phase in the data.
+    parent_phase : orix.crystal_map.Phase, optional
+        Phase of the reconstructed points. If None (default), an
+        austenite phase with space group Fm-3m is used.
+    tile_shape : tuple of int, optional
+        Number of rows and columns of each tile, not counting the halo.
+        Default is (1024, 1024).
+    halo : int, optional
+        Number of rows and columns each tile is extended by on every
+        side. Should be a few child grains wide, so that parent grains
+        crossing tile borders are recognized in both tiles. Default is
+        32.
+    n_processes : int, optional
+        Number of processes reconstructing tiles. If None (default), the
+        number of CPUs is used. If 1, tiles are reconstructed in this
+        process.
+    grain_threshold, fit_threshold : float, optional
+        Angles in radians, see
+        :func:`~reconstruction.engine.reconstruct`. Default is 3
+        degrees. `fit_threshold` is also the highest angle between the
+        parent orientations of grains from two tiles for them to be
+        merged.
+    connectivity : int, optional
+        Pixel connectivity, 4 (default) or 8.
+    chunk_size : int, optional
+        Number of pixels or boundaries handled at a time within a tile.
+        Default is 2**18.
+
+    Returns
+    -------
+    orix.crystal_map.CrystalMap
+        Map as returned by :func:`~reconstruction.engine.reconstruct`.
+        The "fit" of each point is the angle to the mean orientation of
+        its parent grain over all tiles.
+
+    Notes
+    -----
+    The worker processes are spawned, not forked, so they import the
+    calling script again. Scripts calling this function with more than
+    one process must do so under an ``if __name__ == "__main__":``
+    guard, or every worker runs the script again when it starts.
+
+    Examples
+    --------
+    >>> from reconstruction import reconstruct_tiled
+    >>> if __name__ == "__main__":
+    ...     xmap_parent = reconstruct_tiled(
+    ...         xmap, "KS", tile_shape=(2048, 2048), n_processes=8
+    ...     )  # doctest: +SKIP
+    """
+    grid = xmap._data_grid()
+    if grid.ndim != 2:
+        raise ValueError(f"Only 2D maps can be tiled, not {grid.ndim}D maps.")
+    child_id = _get_child_phase_id(xmap, child_phase)
+    if parent_phase is None:
+        parent_phase = Phase(name="austenite", space_group=225)
+    parent_symmetry = parent_phase.point_group.proper_subgroup.data
+    if n_processes is None:
+        n_processes = os.cpu_count()
+
+    rotations = xmap.rotations
+    if xmap.rotations_per_point > 1:
+        rotations = rotations[:, 0]
+    q = rotations.data
+
+    # Top left corner of each tile's core, without the halo
+    n_rows, n_cols = grid.shape
+    tile_rows, tile_cols = tile_shape
+    corners = [
+        (r, c) for r in range(0, n_rows, tile_rows) for c in range(0, n_cols, tile_cols)
+    ]
+    settings = dict(
+        phases=xmap.phases,
+        child_id=child_id,
+        parent_phase=parent_phase,
+        orientation_relationship=orientation_relationship,
+        grain_threshold=grain_threshold,
+        fit_threshold=fit_threshold,
+        connectivity=connectivity,
+        chunk_size=chunk_size,
+        tile_shape=tile_shape,
+        halo=halo,
+    )
+
+    blocks = []
+    try:
+        arrays = {
+            "q": q,
+            "phase_id": xmap.phase_id,
+            "grid": grid,
+            "candidate": np.zeros((xmap.size, 4)),
+            "label": np.full(xmap.size, -1),
+        }
+        shared = {}
+        for name, array in arrays.items():
+            shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(shm)
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+            view[:] = array
+            shared[name] = (shm.name, array.shape, array.dtype.str)
+        del arrays
+
+        args = [(shared, settings, corner) for corner in corners]
+        if n_processes == 1:
+            results = [_reconstruct_tile(*a) for a in args]
+        else:
+            # Spawned, since forking a process whose Numba kernels have
+            # started a thread pool can deadlock
+            with ProcessPoolExecutor(
+                max_workers=n_processes, mp_context=get_context("spawn")
+            ) as executor:
+                results = list(executor.map(_reconstruct_tile, *zip(*args)))
+
+        candidate = _attach(blocks[3], shared["candidate"]).copy()
+        label = _attach(blocks[4], shared["label"]).copy()
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    # Global node of each parent grain of each tile
+    means, counts, halo_index, halo_label = zip(*results)
+    n_local = np.array([m.shape[0] for m in means])
+    offset = np.concatenate([[0], np.cumsum(n_local)])
+    means = np.concatenate(means)
+    counts = np.concatenate(counts)
+    n_nodes = offset[-1]
+
+    rows, cols = np.nonzero(grid != -1)
+    n_tile_cols = -(-n_cols // tile_cols)
+    owner = np.empty(xmap.size, dtype=int)
+    owner[grid[rows, cols]] = (rows // tile_rows) * n_tile_cols + cols // tile_cols
+    node = np.where(label != -1, offset[owner] + label, -1)
+
+    # Link the grains of two tiles covering the same point with parent
+    # orientations in agreement
+    pairs = [np.zeros((0, 2), dtype=int)]
+    for i in range(len(results)):
+        pair = np.column_stack((offset[i] + halo_label[i], node[halo_index[i]]))
+        pairs.append(pair[(halo_label[i] != -1) & (pair[:, 1] != -1)])
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    dot = symmetry_reduced_dot(means[pairs[:, 0]], means[pairs[:, 1]], parent_symmetry)
+    pairs = pairs[dot > np.cos(fit_threshold / 2)]
+    component, n_components = _connected_labels(n_nodes, pairs)
+
+    # Parent grains are the components with points in some tile core
+    is_parent = np.zeros(n_components, dtype=bool)
+    is_parent[component[counts > 0]] = True
+    new_id = np.cumsum(is_parent) - 1
+    node_parent = np.where(is_parent[component], new_id[component], -1)
+    n_parents = int(is_parent.sum())
+
+    # Mean of the tile means of each parent grain, weighted by the number
+    # of points in the tile cores, aligned to each tile mean
+    is_node = node_parent != -1
+    pid = node_parent[is_node]
+    _, first = np.unique(pid, return_index=True)
+    aligned = symmetry_align(
+        means[is_node], means[is_node][first][pid], parent_symmetry
+    )
+    parent_mean = grouped_mean(aligned, pid, n_parents, weights=counts[is_node])
+    node_mean = np.zeros((n_nodes, 4))
+    node_mean[is_node] = symmetry_align(
+        parent_mean[pid], means[is_node], parent_symmetry
+    )
+
+    is_reconstructed = node != -1
+    parent_id = np.full(xmap.size, -1)
+    parent_id[is_reconstructed] = node_parent[node[is_reconstructed]]
+    parent_q = np.array(q, copy=True)
+    parent_q[is_reconstructed] = parent_mean[parent_id[is_reconstructed]]
+    fit = np.full(xmap.size, np.nan)
+    fit[is_reconstructed] = dot_to_angle(
+        np.sum(candidate[is_reconstructed] * node_mean[node[is_reconstructed]], axis=1)
+    )
+
+    return _parent_crystal_map(xmap, parent_phase, parent_id, parent_q, fit)
+
+
+def _attach(shm, spec):
+    """Array in a shared memory block."""
+    _, shape, dtype = spec
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _reconstruct_tile(shared, settings, corner):
+    """Reconstruct one tile and its halo.
+
+    Results of the points in the tile core are written to the shared
+    "candidate" and "label" arrays: the candidate parent orientation,
+    aligned to the tile's mean parent orientation, and the parent grain
+    ID within the tile.
+
+    Returns
+    -------
+    means : numpy.ndarray
+        Mean orientation of each parent grain in the tile.
+    counts : numpy.ndarray
+        Number of points of each parent grain in the tile core.
+    halo_index : numpy.ndarray
+        Index of the points in the halo.
+    halo_label : numpy.ndarray
+        Parent grain ID within the tile of the points in the halo.
+    """
+    blocks = {name: SharedMemory(name=spec[0]) for name, spec in shared.items()}
+    try:
+        arrays = {name: _attach(blocks[name], spec) for name, spec in shared.items()}
+        return _reconstruct_tile_arrays(settings, corner, **arrays)
+    finally:
+        for shm in blocks.values():
+            shm.close()
+
+
+def _reconstruct_tile_arrays(settings, corner, q, phase_id, grid, candidate, label):
+    """Reconstruct one tile given the shared arrays, see
+    :func:`_reconstruct_tile`.
+    """
+    halo = settings["halo"]
+    r0, c0 = corner
+    r1, c1 = r0 + settings["tile_shape"][0], c0 + settings["tile_shape"][1]
+    hr0, hc0 = max(r0 - halo, 0), max(c0 - halo, 0)
+    hr1, hc1 = min(r1 + halo, grid.shape[0]), min(c1 + halo, grid.shape[1])
+    tile = grid[hr0:hr1, hc0:hc1].ravel()
+    in_core = np.zeros((hr1 - hr0, hc1 - hc0), dtype=bool)
+    in_core[r0 - hr0 : r1 - hr0, c0 - hc0 : c1 - hc0] = True
+    in_core = in_core.ravel()
+
+    empty = np.zeros(0, dtype=int)
+    child_id = settings["child_id"]
+    in_data = tile != -1
+    tile_phase_id = np.full(tile.size, -1)
+    tile_phase_id[in_data] = phase_id[tile[in_data]]
+    if not np.any(tile_phase_id == child_id):
+        return np.zeros((0, 4)), empty, empty, empty
+
+    tile_q = np.zeros((tile.size, 4))
+    tile_q[:, 0] = 1
+    tile_q[in_data] = q[tile[in_data]]
+    coordinates, _ = create_coordinate_arrays((hr1 - hr0, hc1 - hc0))
+    xmap = CrystalMap(
+        rotations=Rotation(tile_q),
+        phase_id=tile_phase_id,
+        phase_list=settings["phases"],
+        **coordinates,
+    )
+    parent_phase = settings["parent_phase"]
+    parent_id, candidate_q, parent_q, _ = _reconstruct_points(
+        xmap,
+        settings["orientation_relationship"],
+        child_id,
+        parent_phase,
+        settings["grain_threshold"],
+        settings["fit_threshold"],
+        settings["connectivity"],
+        settings["chunk_size"],
+    )
+
+    n_parents = parent_id.max() + 1
+    is_parent = parent_id != -1
+    _, first = np.unique(parent_id[is_parent], return_index=True)
+    means = parent_q[is_parent][first]
+    counts = np.bincount(parent_id[in_core & is_parent], minlength=n_parents)
+
+    core = in_core & in_data
+    aligned = candidate_q[core]
+    core_parent = is_parent[core]
+    aligned[core_parent] = symmetry_align(
+        aligned[core_parent],
+        parent_q[core][core_parent],
+        parent_phase.point_group.proper_subgroup.data,
+    )
+    candidate[tile[core]] = aligned
+    label[tile[core]] = parent_id[core]
+
+    in_halo = ~in_core & in_data
+    return means, counts, tile[in_halo], parent_id[in_halo]
@@ -0,0 +1,164 @@
+"""Detection and merging of Σ3 annealing twins in reconstructed parent
+austenite maps.
+
+Neighbouring parent grains are twins if their misorientation is within
+a tolerance of the coincidence site lattice (CSL) Σ3 misorientation, a
+60 degree rotation about <111>. All symmetrically equivalent Σ3
+misorientations are tabulated once, so testing every pair of
+neighbouring grains is a single matrix product. Twins are merged into
+prior austenite grains by connected components of the twin boundaries.
+"""
+
+import numpy as np
+
+from orix.quaternion import Misorientation
+from reconstruction._util import (
+    dot_to_angle,
+    symmetry_reduced_dot,
+    unique_modulo_symmetry,
+)
+from reconstruction.engine import _connected_labels, _grain_boundaries
+
+# Brandon criterion for the highest deviation from Σ3
+_BRANDON_SIGMA3 = np.deg2rad(15) / np.sqrt(3)
+
+
+def twin_boundaries(xmap_parent, threshold=_BRANDON_SIGMA3, connectivity=None):
+    """Find the pairs of neighbouring parent grains related by a Σ3
+    twin misorientation.
+
+    Parameters
+    ----------
+    xmap_parent : orix.crystal_map.CrystalMap
+        Map returned by :func:`~reconstruction.engine.reconstruct`, with
+        parent orientations and the "parent_id" property. All points of
+        a parent grain must have the same orientation, and the parent
+        phase must be cubic.
+    threshold : float, optional
+        Highest angle in radians between the misorientation of two
+        grains and the Σ3 misorientation for them to be twins. Default
+        is the Brandon criterion, 15 / sqrt(3) degrees.
+    connectivity : int, optional
+        Pixel connectivity of the map, see
+        :meth:`~orix.crystal_map.CrystalMap.neighbor_graph`. Default is
+        face neighbours only.
+
+    Returns
+    -------
+    pairs : numpy.ndarray
+        Parent grain IDs of each pair of twins, of shape (m, 2).
+    deviation : numpy.ndarray
+        Angle in radians between the misorientation of each pair and
+        the Σ3 misorientation.
+    length : numpy.ndarray
+        Number of pairs of neighbouring points across the boundary of
+        each pair.
+
+    Examples
+    --------
+    >>> from reconstruction import reconstruct, twin_boundaries
+    >>> xmap_parent = reconstruct(xmap)  # doctest: +SKIP
+    >>> pairs, deviation, length = twin_boundaries(xmap_parent)  # doctest: +SKIP
+    """
+    pairs, deviation, length = _parent_grain_boundaries(xmap_parent, connectivity)
+    is_twin = deviation <= threshold
+    return pairs[is_twin], deviation[is_twin], length[is_twin]
+
+
+def merge_twins(
+    xmap_parent, threshold=_BRANDON_SIGMA3, min_length=1, connectivity=None
+):
+    """Merge parent grains connected by Σ3 twin boundaries into prior
+    austenite grains.
+
+    Twins of twins are merged as well, so that every prior austenite
+    grain is a connected component of the twin boundaries.
+
+    Parameters
+    ----------
+    xmap_parent : orix.crystal_map.CrystalMap
+        Map returned by :func:`~reconstruction.engine.reconstruct`, see
+        :func:`twin_boundaries`.
+    threshold : float, optional
+        Highest deviation in radians from the Σ3 misorientation. Default
+        is the Brandon criterion, 15 / sqrt(3) degrees.
+    min_length : int, optional
+        Least number of pairs of neighbouring points across a twin
+        boundary for its grains to be merged. Default is 1.
+    connectivity : int, optional
+        Pixel connectivity of the map. Default is face neighbours only.
+
+    Notes
+    -----
+    The property "merged_id" is added to `xmap_parent`, the ID of the
+    prior austenite grain of every point, or -1 for points which are
+    not reconstructed. The property "twin_count" is the number of twin
+    boundaries of the parent grain of every point, 0 for points which
+    are not reconstructed.
+
+    Examples
+    --------
+    >>> from reconstruction import merge_twins, reconstruct
+    >>> xmap_parent = reconstruct(xmap)  # doctest: +SKIP
+    >>> merge_twins(xmap_parent)  # doctest: +SKIP
+    >>> xmap_parent.plot(xmap_parent.merged_id)  # doctest: +SKIP
+    """
+    pairs, _, length = twin_boundaries(xmap_parent, threshold, connectivity)
+    pairs = pairs[length >= min_length]
+
+    parent_id = xmap_parent.parent_id
+    n_parents = parent_id.max() + 1 if parent_id.size else 0
+    merged, _ = _connected_labels(n_parents, pairs)
+    twin_count = np.bincount(pairs.ravel(), minlength=n_parents)
+
+    is_parent = parent_id != -1
+    xmap_parent.prop["merged_id"] = np.where(is_parent, merged[parent_id], -1)
+    xmap_parent.prop["twin_count"] = np.where(is_parent, twin_count[parent_id], 0)
+
+
+def _parent_grain_boundaries(xmap_parent, connectivity):
+    """Pairs of neighbouring parent grains, the angle between their
+    misorientation and the Σ3 misorientation, and their boundary
+    length.
+    """
+    if "parent_id" not in xmap_parent.prop:
+        raise ValueError(
+            "`xmap_parent` must have the 'parent_id' property, as returned by "
+            "reconstruct()."
+        )
+    parent_id = xmap_parent.parent_id
+    is_parent = parent_id != -1
+    phase_ids = np.unique(xmap_parent.phase_id[is_parent])
+    if phase_ids.size > 1:
+        raise ValueError("All reconstructed points must have the same phase.")
+    n_parents = parent_id.max() + 1 if parent_id.size else 0
+    if n_parents == 0:
+        return np.zeros((0, 2), dtype=int), np.zeros(0), np.zeros(0, dtype=int)
+    point_group = xmap_parent.phases[phase_ids[0]].point_group
+    if point_group is None or point_group.proper_subgroup.name != "432":
+        raise ValueError("Σ3 twins are only defined for a cubic parent phase.")
+
+    point_pairs = parent_id[xmap_parent._neighbor_pairs(connectivity)]
+    point_pairs = point_pairs[np.all(point_pairs != -1, axis=1)]
+    pairs, length = _grain_boundaries(point_pairs, n_parents)
+
+    rotations = xmap_parent.rotations
+    if xmap_parent.rotations_per_point > 1:
+        rotations = rotations[:, 0]
+    q = np.zeros((n_parents, 4))
+    q[parent_id[is_parent]] = rotations.data[is_parent]
+
+    table = _sigma3_table(point_group.proper_subgroup)
+    dot = symmetry_reduced_dot(q[pairs[:, 0]], q[pairs[:, 1]], table)
+    return pairs, dot_to_angle(dot), length
+
+
+def _sigma3_table(symmetry):
+    """All Σ3 misorientations equivalent under the symmetry of both
+    grains and grain exchange, unique up to sign, of shape (96, 4).
+    """
+    sigma3 = Misorientation.from_axes_angles([1, 1, 1], np.pi / 3)
+    sigma3.symmetry = (symmetry, symmetry)
+    equivalent = sigma3.equivalent(grain_exchange=True).data
+    unique, _ = unique_modulo_symmetry(equivalent, np.array([[1.0, 0, 0, 0]]))
+    return equivalent[unique]
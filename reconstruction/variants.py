@@ -0,0 +1,432 @@
+"""Cached variants of orientation relationships between parent and
+child phases.
+
+Orientation relationships (ORs) between cubic phases are given by the
+Kurdjumov-Sachs angles (ksi values), and ORs between any phases by a
+pair of parallel planes and a pair of parallel directions. Building the
+variants with :func:`~reconstruction.modules.yardley_variants` is too
+slow to repeat inside OR refinement loops, so tables are cached with
+least recently used eviction, keyed on the ksi values or the OR
+rotation rounded to a fixed number of decimals.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from orix.quaternion import Misorientation, Orientation, Rotation
+from orix.quaternion.symmetry import O, D6
+from orix.vector import Miller, Vector3d
+from reconstruction._util import qu_multiply, unique_modulo_symmetry
+from reconstruction.modules import namedOR, yardley_variants
+
+
+class _Variants:
+    """Variants of an OR and the misorientations between them, with the
+    proper symmetries of the parent and child phases in
+    `_parent_symmetry` and `_child_symmetry`, and the variant rotations
+    in `_rotations`.
+    """
+
+    @property
+    def parent_symmetry(self):
+        """Proper point group of the parent phase."""
+        return self._parent_symmetry
+
+    @property
+    def child_symmetry(self):
+        """Proper point group of the child phase."""
+        return self._child_symmetry
+
+    @property
+    def size(self):
+        """Number of unique variants."""
+        return self._rotations.size
+
+    @property
+    def rotations(self):
+        """Rotations from parent to child crystal coordinates of all
+        variants, as :class:`~orix.quaternion.Rotation` of shape (n,).
+        """
+        return self._rotations
+
+    @property
+    def misorientations(self):
+        """Variants as :class:`~orix.quaternion.Misorientation` of shape
+        (n,) with the symmetries of both phases.
+        """
+        if self._misorientations is None:
+            m = Misorientation(
+                self.rotations.data,
+                symmetry=(self.parent_symmetry, self.child_symmetry),
+            )
+            m._data.flags.writeable = False
+            self._misorientations = m
+        return self._misorientations
+
+    @property
+    def variant_misorientations(self):
+        """Misorientations between all pairs of variants from the same
+        parent, as :class:`~orix.quaternion.Misorientation` of shape
+        (n, n) mapped into the symmetry reduced zone.
+
+        Computed on first access.
+        """
+        if self._variant_misorientations is None:
+            m = self.rotations.outer(~self.rotations)
+            m = Misorientation(m.data, symmetry=(self.child_symmetry,) * 2)
+            m = m.map_into_symmetry_reduced_zone()
+            m._data.flags.writeable = False
+            self._variant_misorientations = m
+        return self._variant_misorientations
+
+    @property
+    def variant_angles(self):
+        """Misorientation angles in radians between all pairs of
+        variants from the same parent, of shape (n, n).
+
+        Computed on first access.
+        """
+        if self._variant_angles is None:
+            child = Orientation(self.rotations.data, symmetry=self.child_symmetry)
+            angles = child.angle_with_outer(child)
+            angles.flags.writeable = False
+            self._variant_angles = angles
+        return self._variant_angles
+
+
+class VariantTable(_Variants):
+    """Variants of an orientation relationship between a cubic parent
+    and a cubic child phase, and the misorientations between them.
+
+    Instances are shared between callers by :func:`get_variants`, and
+    must not be modified. Tables of misorientations between variants
+    are only computed when first accessed.
+
+    Variants are grouped into Bain groups, by the parent <100> axis
+    closest to a child <100> axis, and into packets, by the parent
+    {111} plane closest to parallel to a child {110} plane. Variants in
+    the same packet and Bain group form a block.
+
+    Parameters
+    ----------
+    ksi : tuple of float
+        The three Kurdjumov-Sachs angles in degrees.
+    """
+
+    def __init__(self, ksi):
+        self._ksi = tuple(float(k) for k in ksi)
+        rotations = Rotation.from_matrix(yardley_variants(self._ksi))
+        rotations._data.flags.writeable = False
+        self._rotations = rotations
+        self._parent_symmetry = O
+        self._child_symmetry = O
+        self._misorientations = None
+        self._variant_misorientations = None
+        self._variant_angles = None
+
+        # Bain axis as the column of the largest element of each matrix
+        matrices = rotations.to_matrix()
+        bain = np.abs(matrices).max(axis=1).argmax(axis=1)
+        normals = rotations.outer(Vector3d(_PARENT_PLANES)).unit.data
+        packet = np.abs(normals @ _CHILD_PLANES.T).max(axis=-1).argmax(axis=-1)
+        _, block = np.unique(packet * 3 + bain, return_inverse=True)
+        for labels in [bain, packet, block]:
+            labels.flags.writeable = False
+        self._bain_groups = bain
+        self._packets = packet
+        self._blocks = block
+
+    @property
+    def ksi(self):
+        """The three Kurdjumov-Sachs angles in degrees."""
+        return self._ksi
+
+    @property
+    def bain_groups(self):
+        """Bain group of each variant, the index 0, 1 or 2 of the parent
+        <100> axis closest to a child <100> axis.
+        """
+        return self._bain_groups
+
+    @property
+    def packets(self):
+        """Packet of each variant, the index of the parent {111} plane
+        (111), (-111), (1-11) or (11-1) closest to parallel to a child
+        {110} plane.
+        """
+        return self._packets
+
+    @property
+    def blocks(self):
+        """Block of each variant, numbering the combinations of packet
+        and Bain group.
+        """
+        return self._blocks
+
+    def __repr__(self):
+        ksi = ", ".join(f"{k:.4f}" for k in self.ksi)
+        return f"{self.__class__.__name__} ({self.size},) ksi: ({ksi})"
+
+
+class OrientationRelationship(_Variants):
+    """Orientation relationship between a parent and a child phase of
+    any symmetry, and its variants.
+
+    The variants are the rotations :math:`T s_p` for all parent
+    symmetry operations :math:`s_p`, unique modulo the child symmetry,
+    with :math:`T` the rotation from parent to child crystal
+    coordinates. Tables of misorientations between variants are only
+    computed when first accessed.
+
+    Parameters
+    ----------
+    rotation : orix.quaternion.Rotation or numpy.ndarray
+        Rotation :math:`T` from parent to child crystal coordinates.
+    parent_symmetry, child_symmetry : orix.quaternion.Symmetry
+        Point groups of the parent and child phases. Only their proper
+        subgroups are used.
+
+    See Also
+    --------
+    from_parallel, get_variants
+    """
+
+    def __init__(self, rotation, parent_symmetry, child_symmetry):
+        t = np.asarray(getattr(rotation, "data", rotation), dtype=np.float64)
+        t = t.reshape(4) / np.linalg.norm(t)
+        self._parent_symmetry = parent_symmetry.proper_subgroup
+        self._child_symmetry = child_symmetry.proper_subgroup
+        variants = qu_multiply(t, self._parent_symmetry.data)
+        unique, _ = unique_modulo_symmetry(variants, self._child_symmetry.data)
+        rotations = Rotation(variants[unique])
+        rotations._data.flags.writeable = False
+        self._rotations = rotations
+        self._misorientations = None
+        self._variant_misorientations = None
+        self._variant_angles = None
+
+    @classmethod
+    def from_parallel(
+        cls,
+        parent_plane,
+        child_plane,
+        parent_direction,
+        child_direction,
+        parent_symmetry=None,
+        child_symmetry=None,
+    ):
+        """Return the OR with a parent plane parallel to a child plane
+        and a parent direction parallel to a child direction.
+
+        Directions are made perpendicular to their plane normal before
+        they are aligned, so that the planes are exactly parallel.
+
+        Parameters
+        ----------
+        parent_plane, child_plane : orix.vector.Miller or array_like
+            Plane normals as Miller indices with a phase, or as
+            Cartesian vectors in the crystal reference frame.
+        parent_direction, child_direction : orix.vector.Miller or array_like
+            Directions as Miller indices with a phase, or as Cartesian
+            vectors in the crystal reference frame.
+        parent_symmetry, child_symmetry : orix.quaternion.Symmetry, optional
+            Point groups of the phases. If None (default), the point
+            group of the phase of the plane is used, or cubic symmetry
+            for Cartesian vectors.
+
+        Returns
+        -------
+        OrientationRelationship
+
+        Examples
+        --------
+        Kurdjumov-Sachs, (111) and [-101] of fcc parallel to (011) and
+        [-1-11] of bcc
+
+        >>> from reconstruction.variants import OrientationRelationship
+        >>> ks = OrientationRelationship.from_parallel(
+        ...     [1, 1, 1], [0, 1, 1], [-1, 0, 1], [-1, -1, 1]
+        ... )
+        >>> ks.size
+        24
+        """
+        if parent_symmetry is None:
+            parent_symmetry = _phase_symmetry(parent_plane)
+        if child_symmetry is None:
+            child_symmetry = _phase_symmetry(child_plane)
+        parent_frame = _crystal_frame(parent_plane, parent_direction)
+        child_frame = _crystal_frame(child_plane, child_direction)
+        rotation = Rotation.from_matrix(child_frame @ parent_frame.T)
+        return cls(rotation, parent_symmetry, child_symmetry)
+
+    @classmethod
+    def from_name(cls, name):
+        """Return a named OR.
+
+        Parameters
+        ----------
+        name : str
+            "Burgers" (bcc to hcp), "Pitsch" (fcc to bcc) or "GT"
+            (Greninger-Troiano, fcc to bcc), not case sensitive.
+
+        Returns
+        -------
+        OrientationRelationship
+        """
+        key = name.lower()
+        if key not in _PARALLEL_ORS:
+            raise ValueError(
+                f"Unknown orientation relationship '{name}', must be one of "
+                f"{[n for n in _PARALLEL_ORS]}."
+            )
+        return cls.from_parallel(*_PARALLEL_ORS[key])
+
+    @property
+    def rotation(self):
+        """Rotation :math:`T` from parent to child crystal coordinates,
+        the first variant.
+        """
+        return self._rotations[0]
+
+    def _key(self, decimals):
+        """Cache key of the point groups and rounded OR rotation."""
+        t = self._rotations.data[0]
+        # Quaternions q and -q are the same rotation
+        t = t * np.sign(t[np.flatnonzero(np.round(t, decimals))[0]])
+        return (
+            self._parent_symmetry.name,
+            self._child_symmetry.name,
+        ) + tuple(float(k) for k in np.round(t, decimals) + 0.0)
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__} ({self.size},) "
+            f"{self._parent_symmetry.name} -> {self._child_symmetry.name}"
+        )
+
+
+def get_variants(orientation_relationship="KS", decimals=4):
+    """Return the cached variant table of an orientation relationship.
+
+    Parameters
+    ----------
+    orientation_relationship : str, array_like or OrientationRelationship, optional
+        Name of a named orientation relationship between cubic phases,
+        "KS" (default) or "NW", or the three Kurdjumov-Sachs angles
+        (ksi values) in degrees. Otherwise, the name of an OR given by
+        parallel planes and directions, see
+        :meth:`OrientationRelationship.from_name`, or an
+        :class:`OrientationRelationship` between any phases.
+    decimals : int, optional
+        Number of decimals the ksi values or OR rotation are rounded to
+        before the cache lookup. Default is 4.
+
+    Returns
+    -------
+    VariantTable or OrientationRelationship
+        Shared table, which must not be modified.
+
+    Examples
+    --------
+    >>> from reconstruction.variants import get_variants
+    >>> table = get_variants("KS")
+    >>> table
+    VariantTable (24,) ksi: (5.2644, 10.3027, 10.5288)
+    >>> table.variant_angles.shape
+    (24, 24)
+    >>> get_variants([5.26439, 10.30272, 10.52878]) is table
+    True
+    >>> get_variants("Burgers")
+    OrientationRelationship (12,) 432 -> 622
+    """
+    if isinstance(orientation_relationship, str) and (
+        orientation_relationship.lower() in _PARALLEL_ORS
+    ):
+        orientation_relationship = OrientationRelationship.from_name(
+            orientation_relationship
+        )
+    if isinstance(orientation_relationship, OrientationRelationship):
+        key = orientation_relationship._key(decimals)
+        return _cached(key, lambda: orientation_relationship)
+
+    if isinstance(orientation_relationship, str):
+        ksi = namedOR(orientation_relationship)
+    else:
+        ksi = np.asarray(orientation_relationship, dtype=np.float64)
+    if ksi.size != 3:
+        raise ValueError(
+            "`orientation_relationship` must be 'KS', 'NW', 'Burgers', 'Pitsch', "
+            "'GT', three ksi values or an OrientationRelationship."
+        )
+    # Adding zero turns -0.0 into 0.0
+    key = tuple(float(k) for k in np.round(ksi, decimals) + 0.0)
+    return _cached(key, lambda: VariantTable(ksi))
+
+
+def _cached(key, create):
+    """Return the cached table of a key, or cache a new table."""
+    table = _CACHE.get(key)
+    if table is None:
+        table = create()
+        _CACHE[key] = table
+        if len(_CACHE) > _CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    else:
+        _CACHE.move_to_end(key)
+    return table
+
+
+def clear_variant_cache():
+    """Remove all variant tables cached by :func:`get_variants`."""
+    _CACHE.clear()
+
+
+# Parent {111} plane normals defining the packets, and child {110}
+# plane normals
+_PARENT_PLANES = np.array([[1, 1, 1], [-1, 1, 1], [1, -1, 1], [1, 1, -1]])
+_CHILD_PLANES = np.array(
+    [[1, 1, 0], [1, -1, 0], [1, 0, 1], [1, 0, -1], [0, 1, 1], [0, 1, -1]]
+) / np.sqrt(2)
+
+
+def _phase_symmetry(vector):
+    """Point group of the phase of Miller indices, or cubic symmetry."""
+    if isinstance(vector, Miller) and vector.phase.point_group is not None:
+        return vector.phase.point_group
+    return O
+
+
+def _crystal_frame(plane, direction):
+    """Orthonormal frame with the plane normal and the direction made
+    perpendicular to it as the first two columns.
+    """
+    vectors = []
+    for v in [plane, direction]:
+        v = np.asarray(getattr(v, "data", v), dtype=np.float64).reshape(3)
+        vectors.append(v / np.linalg.norm(v))
+    n, d = vectors
+    d = d - np.dot(d, n) * n
+    norm = np.linalg.norm(d)
+    if norm < 1e-6:
+        raise ValueError("The direction must not be parallel to the plane normal.")
+    d /= norm
+    return np.column_stack((n, d, np.cross(n, d)))
+
+
+# Parent plane, child plane, parent direction and child direction of
+# named ORs, and the point groups of the phases. Hexagonal vectors are
+# Cartesian, with a along x and c along z.
+_PARALLEL_ORS = {
+    # (110) and [-11-1] of bcc parallel to (0001) and [2-1-10] of hcp
+    "burgers": ([1, 1, 0], [0, 0, 1], [-1, 1, -1], [1, 0, 0], O, D6),
+    # (010) and [101] of fcc parallel to (101) and [-111] of bcc
+    "pitsch": ([0, 1, 0], [1, 0, 1], [1, 0, 1], [-1, 1, 1], O, O),
+    # (111) and [-5-12 17] of fcc parallel to (011) and [-17-7 17] of bcc
+    "gt": ([1, 1, 1], [0, 1, 1], [-5, -12, 17], [-17, -7, 17], O, O),
+}
+
+# Variant tables by rounded ksi values or point groups and OR rotation,
+# least recently used first
+_CACHE = OrderedDict()
+_CACHE_SIZE = 128